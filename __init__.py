@@ -51,6 +51,7 @@ import pathlib
 import requests
 
 from . import globs
+from .profiler import profiler
 
 # Check if cats is reloading or started fresh
 if "bpy" not in locals():
@@ -59,6 +60,9 @@ if "bpy" not in locals():
 else:
     is_reloading = True
 
+# Time the imports of all cats modules, only active when profiling the startup
+profiler.start_imports([__name__, 'mmd_tools_local'])
+
 # Load or reload all cats modules
 if not is_reloading:
     # This order is important
@@ -248,65 +252,82 @@ def set_cats_version_string():
 def register():
     print("\n### Loading CATS...")
 
-    # Check for unsupported Blender versions
-    check_unsupported_blender_versions()
+    with profiler.measure('Check installation'):
+        # Check for unsupported Blender versions
+        check_unsupported_blender_versions()
 
-    # Check for faulty CATS installations
-    remove_corrupted_files()
+        # Check for faulty CATS installations
+        remove_corrupted_files()
 
     # Set cats version string
     version_str = set_cats_version_string()
 
     # Register Updater and check for CATS update
-    updater.register(bl_info, dev_branch, version_str)
+    with profiler.measure('Register updater'):
+        updater.register(bl_info, dev_branch, version_str)
 
     # Set some global settings, first allowed use of globs
     globs.dev_branch = dev_branch
     globs.version_str = version_str
 
     # Load settings and show error if a faulty installation was deleted recently
-    try:
-        tools.settings.load_settings()
-    except FileNotFoundError:
-        sys.tracebacklimit = 0
-        raise ImportError(t('Main.error.restartAndEnable_alt'))
+    with profiler.measure('Load settings'):
+        try:
+            tools.settings.load_settings()
+        except FileNotFoundError:
+            sys.tracebacklimit = 0
+            raise ImportError(t('Main.error.restartAndEnable_alt'))
 
     # if not tools.settings.use_custom_mmd_tools():
     #     bpy.utils.unregister_module("mmd_tools")
 
     # Load mmd_tools
-    try:
-        mmd_tools_local.register()
-    except NameError:
-        print('Could not register local mmd_tools')
-    except AttributeError:
-        print('Could not register local mmd_tools')
-    except ValueError:
-        print('mmd_tools is already registered')
-
-    # Register all classes
-    count = 0
-    tools.register.order_classes()
-    for cls in tools.register.__bl_classes:
+    with profiler.measure('Register mmd_tools'):
         try:
-            bpy.utils.register_class(cls)
-            count += 1
+            mmd_tools_local.register()
+        except NameError:
+            print('Could not register local mmd_tools')
+        except AttributeError:
+            print('Could not register local mmd_tools')
         except ValueError:
-            pass
-    # print('Registered', count, 'CATS classes.')
-    if count < len(tools.register.__bl_classes):
-        print('Skipped', len(tools.register.__bl_classes) - count, 'CATS classes.')
+            print('mmd_tools is already registered')
+
+    # Register all classes
+    with profiler.measure('Register classes'):
+        count = 0
+        tools.register.order_classes()
+        for cls in tools.register.__bl_classes:
+            try:
+                bpy.utils.register_class(cls)
+                count += 1
+            except ValueError:
+                pass
+        # print('Registered', count, 'CATS classes.')
+        if count < len(tools.register.__bl_classes):
+            print('Skipped', len(tools.register.__bl_classes) - count, 'CATS classes.')
+
+        # Rarely used classes are registered on first use, unless this Blender version can't do that
+        tools.register.register_bundles()
+    profiler.count('classes_registered', count)
+    profiler.count('classes_skipped', len(tools.register.__bl_classes) - count)
+    profiler.count('classes_deferred', tools.register.count_deferred_classes())
 
     # Register Scene types
-    extentions.register()
+    with profiler.measure('Register scene properties'):
+        extentions.register()
 
     # Load supporter and settings icons and buttons
-    tools.supporter.load_other_icons()
-    tools.supporter.load_supporters()
-    tools.supporter.register_dynamic_buttons()
-
-    # Load the dictionaries and check if they are found.
-    globs.dict_found = tools.translate.load_translations()
+    with profiler.measure('Load other icons'):
+        tools.supporter.load_other_icons()
+    with profiler.measure('Load supporter icons'):
+        tools.supporter.load_supporters()
+        if tools.register.is_bundle_loaded('supporter'):
+            tools.supporter.register_dynamic_buttons()
+    profiler.count('icons_loaded', sum(len(pcoll) for pcoll in tools.supporter.preview_collections.values()))
+
+    # Check if the dictionaries are found. They get loaded on the first translation
+    with profiler.measure('Check dictionaries'):
+        globs.dict_found = tools.translate.load_translations(lazy=True)
 
     # Set preferred Blender options
     if hasattr(tools.common.get_user_preferences(), 'system') and hasattr(tools.common.get_user_preferences().system, 'use_international_fonts'):
@@ -327,12 +348,16 @@ def register():
     # Disable request warning when using google translate
     requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
 
+    # Keep the cached vertex weight tables in sync with edits made outside of Cats
+    tools.common.register_weight_index_handler()
+
     # Monkey patch fbx exporter to include empty shapekeys
     tools.fbx_patch.start_patch_fbx_exporter_timer()
 
     # Apply the settings after a short time, because you can't change checkboxes during register process
     tools.settings.start_apply_settings_timer()
 
+    profiler.finish(version_str=version_str)
     print("### Loaded CATS successfully!\n")
 
 
@@ -375,6 +400,12 @@ def unregister():
     tools.supporter.unregister_dynamic_buttons()
     tools.supporter.unload_icons()
 
+    # Unload the bundles which got registered on first use
+    tools.register.unload_bundles()
+
+    # Remove the vertex weight table handler
+    tools.common.unregister_weight_index_handler()
+
     # Remove shapekey button from shapekey menu
     try:
         bpy.types.MESH_MT_shape_key_specials.remove(tools.shapekey.addToShapekeyMenu)
@@ -291,6 +291,19 @@ def register():
         ]
     )
 
+    Scene.bake_use_cache = BoolProperty(
+        name="Cache bake passes",
+        description="Keep baked passes in 'CATS Bake/cache' next to your .blend file. Passes whose meshes, materials, images and settings didn't change are loaded from there instead of being baked again",
+        default=False
+    )
+
+    Scene.bake_cache_size = IntProperty(
+        name="Cache size (MB)",
+        description="The least recently used cached passes are removed once the cache grows larger than this",
+        default=1024,
+        min=64
+    )
+
     Scene.bake_prioritize_face = BoolProperty(
         name=t('Scene.bake_prioritize_face.label'),
         description=t('Scene.bake_prioritize_face.desc'),
@@ -55,11 +55,17 @@ class FnMorph(object):
                 for move in range(abs(offset)):
                     bpy.ops.object.shape_key_move(type=move_type)
         else:
-            for name in shape_key_names:
-                idx = key_blocks.find(name)
-                if idx < 0:
-                    continue
-                obj.active_shape_key_index = idx
+            # Only move the shape keys which are not already in the right relative order at the start
+            names = [x for x in shape_key_names if x in key_blocks]
+            names_set = set(names)
+            current_order = key_blocks.keys()
+            target_order = [x for x in current_order if x not in names_set] + names
+            start = 0
+            for name in current_order:
+                if start < len(target_order) and name == target_order[start]:
+                    start += 1
+            for name in target_order[start:]:
+                obj.active_shape_key_index = key_blocks.find(name)
                 bpy.ops.object.shape_key_move(type='BOTTOM')
 
     @staticmethod
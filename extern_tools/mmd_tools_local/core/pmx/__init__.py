@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 import struct
 import os
+import io
 import logging
+import collections.abc
+
+import numpy as np
 
 class InvalidFileError(Exception):
     pass
@@ -38,10 +42,44 @@ class FileStream:
             self.__file_obj = None
 
 class FileReadStream(FileStream):
-    def __init__(self, path, pmx_header=None):
-        self.__fin = open(path, 'rb')
+    def __init__(self, path, pmx_header=None, in_memory=False):
+        # in_memory reads the whole file at once, which allows decoding whole blocks into arrays
+        self.__data = None
+        if in_memory:
+            with open(path, 'rb') as f:
+                self.__data = f.read()
+            self.__fin = io.BytesIO(self.__data)
+        else:
+            self.__fin = open(path, 'rb')
         FileStream.__init__(self, path, self.__fin, pmx_header)
 
+    def inMemory(self):
+        return self.__data is not None
+
+    def data(self):
+        return self.__data
+
+    def tell(self):
+        return self.__fin.tell()
+
+    def seek(self, pos):
+        if pos > len(self.__data):
+            raise struct.error('unexpected end of file')
+        self.__fin.seek(pos)
+
+    def readArray(self, dtype, count):
+        dtype = np.dtype(dtype)
+        buf = self.__fin.read(dtype.itemsize*count)
+        if len(buf) != dtype.itemsize*count:
+            raise struct.error('unexpected end of file')
+        return np.frombuffer(buf, dtype, count).copy()
+
+    def vertexIndexDtype(self):
+        return _UNSIGNED_INDEX_DTYPES[self.header().vertex_index_size]
+
+    def boneIndexDtype(self):
+        return _SIGNED_INDEX_DTYPES[self.header().bone_index_size]
+
     def __readIndex(self, size, typedict):
         index = None
         if size in typedict :
@@ -112,10 +150,43 @@ class FileReadStream(FileStream):
         v, = struct.unpack('<b', self.__fin.read(1))
         return v
 
+_SIGNED_INDEX_DTYPES = {1:'<i1', 2:'<i2', 4:'<i4'}
+_UNSIGNED_INDEX_DTYPES = {1:'<u1', 2:'<u2', 4:'<u4'}
+
+def _toIndexArray(values, dtype):
+    # Fails like struct.pack if an index doesn't fit
+    values = np.asarray(values, dtype=np.int64)
+    info = np.iinfo(dtype)
+    if values.size and (values.min() < info.min or values.max() > info.max):
+        raise struct.error('index out of range for %s'%str(np.dtype(dtype)))
+    return values.astype(dtype)
+
 class FileWriteStream(FileStream):
-    def __init__(self, path, pmx_header=None):
-        self.__fout = open(path, 'wb')
-        FileStream.__init__(self, path, self.__fout, pmx_header)
+    def __init__(self, path, pmx_header=None, in_memory=False):
+        # in_memory collects the whole file in memory and writes it at once when the stream gets closed,
+        # which also allows writing whole blocks from arrays
+        self.__file = open(path, 'wb')
+        self.__fout = io.BytesIO() if in_memory else self.__file
+        FileStream.__init__(self, path, self.__file, pmx_header)
+
+    def inMemory(self):
+        return self.__fout is not self.__file
+
+    def close(self):
+        if self.inMemory() and not self.__fout.closed:
+            with self.__fout.getbuffer() as data:
+                self.__file.write(data)
+            self.__fout.close()
+        FileStream.close(self)
+
+    def writeArray(self, array):
+        self.__fout.write(np.ascontiguousarray(array).tobytes())
+
+    def vertexIndexDtype(self):
+        return _UNSIGNED_INDEX_DTYPES[self.header().vertex_index_size]
+
+    def boneIndexDtype(self):
+        return _SIGNED_INDEX_DTYPES[self.header().bone_index_size]
 
     def __writeIndex(self, index, size, typedict):
         if size in typedict :
@@ -332,6 +403,11 @@ class Model:
         self.bones = []
         self.morphs = []
 
+        # Columnar copies of the vertices and faces, only set when loaded from an in-memory stream.
+        # They hold the data as it was read, later changes to the object lists are not reflected
+        self.vertex_arrays = None
+        self.face_array = None
+
         self.display = []
         dsp_root = Display()
         dsp_root.isSpecial = True
@@ -347,6 +423,30 @@ class Model:
         self.rigids = []
         self.joints = []
 
+    def getVertexArrays(self, additional_uvs=None):
+        """ The vertices as VertexArrays, built from the vertex objects if they were used since loading """
+        if self.vertex_arrays is not None and not _isBuilt(self.vertices):
+            return self.vertex_arrays
+        if additional_uvs is None:
+            additional_uvs = self.header.additional_uvs if self.header else 0
+        return VertexArrays.fromVertices(self.vertices, additional_uvs)
+
+    def setVertexArrays(self, vertex_arrays):
+        """ Replaces the vertices, the vertex objects get built from the arrays when they are used """
+        self.vertex_arrays = vertex_arrays
+        self.vertices = LazyList(len(vertex_arrays), vertex_arrays.toVertices)
+
+    def getFaceArray(self):
+        """ The faces as (n, 3) array, built from the face objects if they were used since loading """
+        if self.face_array is not None and not _isBuilt(self.faces):
+            return self.face_array
+        return np.array(self.faces, np.int64).reshape(-1, 3)
+
+    def setFaceArray(self, face_array):
+        """ Replaces the faces, the face objects get built from the array when they are used """
+        self.face_array = face_array
+        self.faces = LazyList(len(face_array), lambda: list(map(tuple, face_array.tolist())))
+
     def load(self, fs):
         self.filepath = fs.path()
         self.header = fs.header()
@@ -367,11 +467,15 @@ class Model:
         logging.info('Load Vertices')
         logging.info('------------------------------')
         num_vertices = fs.readInt()
-        self.vertices = []
-        for i in range(num_vertices):
-            v = Vertex()
-            v.load(fs)
-            self.vertices.append(v)
+        if fs.inMemory():
+            self.vertex_arrays = VertexArrays.load(fs, num_vertices)
+            self.vertices = LazyList(num_vertices, self.vertex_arrays.toVertices)
+        else:
+            self.vertices = []
+            for i in range(num_vertices):
+                v = Vertex()
+                v.load(fs)
+                self.vertices.append(v)
         logging.info('----- Loaded %d vertices', len(self.vertices))
 
         logging.info('')
@@ -379,12 +483,15 @@ class Model:
         logging.info(' Load Faces')
         logging.info('------------------------------')
         num_faces = fs.readInt()
-        self.faces = []
-        for i in range(int(num_faces/3)):
-            f1 = fs.readVertexIndex()
-            f2 = fs.readVertexIndex()
-            f3 = fs.readVertexIndex()
-            self.faces.append((f3, f2, f1))
+        if fs.inMemory():
+            self.setFaceArray(fs.readArray(fs.vertexIndexDtype(), int(num_faces/3)*3).reshape(-1, 3)[:, ::-1].astype(np.int64))
+        else:
+            self.faces = []
+            for i in range(int(num_faces/3)):
+                f1 = fs.readVertexIndex()
+                f2 = fs.readVertexIndex()
+                f3 = fs.readVertexIndex()
+                self.faces.append((f3, f2, f1))
         logging.info(' Load %d faces', len(self.faces))
 
         logging.info('')
@@ -578,16 +685,22 @@ comment(english):
 
         logging.info('exporting vertices... %d', len(self.vertices))
         fs.writeInt(len(self.vertices))
-        for i in self.vertices:
-            i.save(fs)
+        if fs.inMemory():
+            self.getVertexArrays(fs.header().additional_uvs).save(fs)
+        else:
+            for i in self.vertices:
+                i.save(fs)
         logging.info('finished exporting vertices.')
 
         logging.info('exporting faces... %d', len(self.faces))
         fs.writeInt(len(self.faces)*3)
-        for f3, f2, f1 in self.faces:
-            fs.writeVertexIndex(f1)
-            fs.writeVertexIndex(f2)
-            fs.writeVertexIndex(f3)
+        if fs.inMemory():
+            fs.writeArray(_toIndexArray(self.getFaceArray()[:, ::-1], fs.vertexIndexDtype()))
+        else:
+            for f3, f2, f1 in self.faces:
+                fs.writeVertexIndex(f1)
+                fs.writeVertexIndex(f2)
+                fs.writeVertexIndex(f3)
         logging.info('finished exporting faces.')
 
         logging.info('exporting textures... %d', len(self.textures))
@@ -643,6 +756,307 @@ comment(english):
             str(self.textures),
             )
 
+class LazyList(collections.abc.MutableSequence):
+    """ List which only gets built on first use, e.g. the vertex objects of the columnar reader.
+    The length is known without building it.
+    """
+    def __init__(self, length, builder):
+        self.__length = length
+        self.__builder = builder
+        self.__list = None
+
+    def __items(self):
+        if self.__list is None:
+            self.__list = self.__builder()
+            self.__builder = None
+            if len(self.__list) != self.__length:
+                raise ValueError('LazyList built %d items instead of %d'%(len(self.__list), self.__length))
+        return self.__list
+
+    def isBuilt(self):
+        return self.__list is not None
+
+    def __len__(self):
+        if self.__list is None:
+            return self.__length
+        return len(self.__list)
+
+    def __getitem__(self, index):
+        return self.__items()[index]
+
+    def __setitem__(self, index, value):
+        self.__items()[index] = value
+
+    def __delitem__(self, index):
+        del self.__items()[index]
+
+    def insert(self, index, value):
+        self.__items().insert(index, value)
+
+    def __iter__(self):
+        return iter(self.__items())
+
+    def sort(self, *args, **kwargs):
+        self.__items().sort(*args, **kwargs)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(self.__items())
+
+def _isBuilt(items):
+    return not isinstance(items, LazyList) or items.isBuilt()
+
+def _byteWindows(buf, size):
+    """ A (len(buf) - size + 1, size) view of buf with a window at every byte, so rows of it are records at any offset.
+    Indexing it with the record starts only touches the bytes of those records
+    """
+    return np.lib.stride_tricks.as_strided(buf, shape=(max(len(buf) - size + 1, 0), size), strides=(1, 1))
+
+class VertexArrays:
+    """ Columnar vertex data, one row per vertex.
+    bones/weights are padded to 4 columns with -1/0. The weights are complete for every type,
+    e.g. BDEF1 is (1, 0, 0, 0) and BDEF2/SDEF are (w, 1-w, 0, 0).
+    """
+    WEIGHT_BONE_COUNTS = (1, 2, 4, 2)
+
+    def __init__(self, count=0, additional_uvs=0):
+        self.co = np.zeros((count, 3), np.float32)
+        self.normal = np.zeros((count, 3), np.float32)
+        self.uv = np.zeros((count, 2), np.float32)
+        self.additional_uvs = np.zeros((count, additional_uvs, 4), np.float32)
+        self.weight_type = np.zeros(count, np.uint8)
+        self.bones = np.full((count, 4), -1, np.int32)
+        self.weights = np.zeros((count, 4), np.float32)
+        self.sdef_c = np.zeros((count, 3), np.float32)
+        self.sdef_r0 = np.zeros((count, 3), np.float32)
+        self.sdef_r1 = np.zeros((count, 3), np.float32)
+        self.edge_scale = np.ones(count, np.float32)
+
+    def __len__(self):
+        return len(self.co)
+
+    @classmethod
+    def load(cls, fs, count):
+        header = fs.header()
+        data = fs.data()
+        start = fs.tell()
+        bone_size = header.bone_index_size
+        fixed_size = 32 + 16*header.additional_uvs # co, normal, uv and additional uvs
+        weight_sizes = (bone_size, 2*bone_size+4, 4*bone_size+16, 2*bone_size+40)
+        record_sizes = tuple(fixed_size + 1 + w + 4 for w in weight_sizes)
+
+        # The weight records have different sizes, so the start of every vertex has to be found first
+        starts = [0]*count
+        types = bytearray(count)
+        pos = start
+        try:
+            for i in range(count):
+                t = data[pos + fixed_size]
+                starts[i] = pos
+                types[i] = t
+                pos += record_sizes[t]
+        except IndexError:
+            if pos + fixed_size >= len(data):
+                raise struct.error('unexpected end of file')
+            raise ValueError('invalid weight type %s'%str(data[pos + fixed_size]))
+        if pos > len(data):
+            raise struct.error('unexpected end of file')
+
+        buf = np.frombuffer(data, np.uint8)
+        starts = np.array(starts, np.int64)
+        types = np.frombuffer(bytes(types), np.uint8)
+
+        def gather(rows, offset, size):
+            return _byteWindows(buf, size)[rows + offset]
+
+        arrays = cls(0)
+        fixed = gather(starts, 0, fixed_size).view('<f4')
+        arrays.co = np.array(fixed[:, 0:3])
+        arrays.normal = np.array(fixed[:, 3:6])
+        arrays.uv = np.array(fixed[:, 6:8])
+        arrays.additional_uvs = np.array(fixed[:, 8:]).reshape(count, header.additional_uvs, 4)
+        arrays.weight_type = types.copy()
+        arrays.bones = np.full((count, 4), -1, np.int32)
+        arrays.weights = np.zeros((count, 4), np.float32)
+        arrays.sdef_c = np.zeros((count, 3), np.float32)
+        arrays.sdef_r0 = np.zeros((count, 3), np.float32)
+        arrays.sdef_r1 = np.zeros((count, 3), np.float32)
+
+        bone_dtype = fs.boneIndexDtype()
+        for t, bone_count in enumerate(cls.WEIGHT_BONE_COUNTS):
+            rows = np.flatnonzero(types == t)
+            if len(rows) == 0:
+                continue
+            record = gather(starts[rows], fixed_size + 1, weight_sizes[t])
+            arrays.bones[rows, :bone_count] = np.ascontiguousarray(record[:, :bone_count*bone_size]).view(bone_dtype)
+            values = np.ascontiguousarray(record[:, bone_count*bone_size:]).view('<f4')
+            if t == BoneWeight.BDEF1:
+                arrays.weights[rows, 0] = 1
+            elif t == BoneWeight.BDEF4:
+                arrays.weights[rows] = values
+            else:
+                arrays.weights[rows, 0] = values[:, 0]
+                arrays.weights[rows, 1] = 1 - values[:, 0]
+                if t == BoneWeight.SDEF:
+                    arrays.sdef_c[rows] = values[:, 1:4]
+                    arrays.sdef_r0[rows] = values[:, 4:7]
+                    arrays.sdef_r1[rows] = values[:, 7:10]
+
+        record_sizes = np.array(record_sizes, np.int64)
+        arrays.edge_scale = gather(starts + record_sizes[types] - 4, 0, 4).view('<f4').reshape(count)
+
+        fs.seek(pos)
+        return arrays
+
+    @classmethod
+    def fromVertices(cls, vertices, additional_uvs=0):
+        count = len(vertices)
+        arrays = cls(count, additional_uvs)
+        if count < 1:
+            return arrays
+        arrays.co[:] = [v.co for v in vertices]
+        arrays.normal[:] = [v.normal for v in vertices]
+        arrays.uv[:] = [v.uv for v in vertices]
+        arrays.edge_scale[:] = [v.edge_scale for v in vertices]
+        if additional_uvs:
+            padding = [(0, 0, 0, 0)]*additional_uvs
+            arrays.additional_uvs[:] = [(list(v.additional_uvs[:additional_uvs]) + padding)[:additional_uvs] for v in vertices]
+
+        weight_types, bones, weights, sdef = [], [], [], []
+        padding = (-1, -1, -1)
+        for i, v in enumerate(vertices):
+            w = v.weight
+            t = w.type
+            weight_types.append(t)
+            if t == BoneWeight.BDEF1:
+                bones.append((w.bones[0],) + padding)
+                weights.append((1, 0, 0, 0))
+            elif t == BoneWeight.BDEF2:
+                bones.append((w.bones[0], w.bones[1], -1, -1))
+                weights.append((w.weights[0], 1 - w.weights[0], 0, 0))
+            elif t == BoneWeight.BDEF4:
+                bones.append(w.bones[:4])
+                weights.append(w.weights)
+            elif t == BoneWeight.SDEF:
+                if not isinstance(w.weights, BoneWeightSDEF):
+                    raise ValueError
+                bones.append((w.bones[0], w.bones[1], -1, -1))
+                weights.append((w.weights.weight, 1 - w.weights.weight, 0, 0))
+                sdef.append((i, w.weights.c, w.weights.r0, w.weights.r1))
+            else:
+                raise ValueError('invalid weight type %s'%str(t))
+        arrays.weight_type[:] = weight_types
+        arrays.bones[:] = bones
+        arrays.weights[:] = weights
+        if sdef:
+            rows, c, r0, r1 = zip(*sdef)
+            rows = list(rows)
+            arrays.sdef_c[rows], arrays.sdef_r0[rows], arrays.sdef_r1[rows] = c, r0, r1
+        return arrays
+
+    @classmethod
+    def concatenate(cls, arrays_list):
+        """ Joins the rows of several VertexArrays, missing additional UVs are zero """
+        additional_uvs = max([a.additional_uvs.shape[1] for a in arrays_list] or [0])
+        arrays = cls(0, additional_uvs)
+        for name in vars(arrays):
+            values = [getattr(a, name) for a in arrays_list]
+            if name == 'additional_uvs':
+                values = [np.pad(v, ((0, 0), (0, additional_uvs - v.shape[1]), (0, 0)), 'constant') for v in values]
+            if values:
+                setattr(arrays, name, np.concatenate(values))
+        return arrays
+
+    def select(self, rows):
+        """ A copy with only the given rows """
+        arrays = VertexArrays(0)
+        for name, value in vars(self).items():
+            setattr(arrays, name, value[rows])
+        return arrays
+
+    def save(self, fs):
+        """ Writes the vertex records, the same bytes as Vertex.save """
+        count = len(self)
+        additional_uvs = fs.header().additional_uvs
+        bone_dtype = fs.boneIndexDtype()
+        fixed = [('co', '<f4', (3,)), ('normal', '<f4', (3,)), ('uv', '<f4', (2,))]
+        if additional_uvs:
+            fixed.append(('additional_uvs', '<f4', (additional_uvs, 4)))
+        fixed.append(('type', 'u1'))
+        weight_fields = (
+            [],
+            [('weights', '<f4', (1,))],
+            [('weights', '<f4', (4,))],
+            [('weights', '<f4', (1,)), ('c', '<f4', (3,)), ('r0', '<f4', (3,)), ('r1', '<f4', (3,))],
+            )
+        dtypes = [np.dtype(fixed + [('bones', bone_dtype, (n,))] + w + [('edge_scale', '<f4')])
+                  for n, w in zip(self.WEIGHT_BONE_COUNTS, weight_fields)]
+
+        # Every weight type has its own record size, so the records of each type get copied to their offsets
+        weight_types = self.weight_type.astype(np.int64)
+        if count and weight_types.max() >= len(dtypes):
+            raise ValueError('invalid weight type %s'%str(weight_types.max()))
+        sizes = np.array([d.itemsize for d in dtypes], dtype=np.int64)[weight_types]
+        offsets = np.cumsum(sizes) - sizes
+        data = np.empty(int(sizes.sum()), dtype=np.uint8)
+        for t, (dtype, bone_count) in enumerate(zip(dtypes, self.WEIGHT_BONE_COUNTS)):
+            rows = np.flatnonzero(weight_types == t)
+            if len(rows) < 1:
+                continue
+            records = np.zeros(len(rows), dtype=dtype)
+            records['co'] = self.co[rows]
+            records['normal'] = self.normal[rows]
+            records['uv'] = self.uv[rows]
+            if additional_uvs:
+                uv_count = min(additional_uvs, self.additional_uvs.shape[1])
+                records['additional_uvs'][:, :uv_count] = self.additional_uvs[rows, :uv_count]
+            records['type'] = t
+            records['bones'] = _toIndexArray(self.bones[rows, :bone_count], bone_dtype)
+            if t == BoneWeight.BDEF4:
+                records['weights'] = self.weights[rows]
+            elif t != BoneWeight.BDEF1:
+                records['weights'] = self.weights[rows, :1]
+            if t == BoneWeight.SDEF:
+                records['c'] = self.sdef_c[rows]
+                records['r0'] = self.sdef_r0[rows]
+                records['r1'] = self.sdef_r1[rows]
+            records['edge_scale'] = self.edge_scale[rows]
+            _byteWindows(data, dtype.itemsize)[offsets[rows]] = records.view(np.uint8).reshape(-1, dtype.itemsize)
+        fs.writeArray(data)
+
+    def toVertices(self):
+        """ Builds the Vertex objects, equal to the ones Vertex.load would read """
+        vertices = []
+        weight_types = self.weight_type.tolist()
+        bones = self.bones.tolist()
+        weights = self.weights.tolist()
+        additional_uvs = self.additional_uvs.tolist()
+        sdef_rows = set(np.flatnonzero(self.weight_type == BoneWeight.SDEF).tolist())
+        sdef_c, sdef_r0, sdef_r1 = self.sdef_c.tolist(), self.sdef_r0.tolist(), self.sdef_r1.tolist()
+        bone_counts = self.WEIGHT_BONE_COUNTS
+        for i, (co, normal, uv, edge_scale) in enumerate(zip(self.co.tolist(), self.normal.tolist(), self.uv.tolist(), self.edge_scale.tolist())):
+            v = Vertex()
+            v.co = tuple(co)
+            v.normal = tuple(normal)
+            v.uv = tuple(uv)
+            v.additional_uvs = [tuple(a) for a in additional_uvs[i]]
+            t = weight_types[i]
+            w = BoneWeight()
+            w.type = t
+            w.bones = bones[i][:bone_counts[t]]
+            if t == BoneWeight.BDEF2:
+                w.weights = weights[i][:1]
+            elif t == BoneWeight.BDEF4:
+                w.weights = tuple(weights[i])
+            elif i in sdef_rows:
+                w.weights = BoneWeightSDEF(weights[i][0], tuple(sdef_c[i]), tuple(sdef_r0[i]), tuple(sdef_r1[i]))
+            v.weight = w
+            v.edge_scale = edge_scale
+            vertices.append(v)
+        return vertices
+
 class Vertex:
     def __init__(self):
         self.co = [0.0, 0.0, 0.0]
@@ -1181,6 +1595,9 @@ class Morph:
         fs.writeSignedByte(self.category)
         fs.writeSignedByte(self.type_index())
         fs.writeInt(len(self.offsets))
+        self.saveOffsets(fs)
+
+    def saveOffsets(self, fs):
         for i in self.offsets:
             i.save(fs)
 
@@ -1191,13 +1608,60 @@ class VertexMorph(Morph):
     def type_index(self):
         return 1
 
+    def getOffsetArrays(self, dtype=np.float32):
+        return _getOffsetArrays(self, 3, dtype)
+
+    def setOffsetArrays(self, indices, values):
+        _setOffsetArrays(self, VertexMorphOffset, indices, values)
+
+    def saveOffsets(self, fs):
+        if fs.inMemory():
+            _saveOffsetArrays(fs, *self.getOffsetArrays(np.float64))
+        else:
+            Morph.saveOffsets(self, fs)
+
     def load(self, fs):
         num = fs.readInt()
+        if fs.inMemory():
+            self.setOffsetArrays(*_loadOffsetArrays(fs, num, 3))
+            return
         for i in range(num):
             t = VertexMorphOffset()
             t.load(fs)
             self.offsets.append(t)
 
+def _getOffsetArrays(morph, size, dtype):
+    # The offsets as (indices, values) arrays, built from the offset objects if they were used since loading
+    if getattr(morph, 'offset_indices', None) is not None and not _isBuilt(morph.offsets):
+        return morph.offset_indices, morph.offset_values
+    indices = np.array([x.index for x in morph.offsets], np.int64)
+    values = np.array([x.offset for x in morph.offsets], dtype).reshape(-1, size)
+    return indices, values
+
+def _setOffsetArrays(morph, cls, indices, values):
+    # Replaces the offsets, the objects get built from the arrays when they are used
+    morph.offset_indices, morph.offset_values = indices, values
+    morph.offsets = LazyList(len(indices), lambda: _createOffsets(cls, indices, values))
+
+def _loadOffsetArrays(fs, count, size):
+    records = fs.readArray([('index', fs.vertexIndexDtype()), ('offset', '<f4', (size,))], count)
+    return records['index'].astype(np.int64), np.ascontiguousarray(records['offset'])
+
+def _saveOffsetArrays(fs, indices, values):
+    records = np.empty(len(indices), dtype=[('index', fs.vertexIndexDtype()), ('offset', '<f4', values.shape[1:])])
+    records['index'] = _toIndexArray(indices, fs.vertexIndexDtype())
+    records['offset'] = values
+    fs.writeArray(records)
+
+def _createOffsets(cls, indices, values):
+    offsets = []
+    for index, offset in zip(indices.tolist(), values.tolist()):
+        t = cls()
+        t.index = index
+        t.offset = tuple(offset)
+        offsets.append(t)
+    return offsets
+
 class VertexMorphOffset:
     def __init__(self):
         self.index = 0
@@ -1219,9 +1683,24 @@ class UVMorph(Morph):
     def type_index(self):
         return self.uv_index + 3
 
+    def getOffsetArrays(self, dtype=np.float32):
+        return _getOffsetArrays(self, 4, dtype)
+
+    def setOffsetArrays(self, indices, values):
+        _setOffsetArrays(self, UVMorphOffset, indices, values)
+
+    def saveOffsets(self, fs):
+        if fs.inMemory():
+            _saveOffsetArrays(fs, *self.getOffsetArrays(np.float64))
+        else:
+            Morph.saveOffsets(self, fs)
+
     def load(self, fs):
         self.offsets = []
         num = fs.readInt()
+        if fs.inMemory():
+            self.setOffsetArrays(*_loadOffsetArrays(fs, num, 4))
+            return
         for i in range(num):
             t = UVMorphOffset()
             t.load(fs)
@@ -1586,8 +2065,11 @@ class Joint:
 
 
 
-def load(path):
-    with FileReadStream(path) as fs:
+def load(path, in_memory=True):
+    """ Loads a pmx file. in_memory decodes vertices, faces and vertex/uv morphs as arrays,
+    the objects are only built when they are accessed.
+    """
+    with FileReadStream(path, in_memory=in_memory) as fs:
         logging.info('****************************************')
         logging.info(' mmd_tools.pmx module')
         logging.info('----------------------------------------')
@@ -1609,8 +2091,11 @@ def load(path):
         logging.info('****************************************')
         return model
 
-def save(path, model, add_uv_count=0):
-    with FileWriteStream(path) as fs:
+def save(path, model, add_uv_count=0, in_memory=True):
+    """ Saves a pmx file. in_memory writes vertices, faces and vertex/uv morphs from arrays
+    and the file at once.
+    """
+    with FileWriteStream(path, in_memory=in_memory) as fs:
         header = Header(model)
         header.additional_uvs = max(0, min(4, add_uv_count)) # UV1~UV4
         header.save(fs)
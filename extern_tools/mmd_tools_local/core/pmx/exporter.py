@@ -8,6 +8,7 @@ import time
 import mathutils
 import bpy
 import bmesh
+import numpy as np
 
 from collections import OrderedDict
 from mmd_tools_local.core import pmx
@@ -49,6 +50,22 @@ class _Mesh:
         self.material_names = material_names
 
 
+class _MeshArrays:
+    def __init__(self, vertex_arrays, base_indices, vertex_count, faces, material_indices, shape_key_names, material_names):
+        self.vertex_arrays = vertex_arrays # pmx.VertexArrays of the split vertices
+        self.base_indices = base_indices # blender vertex of every split vertex
+        self.vertex_count = vertex_count # number of blender vertices
+        self.faces = faces # (n, 3) split vertex indices
+        self.material_indices = material_indices
+        self.shape_key_names = shape_key_names
+        self.material_names = material_names
+        self.offsets = {} # {shape_key_name => (blender vertex indices, offsets)}
+        self.uv_offsets = {} # {uv_morph_name => (blender vertex indices, offsets)}
+        self.vertex_order = None # (mesh_id, weights) used for controlling vertex order
+        self.export_order = None # exported index of every split vertex, -1 if unused
+        self.export_index = None # final index of every split vertex after sorting the vertices
+
+
 class _DefaultMaterial:
     def __init__(self):
         mat = bpy.data.materials.new('')
@@ -81,6 +98,8 @@ class __PmxExporter:
         self.__vertex_order_map = None # used for controlling vertex order
         self.__disable_specular = False
         self.__add_uv_count = 0
+        self.__columnar = False
+        self.__mesh_data = []
 
     @staticmethod
     def flipUV_V(uv):
@@ -200,6 +219,71 @@ class __PmxExporter:
         if sort_vertices:
             self.__sortVertices()
 
+    def __sortVerticesColumnar(self, meshes, vertex_arrays, faces):
+        logging.info(' - Sorting vertices ...')
+        mesh_ids, order_weights, base_indices, export_order = [], [], [], []
+        for mesh in meshes:
+            exported = np.flatnonzero(mesh.export_order >= 0)
+            mesh_id, weights = mesh.vertex_order
+            mesh_ids.append(np.full(len(exported), mesh_id))
+            order_weights.append(weights[mesh.base_indices[exported]])
+            base_indices.append(mesh.base_indices[exported])
+            export_order.append(mesh.export_order[exported])
+        export_order = np.concatenate(export_order)
+        rows = np.empty_like(export_order)
+        rows[export_order] = np.arange(len(export_order))
+        # stable like sorted(), equal keys keep the export order
+        sorted_indices = np.lexsort([np.concatenate(x)[rows] for x in (base_indices, order_weights, mesh_ids)])
+
+        index_map = np.empty_like(sorted_indices)
+        index_map[sorted_indices] = np.arange(len(sorted_indices))
+        for mesh in meshes:
+            mesh.export_index = np.where(mesh.export_order >= 0, index_map[mesh.export_order], -1)
+        logging.debug('   - Done (count:%d)', len(sorted_indices))
+        return vertex_arrays.select(sorted_indices), index_map[faces]
+
+    def __exportMeshesColumnar(self, meshes):
+        mat_map = OrderedDict()
+        for mesh in meshes:
+            for index in np.unique(mesh.material_indices).tolist():
+                name = mesh.material_names[index]
+                if name not in mat_map:
+                    mat_map[name] = []
+                mat_map[name].append((mesh, np.flatnonzero(mesh.material_indices == index)))
+
+        for mesh in meshes:
+            mesh.export_order = np.full(len(mesh.vertex_arrays), -1, dtype=np.int64)
+
+        # export vertices in the order they are used by the faces
+        vertex_count = 0
+        vertex_blocks = []
+        face_blocks = []
+        for mat_name, mat_meshes in mat_map.items():
+            face_count = 0
+            for mesh, face_indices in mat_meshes:
+                mesh_faces = mesh.faces[face_indices]
+                loops = mesh_faces.ravel()
+                _, first = np.unique(loops, return_index=True)
+                new_vertices = loops[np.sort(first)]
+                new_vertices = new_vertices[mesh.export_order[new_vertices] < 0]
+                mesh.export_order[new_vertices] = np.arange(vertex_count, vertex_count + len(new_vertices))
+                vertex_count += len(new_vertices)
+                vertex_blocks.append(mesh.vertex_arrays.select(new_vertices))
+                face_blocks.append(mesh.export_order[mesh_faces])
+                face_count += len(mesh_faces)
+            self.__exportMaterial(bpy.data.materials[mat_name], face_count)
+
+        vertex_arrays = pmx.VertexArrays.concatenate(vertex_blocks)
+        faces = np.concatenate(face_blocks) if face_blocks else np.zeros((0, 3), dtype=np.int64)
+        for mesh in meshes:
+            mesh.export_index = mesh.export_order
+
+        if self.__vertex_order_map is not None:
+            vertex_arrays, faces = self.__sortVerticesColumnar(meshes, vertex_arrays, faces)
+
+        self.__model.setVertexArrays(vertex_arrays)
+        self.__model.setFaceArray(faces)
+
     def __exportTexture(self, filepath):
         if filepath.strip() == '':
             return -1
@@ -587,6 +671,12 @@ class __PmxExporter:
             )
             self.__model.morphs.append(morph)
 
+        if self.__columnar:
+            morph_table = dict(zip(shape_key_names, self.__model.morphs))
+            for name, (indices, offsets) in self.__getExportedOffsets(meshes, 'offsets').items():
+                morph_table[name].setOffsetArrays(indices, offsets)
+            return
+
         append_table = dict(zip(shape_key_names, [m.offsets.append for m in self.__model.morphs]))
         for v in self.__exported_vertices:
             for i, offset in v.offsets.items():
@@ -595,6 +685,26 @@ class __PmxExporter:
                 mo.offset = offset
                 append_table[i](mo)
 
+    @staticmethod
+    def __getExportedOffsets(meshes, attribute):
+        """ Returns {name: (indices, offsets)} of the exported vertices of the meshes, in the order they were exported """
+        tables = OrderedDict()
+        for mesh in meshes:
+            for name, (indices, offsets) in getattr(mesh, attribute).items():
+                rows = np.full(mesh.vertex_count, -1, dtype=np.int64)
+                rows[indices] = np.arange(len(indices))
+                rows = rows[mesh.base_indices]
+                exported = np.flatnonzero((rows >= 0) & (mesh.export_order >= 0))
+                if name not in tables:
+                    tables[name] = []
+                tables[name].append((mesh.export_order[exported], mesh.export_index[exported], offsets[rows[exported]]))
+
+        for name, parts in tables.items():
+            export_order, indices, offsets = (np.concatenate(x) for x in zip(*parts))
+            order = np.argsort(export_order, kind='stable')
+            tables[name] = (indices[order], offsets[order])
+        return tables
+
     def __export_material_morphs(self, root):
         mmd_root = root.mmd_root
         categories = self.CATEGORIES
@@ -636,6 +746,10 @@ class __PmxExporter:
          モデル中心座標から離れている位置で使用されているマテリアルほどリストの後ろ側にくるように。
          かなりいいかげんな実装
         """
+        if self.__columnar:
+            self.__sortMaterialsColumnar()
+            return
+
         center = mathutils.Vector([0, 0, 0])
         vertices = self.__model.vertices
         vert_num = len(vertices)
@@ -665,6 +779,27 @@ class __PmxExporter:
         self.__model.materials = sorted_mat
         self.__model.faces = sorted_faces
 
+    def __sortMaterialsColumnar(self):
+        co = self.__model.getVertexArrays().co.astype(np.float64)
+        faces = self.__model.getFaceArray()
+        face_distances = np.linalg.norm(co[faces] - co.mean(axis=0), axis=2).sum(axis=1)
+        offset = 0
+        distances = []
+        for mat, bl_mat_name in zip(self.__model.materials, self.__material_name_table):
+            face_num = int(mat.vertex_count / 3)
+            d = float(face_distances[offset:offset + face_num].sum())
+            distances.append((d/mat.vertex_count, mat, offset, face_num, bl_mat_name))
+            offset += face_num
+        sorted_faces = []
+        sorted_mat = []
+        self.__material_name_table.clear()
+        for d, mat, offset, face_num, bl_mat_name in sorted(distances, key=lambda x: x[0]):
+            sorted_faces.append(faces[offset:offset+face_num])
+            sorted_mat.append(mat)
+            self.__material_name_table.append(bl_mat_name)
+        self.__model.materials = sorted_mat
+        self.__model.setFaceArray(np.concatenate(sorted_faces) if sorted_faces else faces)
+
     def __export_bone_morphs(self, root):
         mmd_root = root.mmd_root
         if len(mmd_root.bone_morphs) == 0:
@@ -703,6 +838,7 @@ class __PmxExporter:
             return
         categories = self.CATEGORIES
         append_table_vg = {}
+        morph_table_vg = {}
         for morph in mmd_root.uv_morphs:
             uv_morph = pmx.UVMorph(
                 name=morph.name,
@@ -713,10 +849,24 @@ class __PmxExporter:
             self.__model.morphs.append(uv_morph)
             if morph.data_type == 'VERTEX_GROUP':
                 append_table_vg[morph.name] = uv_morph.offsets.append
+                morph_table_vg[morph.name] = uv_morph
                 continue
             logging.warning(' * Deprecated UV morph "%s", please convert it to vertex groups', morph.name)
 
-        if append_table_vg:
+        if append_table_vg and self.__columnar:
+            uv_morphs = mmd_root.uv_morphs
+            incompleted = set()
+            for name, (indices, offsets) in self.__getExportedOffsets(self.__mesh_data, 'uv_offsets').items():
+                if name not in append_table_vg:
+                    incompleted.add(name)
+                    continue
+                scale = uv_morphs[name].vertex_group_scale
+                morph_table_vg[name].setOffsetArrays(indices, offsets * (scale, -scale, scale, -scale))
+
+            if incompleted:
+                logging.warning(' * Incompleted UV morphs %s with vertex groups', incompleted)
+
+        elif append_table_vg:
             incompleted = set()
             uv_morphs = mmd_root.uv_morphs
             for v in self.__exported_vertices:
@@ -971,11 +1121,7 @@ class __PmxExporter:
         logging.debug('   - Done (polygons:%d)', len(mesh.polygons))
         return custom_normals
 
-    def __doLoadMeshData(self, meshObj, bone_map):
-        vg_to_bone = {i:bone_map[x.name] for i, x in enumerate(meshObj.vertex_groups) if x.name in bone_map}
-        vg_edge_scale = meshObj.vertex_groups.get('mmd_edge_scale', None)
-        vg_vertex_order = meshObj.vertex_groups.get('mmd_vertex_order', None)
-
+    def __getMeshMatrices(self, meshObj):
         pmx_matrix = meshObj.matrix_world * self.__scale
         pmx_matrix[1], pmx_matrix[2] = pmx_matrix[2].copy(), pmx_matrix[1].copy()
         sx, sy, sz = meshObj.matrix_world.to_scale()
@@ -984,7 +1130,10 @@ class __PmxExporter:
             invert_scale_matrix = mathutils.Matrix([[1.0/sx,0,0], [0,1.0/sy,0], [0,0,1.0/sz]])
             normal_matrix = matmul(normal_matrix, invert_scale_matrix) # reset the scale of meshObj.matrix_world
             normal_matrix = matmul(normal_matrix, invert_scale_matrix) # the scale transform of normals
+        return pmx_matrix, normal_matrix
 
+    @staticmethod
+    def __getMeshFunctions():
         if bpy.app.version < (2, 80, 0):
             _to_mesh = lambda obj: obj.to_mesh(bpy.context.scene, apply_modifiers=True, settings='PREVIEW', calc_tessface=False, calc_undeformed=False)
             _to_mesh_clear = lambda obj, mesh: bpy.data.meshes.remove(mesh)
@@ -994,6 +1143,30 @@ class __PmxExporter:
                 depsgraph = bpy.context.evaluated_depsgraph_get()
                 return obj.evaluated_get(depsgraph).to_mesh(depsgraph=depsgraph, preserve_all_data_layers=True)
             _to_mesh_clear = lambda obj, mesh: obj.to_mesh_clear()
+        return _to_mesh, _to_mesh_clear
+
+    @staticmethod
+    def __getShapeKeyList(meshObj):
+        shape_key_list = []
+        if meshObj.data.shape_keys:
+            for i, kb in enumerate(meshObj.data.shape_keys.key_blocks):
+                if i == 0: # Basis
+                    continue
+                if kb.name.startswith('mmd_bind') or kb.name == FnSDEF.SHAPEKEY_NAME:
+                    continue
+                if kb.name == 'mmd_sdef_c': # make sure 'mmd_sdef_c' is at first
+                    shape_key_list = [(i, kb)] + shape_key_list
+                else:
+                    shape_key_list.append((i, kb))
+        return shape_key_list
+
+    def __doLoadMeshData(self, meshObj, bone_map):
+        vg_to_bone = {i:bone_map[x.name] for i, x in enumerate(meshObj.vertex_groups) if x.name in bone_map}
+        vg_edge_scale = meshObj.vertex_groups.get('mmd_edge_scale', None)
+        vg_vertex_order = meshObj.vertex_groups.get('mmd_vertex_order', None)
+
+        pmx_matrix, normal_matrix = self.__getMeshMatrices(meshObj)
+        _to_mesh, _to_mesh_clear = self.__getMeshFunctions()
 
         base_mesh = _to_mesh(meshObj)
         loop_normals = self.__triangulate(base_mesh, self.__get_normals(base_mesh, normal_matrix))
@@ -1102,21 +1275,9 @@ class __PmxExporter:
         _to_mesh_clear(meshObj, base_mesh)
 
         # calculate offsets
-        shape_key_list = []
-        if meshObj.data.shape_keys:
-            for i, kb in enumerate(meshObj.data.shape_keys.key_blocks):
-                if i == 0: # Basis
-                    continue
-                if kb.name.startswith('mmd_bind') or kb.name == FnSDEF.SHAPEKEY_NAME:
-                    continue
-                if kb.name == 'mmd_sdef_c': # make sure 'mmd_sdef_c' is at first
-                    shape_key_list = [(i, kb)] + shape_key_list
-                else:
-                    shape_key_list.append((i, kb))
-
         shape_key_names = []
         sdef_counts = 0
-        for i, kb in shape_key_list:
+        for i, kb in self.__getShapeKeyList(meshObj):
             shape_key_name = kb.name
             logging.info(' - processing shape key: %s', shape_key_name)
             kb_mute, kb.mute = kb.mute, False
@@ -1166,6 +1327,156 @@ class __PmxExporter:
             shape_key_names,
             material_names)
 
+    def __doLoadMeshDataColumnar(self, meshObj, bone_map):
+        """ Same as __doLoadMeshData, but reads the mesh with foreach_get and splits the vertices with np.unique """
+        vg_edge_scale = meshObj.vertex_groups.get('mmd_edge_scale', None)
+        vg_vertex_order = meshObj.vertex_groups.get('mmd_vertex_order', None)
+
+        pmx_matrix, normal_matrix = self.__getMeshMatrices(meshObj)
+        _to_mesh, _to_mesh_clear = self.__getMeshFunctions()
+
+        base_mesh = _to_mesh(meshObj)
+        logging.debug(' - Calculating normals split...')
+        base_mesh.calc_normals_split()
+        loop_normals = np.dot(_foreach_get(base_mesh.loops, 'normal', 3).astype(np.float64), np.array(normal_matrix).T)
+        base_mesh.free_normals_split()
+        lengths = np.linalg.norm(loop_normals, axis=1)[:, None]
+        loop_normals = np.divide(loop_normals, lengths, out=np.zeros_like(loop_normals), where=lengths > 0)
+
+        # the triangles of the faces, like bmesh.ops.triangulate with the 'FIXED' and 'EAR_CLIP' methods
+        base_mesh.calc_loop_triangles()
+        corner_loops = _foreach_get(base_mesh.loop_triangles, 'loops', 3, np.int32).astype(np.int64).ravel()
+        material_indices = _foreach_get(base_mesh.loop_triangles, 'material_index', 1, np.int32).ravel()
+        loop_vertices = _foreach_get(base_mesh.loops, 'vertex_index', 1, np.int32).astype(np.int64).ravel()
+
+        base_mesh.transform(pmx_matrix)
+        base_co = _foreach_get(base_mesh.vertices, 'co', 3)
+        vertex_count = len(base_co)
+
+        def _get_uvs(uv_layer):
+            if uv_layer is None:
+                uvs = np.zeros((len(loop_vertices), 2))
+                uvs[:, 1] = 1 # like _DummyUV
+            else:
+                uvs = _foreach_get(uv_layer.data, 'uv', 2).astype(np.float64)
+            uvs[:, 1] = 1.0 - uvs[:, 1] # flipUV_V
+            return uvs
+
+        uvs = _get_uvs(base_mesh.uv_layers.active)
+        bl_add_uvs = [i for i in base_mesh.uv_layers[1:] if not i.name.startswith('_')]
+        self.__add_uv_count = max(self.__add_uv_count, len(bl_add_uvs))
+        add_uvs = np.zeros((len(loop_vertices), min(len(bl_add_uvs), 4), 4))
+        for uv_n, uv_tex in enumerate(bl_add_uvs):
+            if uv_n > 3:
+                logging.warning(' * extra addUV%d+ are not supported', uv_n+1)
+                break
+            zw_data = base_mesh.uv_layers.get('_'+uv_tex.name, None)
+            logging.info(' # exporting addUV%d: %s [zw: %s]', uv_n+1, uv_tex.name, zw_data)
+            add_uvs[:, uv_n, :2] = _get_uvs(uv_tex)
+            add_uvs[:, uv_n, 2:] = _get_uvs(zw_data)
+
+        # vertices are split where the corners have different uvs or normals
+        blocks = [(uvs, 0.001), (loop_normals, 0.01)]
+        for uv_n in range(add_uvs.shape[1]):
+            blocks += [(add_uvs[:, uv_n, :2], 0.001), (add_uvs[:, uv_n, 2:], 0.001)]
+        first_corners, faces = _get_split_vertices(loop_vertices[corner_loops], [(values[corner_loops], tolerance) for values, tolerance in blocks])
+        split_loops = corner_loops[first_corners]
+        base_indices = loop_vertices[split_loops]
+        faces = faces.reshape(-1, 3)
+        if not pmx_matrix.is_negative: # pmx.load/pmx.save reverse face vertices by default
+            faces = faces[:, ::-1]
+
+        # vertex groups, the only per vertex loop
+        vertex_groups = [(v.index, g.group, g.weight) for v in base_mesh.vertices for g in v.groups]
+        vertex_groups = np.array(vertex_groups, dtype=np.float64).reshape(-1, 3)
+        group_vertices, group_indices, group_weights = vertex_groups[:, 0].astype(np.int64), vertex_groups[:, 1].astype(np.int64), vertex_groups[:, 2]
+
+        _mat_name = lambda x: x.name if x else self.__getDefaultMaterial().name
+        material_names = {i:_mat_name(m) for i, m in enumerate(base_mesh.materials)}
+        material_names = {i:material_names.get(i, None) or _mat_name(None) for i in np.unique(material_indices).tolist()}
+
+        _to_mesh_clear(meshObj, base_mesh)
+
+        vg_bones = np.full(max(len(meshObj.vertex_groups), int(group_indices.max(initial=-1)) + 1), -1, dtype=np.int64)
+        for i, x in enumerate(meshObj.vertex_groups):
+            vg_bones[i] = bone_map.get(x.name, -1)
+        bone_indices = vg_bones[group_indices]
+        used = (group_weights > 0) & (bone_indices >= 0)
+        weight_type, bones, weights = _get_bone_weights(vertex_count, group_vertices[used], bone_indices[used], group_weights[used])
+        bone_counts = np.bincount(group_vertices[used], minlength=vertex_count)
+
+        def _get_weight(vertex_group, default_weight):
+            values = np.full(vertex_count, default_weight, dtype=np.float64)
+            rows = group_indices == vertex_group.index
+            values[group_vertices[rows]] = group_weights[rows]
+            return values
+
+        base_arrays = pmx.VertexArrays(vertex_count)
+        base_arrays.co = base_co
+        base_arrays.weight_type, base_arrays.bones, base_arrays.weights = weight_type, bones, weights
+        if vg_edge_scale:
+            base_arrays.edge_scale[:] = _get_weight(vg_edge_scale, 1)
+
+        # calculate offsets
+        offsets = {}
+        shape_key_names = []
+        sdef_rows = np.zeros(0, dtype=np.int64)
+        for i, kb in self.__getShapeKeyList(meshObj):
+            shape_key_name = kb.name
+            logging.info(' - processing shape key: %s', shape_key_name)
+            kb_mute, kb.mute = kb.mute, False
+            meshObj.active_shape_key_index = i
+            mesh = _to_mesh(meshObj)
+            mesh.transform(pmx_matrix)
+            kb.mute = kb_mute
+            if len(mesh.vertices) != vertex_count:
+                logging.warning('   * Error! vertex count mismatch!')
+                _to_mesh_clear(meshObj, mesh)
+                continue
+            co = _foreach_get(mesh.vertices, 'co', 3)
+            _to_mesh_clear(meshObj, mesh)
+            if shape_key_name in {'mmd_sdef_c', 'mmd_sdef_r0', 'mmd_sdef_r1'}:
+                if shape_key_name == 'mmd_sdef_c':
+                    moved = np.linalg.norm(co - base_co, axis=1) >= 0.001
+                    sdef_rows = np.flatnonzero((bone_counts == 2) & moved)
+                    base_arrays.sdef_c[sdef_rows] = co[sdef_rows]
+                    base_arrays.sdef_r0[sdef_rows] = base_arrays.sdef_r1[sdef_rows] = base_co[sdef_rows]
+                    logging.info('   - Restored %d SDEF vertices', len(sdef_rows))
+                elif len(sdef_rows) > 0:
+                    sdef_r = base_arrays.sdef_r0 if shape_key_name == 'mmd_sdef_r0' else base_arrays.sdef_r1
+                    sdef_r[sdef_rows] = co[sdef_rows]
+                    logging.info('   - Updated SDEF data')
+            else:
+                shape_key_names.append(shape_key_name)
+                offset = co - base_co
+                rows = np.flatnonzero(np.linalg.norm(offset, axis=1) >= 0.001)
+                offsets[shape_key_name] = (rows, offset[rows])
+
+        if len(sdef_rows) > 0:
+            base_arrays.weight_type[sdef_rows] = pmx.BoneWeight.SDEF
+            swap = sdef_rows[base_arrays.bones[sdef_rows, 0] > base_arrays.bones[sdef_rows, 1]]
+            base_arrays.bones[swap, :2] = base_arrays.bones[swap, 1::-1]
+            base_arrays.weights[swap, :2] = base_arrays.weights[swap, 1::-1]
+
+        vertex_arrays = base_arrays.select(base_indices)
+        vertex_arrays.normal[:] = loop_normals[split_loops]
+        vertex_arrays.uv[:] = uvs[split_loops]
+        vertex_arrays.additional_uvs = add_uvs[split_loops].astype(np.float32)
+
+        mesh_data = _MeshArrays(vertex_arrays, base_indices, vertex_count, faces, material_indices, shape_key_names, material_names)
+        mesh_data.offsets = offsets
+        uv_morph_groups = {g.index:(n, x) for g, n, x in FnMorph.get_uv_morph_vertex_groups(meshObj)}
+        mesh_data.uv_offsets = _get_uv_offsets(group_vertices, group_indices, group_weights, uv_morph_groups)
+
+        if self.__vertex_order_map: # sort vertices
+            mesh_id = self.__vertex_order_map.setdefault('mesh_id', 0)
+            self.__vertex_order_map['mesh_id'] += 1
+            if vg_vertex_order and self.__vertex_order_map['method'] == 'CUSTOM':
+                mesh_data.vertex_order = (mesh_id, _get_weight(vg_vertex_order, 2))
+            else:
+                mesh_data.vertex_order = (mesh_id, np.zeros(vertex_count))
+        return mesh_data
+
     def __loadMeshData(self, meshObj, bone_map):
         show_only_shape_key = meshObj.show_only_shape_key
         meshObj.show_only_shape_key = True
@@ -1185,6 +1496,8 @@ class __PmxExporter:
 
         try:
             logging.info('Loading mesh: %s', meshObj.name)
+            if self.__columnar:
+                return self.__doLoadMeshDataColumnar(meshObj, bone_map)
             return self.__doLoadMeshData(meshObj, bone_map)
         finally:
             meshObj.show_only_shape_key = show_only_shape_key
@@ -1225,8 +1538,14 @@ class __PmxExporter:
 
         nameMap = self.__exportBones(meshes)
 
+        # The columnar mesh export needs the loop triangles of Blender 2.80+, the object path works with all versions
+        self.__columnar = args.get('columnar', True) and bpy.app.version >= (2, 80, 0)
         mesh_data = [self.__loadMeshData(i, nameMap) for i in meshes]
-        self.__exportMeshes(mesh_data, nameMap)
+        self.__mesh_data = mesh_data
+        if self.__columnar:
+            self.__exportMeshesColumnar(mesh_data)
+        else:
+            self.__exportMeshes(mesh_data, nameMap)
         if args.get('sort_materials', False):
             self.__sortMaterials()
 
@@ -1260,3 +1579,116 @@ def export(filepath, **kwargs):
     logging.info('----------------------------------------')
     logging.info(' %s module'%__name__)
     logging.info('****************************************')
+
+
+def _foreach_get(collection, attribute, size=1, dtype=np.float32):
+    values = np.empty(len(collection)*size, dtype=dtype)
+    collection.foreach_get(attribute, values)
+    return values.reshape(-1, size)
+
+def _get_split_vertices(vertex_indices, blocks):
+    """ Splits face corners into vertices like __convertFaceUVToVertexUV and __convertAddUV.
+    A corner joins the first split vertex of its vertex where every (values, tolerance) block, e.g. the uvs or the normals,
+    is closer than the tolerance to the first corner of that split vertex.
+    Unlike the object path, corners in the same small grid cell always share a split vertex, so corners scattered
+    over more than the tolerance can still be split a little differently.
+    Returns the first corner of every split vertex and the split vertex of every corner
+    """
+    vertex_indices = np.asarray(vertex_indices, dtype=np.int64)
+    if len(vertex_indices) < 1:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    blocks = [(np.asarray(values, dtype=np.float64).reshape(len(vertex_indices), -1), tolerance) for values, tolerance in blocks]
+
+    # corners in the same grid cell are always closer than the tolerance
+    keys = [vertex_indices[:, None]]
+    keys += [np.rint(values / (tolerance / np.sqrt(values.shape[1]))) + 0.0 for values, tolerance in blocks]
+    _, first, inverse = np.unique(np.column_stack(keys), axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind='stable') # number the cells in corner order
+    first = first[order]
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    inverse = rank[inverse.reshape(-1)]
+
+    # cells of the same vertex can still be closer than the tolerance across a cell border, compare all cell pairs of a vertex
+    cell_vertices = vertex_indices[first]
+    by_vertex = np.lexsort((np.arange(len(first)), cell_vertices))
+    group_ends = np.searchsorted(cell_vertices[by_vertex], cell_vertices[by_vertex], side='right')
+    following = group_ends - np.arange(len(first)) - 1
+    left = np.repeat(np.arange(len(first)), following)
+    right = np.arange(len(left)) - np.repeat(np.cumsum(following) - following, following) + left + 1
+    cells1, cells2 = by_vertex[left], by_vertex[right]
+    close = np.ones(len(cells1), dtype=bool)
+    for values, tolerance in blocks:
+        close &= np.linalg.norm(values[first[cells1]] - values[first[cells2]], axis=1) < tolerance
+    pair_order = np.lexsort((cells1[close], cells2[close]))
+    cells1, cells2 = cells1[close][pair_order], cells2[close][pair_order]
+
+    # like the object path, a cell joins the first earlier split vertex in range, only the few close pairs are looped
+    target = np.arange(len(first))
+    for cell1, cell2 in zip(cells1.tolist(), cells2.tolist()):
+        if target[cell2] == cell2 and target[cell1] == cell1:
+            target[cell2] = cell1
+    kept = target == np.arange(len(first))
+    split_index = np.cumsum(kept) - 1
+    return first[kept], split_index[target[inverse]]
+
+def _get_bone_weights(vertex_count, vertex_indices, bone_indices, weights):
+    """ Converts (vertex, bone, weight) entries into the weight_type, bones and weights of pmx.VertexArrays.
+    Like the object path, the entries of a vertex keep their order and vertices with more than 4 bones keep the 4 largest weights
+    """
+    vertex_indices = np.asarray(vertex_indices, dtype=np.int64)
+    bone_indices = np.asarray(bone_indices, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    counts = np.bincount(vertex_indices, minlength=vertex_count)
+    order = np.lexsort((np.arange(len(weights)), np.where(counts[vertex_indices] > 4, -weights, 0), vertex_indices))
+    vertex_indices, bone_indices, weights = vertex_indices[order], bone_indices[order], weights[order]
+    rank = np.arange(len(vertex_indices)) - (np.cumsum(counts) - counts)[vertex_indices]
+    keep = rank < 4
+
+    bones = np.zeros((vertex_count, 4), dtype=np.int64)
+    bone_weights = np.zeros((vertex_count, 4), dtype=np.float64)
+    bones[vertex_indices[keep], rank[keep]] = bone_indices[keep]
+    bone_weights[vertex_indices[keep], rank[keep]] = weights[keep]
+
+    weight_type = np.full(vertex_count, pmx.BoneWeight.BDEF4, dtype=np.uint8)
+    bdef1, bdef2, bdef4 = counts < 2, counts == 2, counts > 2
+    weight_type[bdef1] = pmx.BoneWeight.BDEF1
+    weight_type[bdef2] = pmx.BoneWeight.BDEF2
+    bone_weights[bdef1] = (1, 0, 0, 0)
+    bone_weights[bdef2, 0] /= bone_weights[bdef2, 0] + bone_weights[bdef2, 1]
+    bone_weights[bdef2, 1] = 1.0 - bone_weights[bdef2, 0]
+    bone_weights[bdef4] /= bone_weights[bdef4].sum(axis=1, keepdims=True)
+    bones[(np.arange(4) >= np.maximum(counts, 1)[:, None]) & ~bdef4[:, None]] = -1
+    return weight_type, bones, bone_weights
+
+def _get_uv_offsets(vertex_indices, group_indices, weights, uv_morph_groups):
+    """ Sums the weights of the UV morph vertex groups {group_index: (name, axis)}.
+    Returns {name: (vertex indices, offsets)}, only with the vertices which are in one of the groups of the morph
+    """
+    vertex_indices = np.asarray(vertex_indices, dtype=np.int64)
+    group_indices = np.asarray(group_indices, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(group_indices) < 1 or not uv_morph_groups:
+        return {}
+
+    names = list(OrderedDict.fromkeys(name for name, axis in uv_morph_groups.values()))
+    size = max(max(uv_morph_groups), int(group_indices.max())) + 1
+    morphs, columns, signs = np.full(size, -1), np.zeros(size, dtype=np.int64), np.zeros(size)
+    for group_index, (name, axis) in uv_morph_groups.items():
+        morphs[group_index] = names.index(name)
+        columns[group_index] = 'XYZW'.index(axis[1])
+        signs[group_index] = -1.0 if axis[0] == '-' else 1.0
+
+    used = (morphs[group_indices] >= 0) & (weights > 0)
+    vertex_indices, group_indices, weights = vertex_indices[used], group_indices[used], weights[used]
+    uv_offsets = {}
+    for i, name in enumerate(names):
+        rows = morphs[group_indices] == i
+        if not np.any(rows):
+            continue
+        indices, inverse = np.unique(vertex_indices[rows], return_inverse=True)
+        offsets = np.zeros((len(indices), 4))
+        groups = group_indices[rows]
+        np.add.at(offsets, (inverse.reshape(-1), columns[groups]), signs[groups] * weights[rows])
+        uv_offsets[name] = (indices, offsets)
+    return uv_offsets
@@ -5,6 +5,7 @@ import logging
 import time
 
 import bpy
+import numpy as np
 from mathutils import Vector, Matrix
 
 import mmd_tools_local.core.model as mmd_model
@@ -60,7 +61,13 @@ class PMXImporter:
         self.__blender_ik_links = set()
         self.__vertex_map = None
 
+        # columnar import
+        self.__vertexArrays = None # all pmx vertices
+        self.__meshVertexArrays = None # vertices of the mesh, without the merged doubles
+        self.__faceArray = None
+
         self.__materialFaceCountTable = None
+        self.__overlappingFaces = np.zeros(0, dtype=np.int64)
 
     @staticmethod
     def __safe_name(name, max_length=59):
@@ -163,6 +170,86 @@ class PMXImporter:
         vg_edge_scale.lock_weight = True
         vg_vertex_order.lock_weight = True
 
+    @staticmethod
+    def __addGroupedWeights(vertex_groups, vertex_indices, group_indices, weights, add_type='ADD'):
+        """ Adds the weights with one call per vertex group and weight value instead of one call per vertex """
+        if len(vertex_indices) < 1:
+            return
+        weights = np.asarray(weights, dtype=np.float32)
+        order = np.lexsort((weights, group_indices))
+        group_indices, weights, vertex_indices = group_indices[order], weights[order], vertex_indices[order]
+        splits = np.flatnonzero((np.diff(group_indices) != 0) | (np.diff(weights) != 0)) + 1
+        starts, ends = np.concatenate(([0], splits)).tolist(), np.concatenate((splits, [len(order)])).tolist()
+        group_indices, weights, vertex_indices = group_indices.tolist(), weights.tolist(), vertex_indices.tolist()
+        for start, end in zip(starts, ends):
+            vertex_groups[group_indices[start]].add(index=vertex_indices[start:end], weight=weights[start], type=add_type)
+
+    def __convertCo(self, co):
+        return co[:, (0, 2, 1)] * np.float32(self.__scale)
+
+    def __importVerticesColumnar(self):
+        self.__importVertexGroup()
+
+        arrays = self.__vertexArrays
+        if self.__vertex_map:
+            arrays = arrays.select(list(collections.OrderedDict(self.__vertex_map).keys()))
+        self.__meshVertexArrays = arrays
+        vertex_count = len(arrays)
+        if vertex_count < 1:
+            return
+
+        mesh = self.__meshObj.data
+        mesh.vertices.add(count=vertex_count)
+        mesh.vertices.foreach_set('co', self.__convertCo(arrays.co).ravel())
+
+        vertex_indices = np.arange(vertex_count)
+        vg_edge_scale = self.__meshObj.vertex_groups.new(name='mmd_edge_scale')
+        vg_vertex_order = self.__meshObj.vertex_groups.new(name='mmd_vertex_order')
+        no_groups = np.zeros(vertex_count, dtype=np.int64)
+        self.__addGroupedWeights([vg_edge_scale], vertex_indices, no_groups, arrays.edge_scale, 'REPLACE')
+        self.__addGroupedWeights([vg_vertex_order], vertex_indices, no_groups, vertex_indices/vertex_count, 'REPLACE')
+
+        # One entry per used bone slot: BDEF1 uses 1 (none for bone -1), BDEF2/SDEF 2 and BDEF4 4 slots
+        slots = np.arange(4) < np.array(pmx.VertexArrays.WEIGHT_BONE_COUNTS)[arrays.weight_type][:, None]
+        slots[:, 0] &= (arrays.weight_type != pmx.BoneWeight.BDEF1) | (arrays.bones[:, 0] >= 0)
+        rows, columns = np.nonzero(slots)
+        bones = arrays.bones[rows, columns].astype(np.int64)
+        group_count = len(self.__vertexGroupTable)
+        if np.any((bones < -group_count) | (bones >= group_count)):
+            raise IndexError('bone index out of range')
+        bones[bones < 0] += group_count # negative indices count from the end, like indexing the list
+        self.__addGroupedWeights(self.__vertexGroupTable, rows, bones, arrays.weights[rows, columns])
+
+        vg_edge_scale.lock_weight = True
+        vg_vertex_order.lock_weight = True
+
+    def __storeVerticesSDEFColumnar(self):
+        arrays = self.__meshVertexArrays
+        if arrays is None:
+            return
+        sdef = arrays.weight_type == pmx.BoneWeight.SDEF
+        sdef_count = np.count_nonzero(sdef)
+        if sdef_count < 1:
+            return
+
+        # Like the bone order of the vertex groups, r0 and r1 are swapped if the second bone comes first
+        swap = (arrays.bones[:, 0] > arrays.bones[:, 1])[:, None]
+        sdef_data = (
+            ('mmd_sdef_c', arrays.sdef_c),
+            ('mmd_sdef_r0', np.where(swap, arrays.sdef_r1, arrays.sdef_r0)),
+            ('mmd_sdef_r1', np.where(swap, arrays.sdef_r0, arrays.sdef_r1)),
+            )
+
+        self.__createBasisShapeKey()
+        for name, values in sdef_data:
+            shape_key = self.__meshObj.shape_key_add(name=name)
+            co = np.empty(len(arrays)*3, dtype=np.float32)
+            shape_key.data.foreach_get('co', co)
+            co = co.reshape(-1, 3)
+            co[sdef] = self.__convertCo(values[sdef])
+            shape_key.data.foreach_set('co', co.ravel())
+        logging.info('Stored %d SDEF vertices', sdef_count)
+
     def __storeVerticesSDEF(self):
         if len(self.__sdefVertices) < 1:
             return
@@ -633,25 +720,103 @@ class PMXImporter:
         if bpy.app.version >= (2, 80, 0):
             self.__fixOverlappingFaceMaterials(mesh.materials, mesh.vertices, loop_indices, material_indices)
 
+    def __importFacesColumnar(self):
+        pmxModel = self.__model
+        mesh = self.__meshObj.data
+        vertex_map = self.__vertex_map
+        vertex_arrays = self.__vertexArrays
+
+        face_count = len(self.__faceArray)
+        loop_indices_orig = self.__faceArray.ravel()
+        if vertex_map:
+            loop_indices = np.array([x[1] for x in vertex_map], dtype=np.int64)[loop_indices_orig]
+        else:
+            loop_indices = loop_indices_orig
+        material_face_counts = self.__materialFaceCountTable
+        material_indices = np.repeat(np.arange(len(material_face_counts)), material_face_counts)
+
+        mesh.loops.add(face_count*3)
+        mesh.loops.foreach_set('vertex_index', loop_indices.astype(np.int32))
+
+        mesh.polygons.add(face_count)
+        mesh.polygons.foreach_set('loop_start', np.arange(0, face_count*3, 3, dtype=np.int32))
+        mesh.polygons.foreach_set('loop_total', np.full(face_count, 3, dtype=np.int32))
+        mesh.polygons.foreach_set('use_smooth', (True,)*face_count)
+        mesh.polygons.foreach_set('material_index', material_indices.astype(np.int32))
+
+        def _flipped_uvs(uvs):
+            uvs = uvs[loop_indices_orig]
+            uvs[:, 1] = 1.0 - uvs[:, 1]
+            return uvs.ravel()
+
+        uv_textures, uv_layers = getattr(mesh, 'uv_textures', mesh.uv_layers), mesh.uv_layers
+        uv_tex = uv_textures.new()
+        uv_layer = uv_layers[uv_tex.name]
+        uv_layer.data.foreach_set('uv', _flipped_uvs(vertex_arrays.uv))
+
+        if hasattr(mesh, 'uv_textures'):
+            for bf, mi in zip(uv_tex.data, material_indices.tolist()):
+                bf.image = self.__imageTable.get(mi, None)
+
+        if pmxModel.header and pmxModel.header.additional_uvs:
+            logging.info('Importing %d additional uvs', pmxModel.header.additional_uvs)
+            zw_data_map = collections.OrderedDict()
+            for i in range(pmxModel.header.additional_uvs):
+                add_uv = uv_layers[uv_textures.new(name='UV'+str(i+1)).name]
+                logging.info(' - %s...(uv channels)', add_uv.name)
+                uvzw = vertex_arrays.additional_uvs[:, i]
+                add_uv.data.foreach_set('uv', _flipped_uvs(uvzw[:, :2]))
+                if not np.any(uvzw[:, 2:]):
+                    logging.info('\t- zw are all zeros: %s', add_uv.name)
+                else:
+                    zw_data_map['_'+add_uv.name] = uvzw[:, 2:]
+            for name, zw in zw_data_map.items():
+                logging.info(' - %s...(zw channels of %s)', name, name[1:])
+                add_zw = uv_textures.new(name=name)
+                if add_zw is None:
+                    logging.warning('\t* Lost zw channels')
+                    continue
+                add_zw = uv_layers[add_zw.name]
+                add_zw.data.foreach_set('uv', _flipped_uvs(zw))
+
+        if bpy.app.version >= (2, 80, 0):
+            self.__fixOverlappingFaceMaterials(mesh.materials, mesh.vertices, loop_indices, material_indices)
+
     def __fixOverlappingFaceMaterials(self, materials, vertices, loop_indices, material_indices):
         # This is not the best way to setup blend_method, might just work for some common cases. And FnMaterial.update_alpha() is still using 'HASHED'.
         # For EEVEE, basically users should know which blend_method is best for each material of their models.
         # For Cycles, users have to offset or delete those z-fighting faces to fix it manually.
-        check = {}
-        mi_skip = -1
-        def _rounded_co(co): return tuple(round(v, 6) for v in co)
         assert(len(loop_indices) == len(material_indices)*3)
-        for i, mi in enumerate(material_indices):
-            if mi > mi_skip:
-                si = 3*i
-                verts = tuple(sorted(_rounded_co(vertices[vi].co) for vi in loop_indices[si:si+3]))
-                if verts not in check:
-                    check[verts] = mi
-                elif check[verts] < mi:
-                    logging.debug(' >> fix blend method of material: %s', materials[mi].name)
-                    materials[mi].blend_method = 'BLEND'
-                    materials[mi].show_transparent_back = False
-                    mi_skip = mi
+        if len(material_indices) < 1:
+            return
+        co = np.empty(len(vertices)*3, dtype=np.float32)
+        vertices.foreach_get('co', co)
+        face_keys = get_triangle_keys(co.reshape(-1, 3), loop_indices)
+        material_indices = np.asarray(material_indices)
+
+        # A material gets blended if one of its faces overlaps a face of an earlier material.
+        # Faces of a material after its first overlapping face are ignored
+        first_materials = np.full(face_keys.max() + 1, len(materials), dtype=np.int64)
+        starts = np.flatnonzero(np.diff(material_indices)) + 1
+        for start, end in zip([0] + starts.tolist(), starts.tolist() + [len(material_indices)]):
+            mi = int(material_indices[start])
+            keys = face_keys[start:end]
+            overlaps = first_materials[keys] < mi
+            if overlaps.any():
+                logging.debug(' >> fix blend method of material: %s', materials[mi].name)
+                materials[mi].blend_method = 'BLEND'
+                materials[mi].show_transparent_back = False
+                keys = keys[:np.argmax(overlaps)]
+            first_materials[keys] = np.minimum(first_materials[keys], mi)
+
+        self.__overlappingFaces = find_overlapping_faces(co.reshape(-1, 3), loop_indices, material_indices, face_keys)
+        if len(self.__overlappingFaces):
+            logging.info(' - %d faces overlap faces of other materials', len(self.__overlappingFaces))
+
+    @property
+    def overlappingFaces(self):
+        """ Indices of the imported faces which overlap a face of another material """
+        return self.__overlappingFaces
 
     def __importVertexMorphs(self):
         mmd_root = self.__root.mmd_root
@@ -667,6 +832,27 @@ class PMXImporter:
                 shapeKeyPoint = shapeKey.data[md.index]
                 shapeKeyPoint.co += Vector(md.offset).xzy * self.__scale
 
+    def __importVertexMorphsColumnar(self):
+        mmd_root = self.__root.mmd_root
+        categories = self.CATEGORIES
+        self.__createBasisShapeKey()
+        key_blocks = self.__meshObj.data.shape_keys.key_blocks
+        basis = np.empty(len(key_blocks[0].data)*3, dtype=np.float32)
+        key_blocks[0].data.foreach_get('co', basis)
+        basis = basis.reshape(-1, 3)
+        for morph in (x for x in self.__model.morphs if isinstance(x, pmx.VertexMorph)):
+            shapeKey = self.__meshObj.shape_key_add(name=morph.name)
+            vtx_morph = mmd_root.vertex_morphs.add()
+            vtx_morph.name = morph.name
+            vtx_morph.name_e = morph.name_e
+            vtx_morph.category = categories.get(morph.category, 'OTHER')
+            indices, offsets = morph.getOffsetArrays()
+            if len(indices) < 1:
+                continue
+            co = basis.copy()
+            np.add.at(co, indices, self.__convertCo(offsets)) # adds repeated indices like the single updates
+            shapeKey.data.foreach_set('co', co.ravel())
+
     def __importMaterialMorphs(self):
         mmd_root = self.__root.mmd_root
         categories = self.CATEGORIES
@@ -776,6 +962,22 @@ class PMXImporter:
         armModifier.name = 'mmd_bone_order_override'
         armModifier.show_render = armModifier.show_viewport = (len(meshObj.data.vertices) > 0)
 
+    def __assignCustomNormalsColumnar(self):
+        mesh = self.__meshObj.data
+        if not hasattr(mesh, 'has_custom_normals'):
+            logging.info(' * No support for custom normals!!')
+            return
+        logging.info('Setting custom normals...')
+        normals = self.__vertexArrays.normal[:, (0, 2, 1)]
+        lengths = np.linalg.norm(normals, axis=1)
+        normals = normals / np.where(lengths > 0, lengths, 1)[:, None]
+        if self.__vertex_map:
+            mesh.normals_split_custom_set(normals[self.__faceArray.ravel()])
+        else:
+            mesh.normals_split_custom_set_from_vertices(normals)
+        mesh.use_auto_smooth = True
+        logging.info('   - Done!!')
+
     def __assignCustomNormals(self):
         mesh = self.__meshObj.data
         if not hasattr(mesh, 'has_custom_normals'):
@@ -819,6 +1021,7 @@ class PMXImporter:
         types = args.get('types', set())
         clean_model = args.get('clean_model', False)
         remove_doubles = args.get('remove_doubles', False)
+        columnar = args.get('columnar', True)
         self.__scale = args.get('scale', 1.0)
         self.__use_mipmap = args.get('use_mipmap', True)
         self.__sph_blend_factor = args.get('sph_blend_factor', 1.0)
@@ -844,12 +1047,22 @@ class PMXImporter:
             if remove_doubles:
                 self.__vertex_map = _PMXCleaner.remove_doubles(self.__model, 'MORPHS' not in types)
             self.__createMeshObject()
-            self.__importVertices()
-            self.__importMaterials()
-            self.__importFaces()
-            self.__meshObj.data.update()
-            self.__assignCustomNormals()
-            self.__storeVerticesSDEF()
+            if columnar:
+                self.__vertexArrays = self.__model.getVertexArrays()
+                self.__faceArray = self.__model.getFaceArray()
+                self.__importVerticesColumnar()
+                self.__importMaterials()
+                self.__importFacesColumnar()
+                self.__meshObj.data.update()
+                self.__assignCustomNormalsColumnar()
+                self.__storeVerticesSDEFColumnar()
+            else:
+                self.__importVertices()
+                self.__importMaterials()
+                self.__importFaces()
+                self.__meshObj.data.update()
+                self.__assignCustomNormals()
+                self.__storeVerticesSDEF()
 
         if 'ARMATURE' in types:
             # for tracking bone order
@@ -877,7 +1090,10 @@ class PMXImporter:
 
         if 'MORPHS' in types:
             self.__importGroupMorphs()
-            self.__importVertexMorphs()
+            if columnar:
+                self.__importVertexMorphsColumnar()
+            else:
+                self.__importVertexMorphs()
             self.__importBoneMorphs()
             self.__importMaterialMorphs()
             self.__importUVMorphs()
@@ -900,6 +1116,60 @@ class PMXImporter:
         logging.info('****************************************')
 
 
+def get_triangle_keys(co, loop_indices):
+    """ One key per triangle, equal for triangles with the same corner locations rounded to 6 decimals """
+    # Multiplying float32 values by 1e6 is exact in float64, so rint gives the same result as round(x, 6)
+    co = np.asarray(co, dtype=np.float64)
+    loop_indices = np.asarray(loop_indices, dtype=np.int64)
+    _, vertex_keys = _unique_rows(np.rint(co*1e6) + 0.0, return_inverse=True) # -0.0 has other bytes than 0.0
+    corners = vertex_keys.reshape(-1)[loop_indices]
+    # NaN is never equal, not even to itself
+    nan_corners = np.flatnonzero(np.isnan(co).any(axis=1)[loop_indices])
+    corners[nan_corners] = len(co) + np.arange(len(nan_corners))
+    _, triangle_keys = _unique_rows(np.sort(corners.reshape(-1, 3), axis=1), return_inverse=True)
+    return triangle_keys.reshape(-1)
+
+def find_overlapping_faces(co, loop_indices, material_indices, triangle_keys=None):
+    """ Returns the indices of the triangles which have the same corners as a triangle of another material,
+    these cause z-fighting. loop_indices has 3 vertex indices per triangle.
+    """
+    if triangle_keys is None:
+        triangle_keys = get_triangle_keys(co, loop_indices)
+    if len(triangle_keys) < 1:
+        return np.zeros(0, dtype=np.int64)
+    pairs = _unique_rows(np.column_stack((triangle_keys, material_indices)).astype(np.int64))
+    material_counts = np.bincount(pairs[:, 0], minlength=triangle_keys.max() + 1)
+    return np.flatnonzero(material_counts[triangle_keys] > 1)
+
+_HASH_MULTIPLIERS = np.array([0x100000001b3, 0x9e3779b97f4a7c15], dtype=np.uint64)
+
+def _float_bits(values):
+    # The bits of the values as float64, with -0.0 turned into 0.0 since they are equal
+    return np.ascontiguousarray(np.asarray(values, dtype=np.float64) + 0.0).view(np.int64)
+
+def _unique_rows(rows, **kwargs):
+    """ np.unique(rows, axis=0, ...) which also works with the numpy of Blender 2.79, axis needs numpy 1.13.
+    The rows are compared by their bytes, so the unique rows are in no particular order
+    """
+    rows = np.ascontiguousarray(rows)
+    width = rows.shape[1]
+    result = np.unique(rows.view(np.dtype((np.void, rows.dtype.itemsize*width))).reshape(-1), **kwargs)
+    if isinstance(result, tuple):
+        return (result[0].view(rows.dtype).reshape(-1, width),) + result[1:]
+    return result.view(rows.dtype).reshape(-1, width)
+
+def _row_hashes(bits):
+    # Two 64 bit hashes of every row
+    hashes = np.empty((len(bits), 2), dtype=np.uint64)
+    hashes[:] = np.array([0xcbf29ce484222325, 0x84222325cbf29ce4], dtype=np.uint64) ^ np.uint64(bits.shape[1])
+    bits = bits.view(np.uint64)
+    for i in range(bits.shape[1]):
+        hashes ^= bits[:, i:i+1]
+        hashes *= _HASH_MULTIPLIERS
+        hashes ^= hashes >> np.uint64(29)
+    return hashes
+
+
 class _PMXCleaner:
     @classmethod
     def clean(cls, pmx_model, mesh_only):
@@ -942,6 +1212,127 @@ class _PMXCleaner:
 
     @classmethod
     def remove_doubles(cls, pmx_model, mesh_only):
+        """ Merges vertices with the same location and morph offsets. Returns the same vertex_map as remove_doubles_legacy,
+        a list of (pmx index of the kept vertex, blender index) for every pmx vertex, or None if there are no doubles.
+        """
+        logging.info('Removing doubles...')
+        co, uv = cls.__vertex_co_uv(pmx_model)
+        vertex_count = len(co)
+        morphs = [] if mesh_only else [m for m in pmx_model.morphs if isinstance(m, (pmx.VertexMorph, pmx.UVMorph))]
+
+        # The morph offsets of a vertex are only compared by their hashes, so the memory doesn't depend on the morph count.
+        # NaN is never equal, so those vertices are kept
+        hashes, offset_counts, has_nan = cls.__morph_signatures(vertex_count, morphs)
+        has_nan |= np.isnan(co).any(axis=1)
+        unique_tags = np.where(has_nan, np.arange(vertex_count), -1)
+        keys = np.column_stack((_float_bits(co), hashes.view(np.int64), offset_counts, unique_tags))
+
+        # The first vertex of each key is kept, the blender indices follow the order of the kept vertices
+        _, kept, inverse = _unique_rows(keys, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        blender_indices = np.empty(len(kept), dtype=np.int64)
+        blender_indices[np.argsort(kept)] = np.arange(len(kept))
+        kept_indices, new_indices = kept[inverse], blender_indices[inverse]
+
+        counts = vertex_count - len(kept)
+        if counts:
+            logging.warning('   - %d vertices will be removed', counts)
+        else:
+            logging.info('   - Done (no changes)!!')
+            return None
+
+        cls.__remove_double_faces(pmx_model, kept_indices, uv)
+
+        if mesh_only:
+            logging.info('   - Done (mesh only)!!')
+        else:
+            # clean vertex/uv morphs, offsets of merged vertices are removed
+            for m in morphs:
+                indices, values = m.getOffsetArrays(np.float64)
+                used = kept_indices[indices] == indices
+                m.setOffsetArrays(new_indices[indices[used]], values[used])
+                removed = len(indices) - len(m.offsets)
+                if removed:
+                    logging.warning('   - removed %d (of %d) offsets of "%s"', removed, len(indices), m.name)
+            logging.info('   - Done!!')
+        return list(zip(kept_indices.tolist(), new_indices.tolist()))
+
+    @staticmethod
+    def __vertex_co_uv(pmx_model):
+        # Exactly the values of the vertex objects, which are float32 if they come from the arrays of the reader
+        if pmx_model.vertex_arrays is not None and not pmx._isBuilt(pmx_model.vertices):
+            arrays = pmx_model.vertex_arrays
+            return arrays.co.astype(np.float64), arrays.uv.astype(np.float64)
+        co = np.array([v.co for v in pmx_model.vertices], dtype=np.float64).reshape(-1, 3)
+        uv = np.array([v.uv for v in pmx_model.vertices], dtype=np.float64).reshape(-1, 2)
+        return co, uv
+
+    @staticmethod
+    def __morph_signatures(vertex_count, morphs):
+        # Two 64 bit rolling hashes of the offsets of every vertex, in the order of the morphs and offsets
+        hashes = np.zeros((vertex_count, 2), dtype=np.uint64)
+        counts = np.zeros(vertex_count, dtype=np.int64)
+        has_nan = np.zeros(vertex_count, dtype=bool)
+        for m in morphs:
+            indices, values = m.getOffsetArrays(np.float64)
+            if len(indices) < 1:
+                continue
+            has_nan[indices[np.isnan(values).any(axis=1)]] = True
+            counts += np.bincount(indices, minlength=vertex_count)
+            offset_hashes = _row_hashes(_float_bits(values))
+
+            # A vertex can have more than one offset in a morph, these get added one after another
+            order = np.argsort(indices, kind='mergesort') # stable, kind='stable' needs numpy 1.15
+            sorted_indices = indices[order]
+            starts = np.flatnonzero(np.concatenate(([True], sorted_indices[1:] != sorted_indices[:-1])))
+            ranks = np.empty(len(indices), dtype=np.int64)
+            ranks[order] = np.arange(len(indices)) - np.repeat(starts, np.diff(np.append(starts, len(indices))))
+            for rank in range(ranks.max() + 1):
+                selected = ranks == rank
+                rows = indices[selected]
+                hashes[rows] = hashes[rows] * _HASH_MULTIPLIERS + offset_hashes[selected]
+        return hashes, counts, has_nan
+
+    @staticmethod
+    def __remove_double_faces(pmx_model, kept_indices, uv):
+        # Faces are doubles if they use the same merged vertices with the same uvs in the same material.
+        # Faces with a merged edge are removed
+        faces = pmx_model.getFaceArray()
+        pmx_materials = pmx_model.materials
+        material_face_counts = [int(mat.vertex_count/3) for mat in pmx_materials]
+        face_count = sum(material_face_counts)
+        if face_count > len(faces):
+            raise ValueError('the materials use %d faces, but there are only %d'%(face_count, len(faces)))
+        material_indices = np.repeat(np.arange(len(pmx_materials)), material_face_counts)
+        faces = faces[:face_count]
+
+        face_vertices = kept_indices[faces]
+        order = np.argsort(face_vertices, axis=1, kind='mergesort')
+        rows = np.arange(len(faces))[:, None]
+        face_vertices = face_vertices[rows, order]
+        faces_sorted = faces[rows, order]
+        valid = (face_vertices[:, 0] != face_vertices[:, 1]) & (face_vertices[:, 1] != face_vertices[:, 2])
+
+        uv_bits = _float_bits(uv)[faces_sorted]
+        uv_tags = np.where(np.isnan(uv).any(axis=1), np.arange(len(uv)), -1)[faces_sorted]
+        keys = np.column_stack((material_indices, face_vertices, uv_bits.reshape(-1, 6), uv_tags))
+
+        valid_faces = np.flatnonzero(valid)
+        _, first = _unique_rows(keys[valid_faces], return_index=True)
+        used = np.zeros(face_count, dtype=bool)
+        used[valid_faces[first]] = True
+
+        for mat, count in zip(pmx_materials, np.bincount(material_indices[used], minlength=len(pmx_materials)).tolist()):
+            mat.vertex_count = count*3
+        new_face_count = np.count_nonzero(used)
+        if new_face_count == len(pmx_model.faces):
+            logging.info('   (faces is clean)')
+        else:
+            logging.warning('   - removed %d faces', len(pmx_model.faces)-new_face_count)
+        pmx_model.setFaceArray(faces[used])
+
+    @classmethod
+    def remove_doubles_legacy(cls, pmx_model, mesh_only):
         logging.info('Removing doubles...')
         pmx_vertices = pmx_model.vertices
 
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import bpy
 from mathutils import Vector, Matrix, Quaternion
+import numpy as np
 import time
 
 from mmd_tools_local.bpyutils import matmul
@@ -17,6 +18,7 @@ def _hash(v):
 
 class FnSDEF():
     g_verts = {} # global cache
+    g_vert_arrays = {}
     g_shapekey_data = {}
     g_bone_check = {}
     __g_armature_check = {}
@@ -34,6 +36,7 @@ class FnSDEF():
         key_armature = _hash(mod.object.pose) if mod and mod.type == 'ARMATURE' and mod.object else None
         if key not in cls.g_verts or cls.__g_armature_check.get(key) != key_armature:
             cls.g_verts[key] = cls.__find_vertices(obj)
+            cls.g_vert_arrays[key] = cls.__vertex_arrays(cls.g_verts[key])
             cls.g_bone_check[key] = {}
             cls.__g_armature_check[key] = key_armature
             cls.g_shapekey_data[key] = None
@@ -119,14 +122,24 @@ class FnSDEF():
                     vertices[key][3].append(i)
         return vertices
 
+    @staticmethod
+    def __vertex_arrays(vertices):
+        # The SDEF data of all bone pairs as contiguous arrays, the vertices of pair i are in offsets[i]:offsets[i+1]
+        sdef_data = [d for bone0, bone1, data, vids in vertices.values() for d in data]
+        offsets = np.cumsum([0] + [len(data) for bone0, bone1, data, vids in vertices.values()])
+        vids = np.array([d[0] for d in sdef_data], dtype=np.int64)
+        weights = np.array([(d[1], d[2]) for d in sdef_data], dtype=np.float64).reshape(-1, 2)
+        pos_c, cr0, cr1 = (np.array([tuple(d[i]) for d in sdef_data], dtype=np.float64).reshape(-1, 3) for i in (3, 4, 5))
+        return offsets, vids, weights, pos_c, cr0, cr1
+
     @classmethod
-    def driver_function_wrap(cls, obj_name, bulk_update, use_skip, use_scale):
+    def driver_function_wrap(cls, obj_name, bulk_update, use_skip, use_scale, vectorized=False):
         obj = bpy.data.objects[obj_name]
         shapekey = obj.data.shape_keys.key_blocks[cls.SHAPEKEY_NAME]
-        return cls.driver_function(shapekey, obj_name, bulk_update, use_skip, use_scale)
+        return cls.driver_function(shapekey, obj_name, bulk_update, use_skip, use_scale, vectorized)
 
     @classmethod
-    def driver_function(cls, shapekey, obj_name, bulk_update, use_skip, use_scale):
+    def driver_function(cls, shapekey, obj_name, bulk_update, use_skip, use_scale, vectorized=False):
         obj = bpy.data.objects[obj_name]
         if getattr(shapekey.id_data, 'is_evaluated', False):
             # For Blender 2.8x, we should use evaluated object, and the only reference is the "obj" variable of SDEF driver
@@ -176,11 +189,13 @@ class FnSDEF():
         else: # bulk update
             shapekey_data = cls.g_shapekey_data[_hash(obj)]
             if shapekey_data is None:
-                import numpy as np
                 shapekey_data = np.zeros(len(shapekey.data)*3, dtype=np.float32)
                 shapekey.data.foreach_get('co', shapekey_data)
                 shapekey_data = cls.g_shapekey_data[_hash(obj)] = shapekey_data.reshape(len(shapekey.data), 3)
-            if use_scale:
+            if vectorized:
+                # batched update of all bone pairs
+                cls.__update_vectorized(obj, pose_bones, shapekey_data, use_skip, use_scale)
+            elif use_scale:
                 # scale & bulk update
                 for bone0, bone1, sdef_data, vids in cls.g_verts[_hash(obj)].values():
                     bone0, bone1 = pose_bones[bone0.name], pose_bones[bone1.name]
@@ -214,6 +229,41 @@ class FnSDEF():
 
         return 1.0 # shapkey value
 
+    @classmethod
+    def __update_vectorized(cls, obj, pose_bones, shapekey_data, use_skip, use_scale):
+        key = _hash(obj)
+        offsets, vids, weights, pos_c, cr0, cr1 = cls.g_vert_arrays[key]
+        pairs = []
+        for index, (bone0, bone1, sdef_data, _) in enumerate(cls.g_verts[key].values()):
+            bone0, bone1 = pose_bones[bone0.name], pose_bones[bone1.name]
+            if use_skip and not cls.__check_bone_update(obj, bone0, bone1):
+                continue
+            mat0 = matmul(bone0.matrix, bone0.bone.matrix_local.inverted())
+            mat1 = matmul(bone1.matrix, bone1.bone.matrix_local.inverted())
+            rot0 = mat0.to_euler('YXZ').to_quaternion()
+            rot1 = mat1.to_euler('YXZ').to_quaternion()
+            if rot1.dot(rot0) < 0:
+                rot1 = -rot1
+            pairs.append((index, [tuple(i) for i in mat0], [tuple(i) for i in mat1], tuple(rot0), tuple(rot1), tuple(mat0.to_scale()), tuple(mat1.to_scale())))
+        if not pairs:
+            return
+
+        index, mat0, mat1, rot0, rot1, s0, s1 = (np.array(i) for i in zip(*pairs))
+        # the pair of each updated vertex
+        pair = np.repeat(np.arange(len(pairs)), offsets[index+1] - offsets[index])
+        sel = np.concatenate([np.arange(offsets[i], offsets[i+1]) for i in index.tolist()])
+        w0, w1 = weights[sel, 0:1], weights[sel, 1:2]
+
+        rot = rot0[pair]*w0 + rot1[pair]*w1
+        mat_rot = _quaternion_matrices(rot / np.linalg.norm(rot, axis=1, keepdims=True))
+        if use_scale:
+            mat_rot *= (s0[pair]*w0 + s1[pair]*w1)[:, None, :]
+        m0, m1 = mat0[pair], mat1[pair]
+        co = np.einsum('nij,nj->ni', mat_rot, pos_c[sel])
+        co += (np.einsum('nij,nj->ni', m0[:, :3, :3], cr0[sel]) + m0[:, :3, 3]) * w0
+        co += (np.einsum('nij,nj->ni', m1[:, :3, :3], cr1[sel]) + m1[:, :3, 3]) * w1
+        shapekey_data[vids[sel]] = co
+
     @classmethod
     def register_driver_function(cls):
         if 'mmd_sdef_driver' not in bpy.app.driver_namespace:
@@ -224,24 +274,23 @@ class FnSDEF():
     BENCH_LOOP=10
     @classmethod
     def __get_benchmark_result(cls, obj, shapkey, use_scale, use_skip):
+        kernels = (('default', False, False), ('bulk_update', True, False), ('vectorized', True, True))
         # warmed up
-        cls.driver_function(shapkey, obj.name, bulk_update=True, use_skip=False, use_scale=use_scale)
-        cls.driver_function(shapkey, obj.name, bulk_update=False, use_skip=False, use_scale=use_scale)
+        for name, bulk_update, vectorized in kernels:
+            cls.driver_function(shapkey, obj.name, bulk_update=bulk_update, use_skip=False, use_scale=use_scale, vectorized=vectorized)
         # benchmark
-        t = time.time()
-        for i in range(cls.BENCH_LOOP):
-            cls.driver_function(shapkey, obj.name, bulk_update=False, use_skip=False, use_scale=use_scale)
-        default_time = time.time() - t
-        t = time.time()
-        for i in range(cls.BENCH_LOOP):
-            cls.driver_function(shapkey, obj.name, bulk_update=True, use_skip=False, use_scale=use_scale)
-        bulk_time = time.time() - t
-        result = default_time > bulk_time
-        print('FnSDEF:benchmark: default %.4f vs bulk_update %.4f => bulk_update=%s' % (default_time, bulk_time, result))
-        return result
+        times = []
+        for name, bulk_update, vectorized in kernels:
+            t = time.time()
+            for i in range(cls.BENCH_LOOP):
+                cls.driver_function(shapkey, obj.name, bulk_update=bulk_update, use_skip=False, use_scale=use_scale, vectorized=vectorized)
+            times.append(time.time() - t)
+        name, bulk_update, vectorized = kernels[times.index(min(times))]
+        print('FnSDEF:benchmark: default %.4f vs bulk_update %.4f vs vectorized %.4f => %s' % (tuple(times) + (name,)))
+        return bulk_update, vectorized
 
     @classmethod
-    def bind(cls, obj, bulk_update=None, use_skip=True, use_scale=False):
+    def bind(cls, obj, bulk_update=None, use_skip=True, use_scale=False, vectorized=False):
         # Unbind first
         cls.unbind(obj)
         if not cls.has_sdef_data(obj):
@@ -252,7 +301,8 @@ class FnSDEF():
         cls.__sdef_muted(obj, shapekey)
         cls.register_driver_function()
         if bulk_update is None:
-            bulk_update = cls.__get_benchmark_result(obj, shapekey, use_scale, use_skip)
+            bulk_update, vectorized = cls.__get_benchmark_result(obj, shapekey, use_scale, use_skip)
+        bulk_update = bulk_update or vectorized
         # Add the driver to the shapekey
         f = obj.data.shape_keys.driver_add('key_blocks["'+cls.SHAPEKEY_NAME+'"].value', -1)
         if hasattr(f.driver, 'show_debug_info'):
@@ -275,11 +325,11 @@ class FnSDEF():
                 var.targets[0].bone_target = name
         if hasattr(f.driver, 'use_self'): # Blender 2.78+
             f.driver.use_self = True
-            param = (bulk_update, use_skip, use_scale)
-            f.driver.expression = 'mmd_sdef_driver(self, obj, bulk_update={}, use_skip={}, use_scale={})'.format(*param)
+            param = (bulk_update, use_skip, use_scale, vectorized)
+            f.driver.expression = 'mmd_sdef_driver(self, obj, bulk_update={}, use_skip={}, use_scale={}, vectorized={})'.format(*param)
         else:
-            param = (obj.name, bulk_update, use_skip, use_scale)
-            f.driver.expression = 'mmd_sdef_driver_wrap("{}", bulk_update={}, use_skip={}, use_scale={})'.format(*param)
+            param = (obj.name, bulk_update, use_skip, use_scale, vectorized)
+            f.driver.expression = 'mmd_sdef_driver_wrap("{}", bulk_update={}, use_skip={}, use_scale={}, vectorized={})'.format(*param)
         return True
 
     @classmethod
@@ -303,6 +353,8 @@ class FnSDEF():
             valid_keys = set(_hash(i) for i in bpy.data.objects if i.type == 'MESH' and i != obj)
             for key in (cls.g_verts.keys()-valid_keys):
                 del cls.g_verts[key]
+            for key in (cls.g_vert_arrays.keys()-cls.g_verts.keys()):
+                del cls.g_vert_arrays[key]
             for key in (cls.g_shapekey_data.keys()-cls.g_verts.keys()):
                 del cls.g_shapekey_data[key]
             for key in (cls.g_bone_check.keys()-cls.g_verts.keys()):
@@ -311,11 +363,24 @@ class FnSDEF():
             key = _hash(obj)
             if key in cls.g_verts:
                 del cls.g_verts[key]
+            if key in cls.g_vert_arrays:
+                del cls.g_vert_arrays[key]
             if key in cls.g_shapekey_data:
                 del cls.g_shapekey_data[key]
             if key in cls.g_bone_check:
                 del cls.g_bone_check[key]
         else:
             cls.g_verts = {}
+            cls.g_vert_arrays = {}
             cls.g_bone_check = {}
             cls.g_shapekey_data = {}
+
+
+def _quaternion_matrices(quaternions):
+    # Quaternion.to_matrix() of (n, 4) normalized (w, x, y, z) quaternions
+    w, x, y, z = quaternions.T
+    return np.stack((
+        1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y),
+        2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x),
+        2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y),
+        ), axis=1).reshape(-1, 3, 3)
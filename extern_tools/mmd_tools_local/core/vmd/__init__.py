@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 import struct
+import io
+import functools
 import collections
 
+import numpy as np
+
+from mmd_tools_local.core.pmx import LazyList, _isBuilt
+
 class InvalidFileError(Exception):
     pass
 
@@ -12,6 +18,11 @@ def _toShiftJisString(byteString):
 def _toShiftJisBytes(string):
     return string.encode('shift_jis', errors='replace')
 
+def _readRecords(fin, dtype, count):
+    # The complete records of count, decoded with one frombuffer
+    data = fin.read(count*dtype.itemsize)
+    return np.frombuffer(data, dtype, len(data)//dtype.itemsize)
+
 
 class Header:
     VMD_SIGN = b'Vocaloid Motion Data 0002'
@@ -33,7 +44,36 @@ class Header:
         return '<Header model_name %s>'%(self.model_name)
 
 
-class BoneFrameKey:
+class _FrameKeyArrays:
+    """ Conversion between frame objects and structured arrays of DTYPE, one row per frame """
+    DTYPE = None
+
+    @staticmethod
+    def fixArray(frames):
+        pass
+
+    @classmethod
+    def fromArray(cls, frames):
+        columns = [frames[name].tolist() for name in frames.dtype.names]
+        frameKeys = []
+        for values in zip(*columns):
+            frameKey = cls()
+            frameKey.__dict__.update(zip(frames.dtype.names, values))
+            frameKeys.append(frameKey)
+        return frameKeys
+
+    @classmethod
+    def toArray(cls, frameKeys):
+        frames = np.zeros(len(frameKeys), cls.DTYPE)
+        if frameKeys:
+            for name in cls.DTYPE.names:
+                frames[name] = [getattr(frameKey, name) for frameKey in frameKeys]
+        return frames
+
+
+class BoneFrameKey(_FrameKeyArrays):
+    DTYPE = np.dtype([('frame_number', '<u4'), ('location', '<f4', 3), ('rotation', '<f4', 4), ('interp', 'i1', 64)])
+
     def __init__(self):
         self.frame_number = 0
         self.location = []
@@ -48,6 +88,10 @@ class BoneFrameKey:
             self.rotation = (0, 0, 0, 1)
         self.interp = list(struct.unpack('<64b', fin.read(64)))
 
+    @staticmethod
+    def fixArray(frames):
+        frames['rotation'][~frames['rotation'].any(axis=1)] = (0, 0, 0, 1)
+
     def save(self, fin):
         fin.write(struct.pack('<L', self.frame_number))
         fin.write(struct.pack('<fff', *self.location))
@@ -62,7 +106,9 @@ class BoneFrameKey:
             )
 
 
-class ShapeKeyFrameKey:
+class ShapeKeyFrameKey(_FrameKeyArrays):
+    DTYPE = np.dtype([('frame_number', '<u4'), ('weight', '<f4')])
+
     def __init__(self):
         self.frame_number = 0
         self.weight = 0.0
@@ -82,7 +128,11 @@ class ShapeKeyFrameKey:
             )
 
 
-class CameraKeyFrameKey:
+class CameraKeyFrameKey(_FrameKeyArrays):
+    # persp holds the file value, 0 is perspective
+    DTYPE = np.dtype([('frame_number', '<u4'), ('distance', '<f4'), ('location', '<f4', 3), ('rotation', '<f4', 3),
+                      ('interp', 'i1', 24), ('angle', '<u4'), ('persp', 'i1')])
+
     def __init__(self):
         self.frame_number = 0
         self.distance = 0.0
@@ -102,6 +152,19 @@ class CameraKeyFrameKey:
         self.persp, = struct.unpack('<b', fin.read(1))
         self.persp = (self.persp == 0)
 
+    @classmethod
+    def fromArray(cls, frames):
+        frameKeys = super(CameraKeyFrameKey, cls).fromArray(frames)
+        for frameKey in frameKeys:
+            frameKey.persp = (frameKey.persp == 0)
+        return frameKeys
+
+    @classmethod
+    def toArray(cls, frameKeys):
+        frames = super(CameraKeyFrameKey, cls).toArray(frameKeys)
+        frames['persp'] = [0 if frameKey.persp else 1 for frameKey in frameKeys]
+        return frames
+
     def save(self, fin):
         fin.write(struct.pack('<L', self.frame_number))
         fin.write(struct.pack('<f', self.distance))
@@ -122,7 +185,9 @@ class CameraKeyFrameKey:
             )
 
 
-class LampKeyFrameKey:
+class LampKeyFrameKey(_FrameKeyArrays):
+    DTYPE = np.dtype([('frame_number', '<u4'), ('color', '<f4', 3), ('direction', '<f4', 3)])
+
     def __init__(self):
         self.frame_number = 0
         self.color = []
@@ -210,6 +275,7 @@ class PropertyFrameKey:
 class _AnimationBase(collections.defaultdict):
     def __init__(self):
         collections.defaultdict.__init__(self, list)
+        self.frame_arrays = None
 
     @staticmethod
     def frameClass():
@@ -225,6 +291,74 @@ class _AnimationBase(collections.defaultdict):
             frameKey.load(fin)
             self[name].append(frameKey)
 
+    def loadArrays(self, fin):
+        """ Loads the frames of each name as arrays, the frame objects are only built when they are accessed """
+        count, = struct.unpack('<L', fin.read(4))
+        print('loading %s... %d'%(self.__class__.__name__, count))
+        cls = self.frameClass()
+        records = _readRecords(fin, self.__recordDtype(), count)
+        frames = np.empty(len(records), cls.DTYPE)
+        for name in cls.DTYPE.names:
+            frames[name] = records[name]
+        cls.fixArray(frames)
+
+        # Different bytes after the terminating NUL decode to the same name, names keep the order of their first frame
+        raw_names, first_indices, inverse = np.unique(records['name'], return_index=True, return_inverse=True)
+        # the names are kept in a list too, dicts don't keep the insertion order before Python 3.6 (Blender 2.79)
+        name_ids, names = {}, []
+        raw_name_ids = np.empty(len(raw_names), np.int64)
+        for i in np.argsort(first_indices).tolist():
+            name = _toShiftJisString(raw_names[i])
+            if name not in name_ids:
+                name_ids[name] = len(names)
+                names.append(name)
+            raw_name_ids[i] = name_ids[name]
+        frame_name_ids = raw_name_ids[inverse.ravel()]
+        counts = np.bincount(frame_name_ids, minlength=len(names))
+        frames = frames[np.argsort(frame_name_ids, kind='mergesort')] # stable, kind='stable' needs numpy 1.15
+
+        self.frame_arrays = {}
+        for name, name_frames in zip(names, np.split(frames, np.cumsum(counts)[:-1])):
+            self.setFrameArrays(name, name_frames)
+        if len(records) < count:
+            raise struct.error('unexpected end of file')
+
+    def setFrameArrays(self, name, frames):
+        """ Sets the frames of a name from an array of frameClass().DTYPE, the frame objects are only built when they are accessed """
+        if self.frame_arrays is None:
+            self.frame_arrays = {}
+        self.frame_arrays[name] = frames
+        self[name] = LazyList(len(frames), functools.partial(self.frameClass().fromArray, frames))
+
+    def getFrameArrays(self):
+        """ The frames of each name as arrays of frameClass().DTYPE in file order,
+        built from the frame objects if they were used since loading
+        """
+        frame_arrays = {}
+        for name, frameKeys in self.items():
+            if self.frame_arrays is not None and name in self.frame_arrays and not _isBuilt(frameKeys):
+                frame_arrays[name] = self.frame_arrays[name]
+            else:
+                frame_arrays[name] = self.frameClass().toArray(frameKeys)
+        return frame_arrays
+
+    def saveArrays(self, fin):
+        frame_arrays = self.getFrameArrays()
+        count = sum([len(i) for i in frame_arrays.values()])
+        fin.write(struct.pack('<L', count))
+        for name, frames in frame_arrays.items():
+            records = np.empty(len(frames), self.__recordDtype())
+            records['name'] = _toShiftJisBytes(name)
+            for field in frames.dtype.names:
+                records[field] = frames[field]
+            fin.write(records.tobytes())
+
+    @classmethod
+    def __recordDtype(cls):
+        # The name of each frame followed by its frameClass().DTYPE fields
+        dtype = cls.frameClass().DTYPE
+        return np.dtype([('name', 'S15')] + [(name, dtype.fields[name][0]) for name in dtype.names])
+
     def save(self, fin):
         count = sum([len(i) for i in self.values()])
         fin.write(struct.pack('<L', count))
@@ -252,6 +386,23 @@ class _AnimationListBase(list):
             frameKey.load(fin)
             self.append(frameKey)
 
+    def loadArrays(self, fin):
+        count, = struct.unpack('<L', fin.read(4))
+        print('loading %s... %d'%(self.__class__.__name__, count))
+        cls = self.frameClass()
+        frames = np.array(_readRecords(fin, cls.DTYPE, count))
+        cls.fixArray(frames)
+        self.extend(cls.fromArray(frames))
+        if len(frames) < count:
+            raise struct.error('unexpected end of file')
+
+    def getFrameArrays(self):
+        return self.frameClass().toArray(self)
+
+    def saveArrays(self, fin):
+        fin.write(struct.pack('<L', len(self)))
+        fin.write(self.getFrameArrays().tobytes())
+
     def save(self, fin):
         fin.write(struct.pack('<L', len(self)))
         for frameKey in self:
@@ -324,9 +475,15 @@ class File:
         self.propertyAnimation = None
 
     def load(self, **args):
+        """ Loads a vmd file. in_memory decodes the bone/morph/camera/lamp frames as arrays,
+        the bone and morph frame objects are only built when they are accessed.
+        """
         path = args['filepath']
+        in_memory = args.get('in_memory', True)
 
         with open(path, 'rb') as fin:
+            if in_memory:
+                fin = io.BytesIO(fin.read())
             self.filepath = path
             self.header = Header()
             self.boneAnimation = BoneAnimation()
@@ -338,17 +495,25 @@ class File:
 
             self.header.load(fin)
             try:
-                self.boneAnimation.load(fin)
-                self.shapeKeyAnimation.load(fin)
-                self.cameraAnimation.load(fin)
-                self.lampAnimation.load(fin)
+                if in_memory:
+                    self.boneAnimation.loadArrays(fin)
+                    self.shapeKeyAnimation.loadArrays(fin)
+                    self.cameraAnimation.loadArrays(fin)
+                    self.lampAnimation.loadArrays(fin)
+                else:
+                    self.boneAnimation.load(fin)
+                    self.shapeKeyAnimation.load(fin)
+                    self.cameraAnimation.load(fin)
+                    self.lampAnimation.load(fin)
                 self.selfShadowAnimation.load(fin)
                 self.propertyAnimation.load(fin)
             except struct.error:
                 pass # no valid camera/lamp data
 
     def save(self, **args):
+        """ Saves a vmd file. in_memory writes the bone/morph/camera/lamp frames from arrays into one buffer. """
         path = args.get('filepath', self.filepath)
+        in_memory = args.get('in_memory', True)
 
         header = self.header or Header()
         boneAnimation = self.boneAnimation or BoneAnimation()
@@ -358,12 +523,20 @@ class File:
         selfShadowAnimation = self.selfShadowAnimation or SelfShadowAnimation()
         propertyAnimation = self.propertyAnimation or PropertyAnimation()
 
-        with open(path, 'wb') as fin:
+        with open(path, 'wb') as fout:
+            fin = io.BytesIO() if in_memory else fout
             header.save(fin)
-            boneAnimation.save(fin)
-            shapeKeyAnimation.save(fin)
-            cameraAnimation.save(fin)
-            lampAnimation.save(fin)
+            if in_memory:
+                boneAnimation.saveArrays(fin)
+                shapeKeyAnimation.saveArrays(fin)
+                cameraAnimation.saveArrays(fin)
+                lampAnimation.saveArrays(fin)
+            else:
+                boneAnimation.save(fin)
+                shapeKeyAnimation.save(fin)
+                cameraAnimation.save(fin)
+                lampAnimation.save(fin)
             selfShadowAnimation.save(fin)
             propertyAnimation.save(fin)
-
+            if in_memory:
+                fout.write(fin.getvalue())
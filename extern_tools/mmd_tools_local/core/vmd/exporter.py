@@ -6,12 +6,13 @@ import re
 import bpy
 import math
 import mathutils
+import numpy as np
 
 from mmd_tools_local.core import vmd
 from mmd_tools_local.core.camera import MMDCamera
 from mmd_tools_local.core.lamp import MMDLamp
 
-from mmd_tools_local.core.vmd.importer import _FnBezier
+from mmd_tools_local.core.vmd.importer import _FnBezier, _foreach_get
 
 
 class _FCurve:
@@ -47,11 +48,11 @@ class _FCurve:
     @staticmethod
     def getVMDControlPoints(kp0, kp1):
         if kp0.interpolation == 'BEZIER':
-            return _FCurve.__toVMDControlPoints(_FnBezier.from_fcurve(kp0, kp1))
+            return _FCurve.toVMDControlPoints(_FnBezier.from_fcurve(kp0, kp1))
         return ((20, 20), (107, 107))
 
     @staticmethod
-    def __toVMDControlPoints(bezier):
+    def toVMDControlPoints(bezier):
         p0, p1, p2, p3 = bezier.points
 
         dx, dy = p3 - p0
@@ -100,8 +101,8 @@ class _FCurve:
                 bz = _FnBezier.from_fcurve(prev_kp, kp)
                 for f in frames[:-1]:
                     b1, bz, pt = bz.split_by_x(f)
-                    yield [pt.y, self.__toVMDControlPoints(b1)]
-                yield [bz.points[-1].y, self.__toVMDControlPoints(bz)]
+                    yield [pt.y, self.toVMDControlPoints(b1)]
+                yield [bz.points[-1].y, self.toVMDControlPoints(bz)]
             else:
                 for f in frames:
                     yield [evaluate(f), ((20, 20), (107, 107))]
@@ -111,6 +112,102 @@ class _FCurve:
             yield [prev_kp.co[1], ((20, 20), (107, 107))]
 
 
+class _Keyframe:
+    # The keyframe point attributes used by _FnBezier.from_fcurve
+    def __init__(self, co, handle_left, handle_right):
+        self.co = mathutils.Vector(co)
+        self.handle_left = mathutils.Vector(handle_left)
+        self.handle_right = mathutils.Vector(handle_right)
+
+
+class _FCurveArrays:
+    """ _FCurve sampling all frames at once from the keyframe arrays of the F-Curve,
+    the control points are (x1, y1, x2, y2) rows instead of ((x1, y1), (x2, y2)) tuples
+    """
+    CONSTANT, LINEAR, BEZIER = 0, 1, 2
+    DEFAULT_CONTROL_POINTS = (20, 20, 107, 107)
+
+    def __init__(self, default_value):
+        self.__default_value = default_value
+        self.__fcurve = None
+
+    def setFCurve(self, fcurve):
+        assert(fcurve.is_valid and self.__fcurve is None)
+        self.__fcurve = fcurve
+        keyframe_points = fcurve.keyframe_points
+        co = _foreach_get(keyframe_points, 'co', 2)
+        order = np.argsort(co[:, 0], kind='mergesort') # stable, kind='stable' needs numpy 1.15
+        self.__co = co = co[order]
+        self.__handle_left = hl = _foreach_get(keyframe_points, 'handle_left', 2)[order]
+        self.__handle_right = hr = _foreach_get(keyframe_points, 'handle_right', 2)[order]
+        self.__interpolation = _foreach_get_enum(keyframe_points, 'interpolation', ('CONSTANT', 'LINEAR', 'BEZIER'))[order]
+        self.__keys = np.trunc(co[:, 0].astype(np.float64) + 0.5).astype(np.int64)
+
+        # The beziers between keyframes which can overshoot or get their handles corrected by _FnBezier.from_fcurve
+        p0, p1, p2, p3 = co[:-1], hr[:-1], hl[1:], co[1:]
+        y_min, y_max = np.minimum(p0[:, 1], p3[:, 1]), np.maximum(p0[:, 1], p3[:, 1])
+        self.__irregular = ((p1[:, 0] > p3[:, 0]) | (p0[:, 0] > p2[:, 0]) | (p1[:, 0] > p2[:, 0]) |
+                            (p1[:, 1] > y_max) | (p1[:, 1] < y_min) | (p2[:, 1] > y_max) | (p2[:, 1] < y_min))
+
+    def __keyframe(self, index):
+        return _Keyframe(self.__co[index].tolist(), self.__handle_left[index].tolist(), self.__handle_right[index].tolist())
+
+    def frameNumbers(self):
+        if self.__fcurve is None:
+            return set()
+        x = self.__co[:, 0].astype(np.float64)
+        interpolation = self.__interpolation[:-1]
+        gaps = (interpolation != self.LINEAR) & (x[1:] - x[:-1] > 2.5)
+        frames = set(self.__keys.tolist())
+        frames.update(np.trunc(x[1:][gaps & (interpolation == self.CONSTANT)] - 0.5).astype(np.int64).tolist())
+        for i in np.flatnonzero(gaps & (interpolation == self.BEZIER) & self.__irregular).tolist():
+            bz = _FnBezier.from_fcurve(self.__keyframe(i), self.__keyframe(i+1))
+            frames.update(int(bz.evaluate(t).x+0.5) for t in bz.find_critical())
+        return frames
+
+    def sampleFrames(self, frame_numbers):
+        """ The values and the VMD control points of _FCurve.sampleFrames for the sorted frame_numbers array """
+        count = len(frame_numbers)
+        control_points = np.tile(np.array(self.DEFAULT_CONTROL_POINTS, np.int64), (count, 1))
+        if self.__fcurve is None or len(self.__keys) < 1: # no key frames
+            return np.full(count, self.__default_value), control_points
+
+        keys, co = self.__keys, self.__co
+        y = co[:, 1].astype(np.float64)
+        # The first keyframe of the same frame gives the value, the last one starts the next segment
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        ends = np.append(starts[1:] - 1, len(keys) - 1)
+        positions = np.searchsorted(frame_numbers, keys[starts])
+        assert(positions[-1] < count and (frame_numbers[positions] == keys[starts]).all())
+
+        values = np.empty(count)
+        values[:positions[0]+1] = y[starts[0]] # starting key frames
+        values[positions[-1]+1:] = y[ends[-1]] # ending key frames
+        prev, curr = ends[:-1], starts[1:]
+        values[positions[1:]] = y[curr]
+
+        bezier = self.__interpolation[prev] == self.BEZIER
+        single = (positions[1:] - positions[:-1]) == 1
+        regular = bezier & single & ~self.__irregular[prev]
+        control_points[positions[1:][regular]] = _vmd_control_points(
+            co[prev[regular]], self.__handle_right[prev[regular]], self.__handle_left[curr[regular]], co[curr[regular]])
+
+        frame_list = frame_numbers.tolist()
+        for j in np.flatnonzero(bezier & ~regular).tolist():
+            bz = _FnBezier.from_fcurve(self.__keyframe(prev[j]), self.__keyframe(curr[j]))
+            for k in range(positions[j]+1, positions[j+1]):
+                b1, bz, pt = bz.split_by_x(frame_list[k])
+                values[k] = pt.y
+                control_points[k] = sum(_FCurve.toVMDControlPoints(b1), ())
+            control_points[positions[j+1]] = sum(_FCurve.toVMDControlPoints(bz), ())
+
+        evaluate = self.__fcurve.evaluate
+        for j in np.flatnonzero(~bezier & ~single).tolist():
+            for k in range(positions[j]+1, positions[j+1]+1):
+                values[k] = evaluate(frame_list[k])
+        return values, control_points
+
+
 class VMDExporter:
 
     def __init__(self):
@@ -119,6 +216,7 @@ class VMDExporter:
         self.__frame_end = float('inf')
         self.__bone_converter_cls = vmd.importer.BoneConverter
         self.__ik_fcurves = {}
+        self.__columnar = True
 
     def __allFrameKeys(self, curves):
         all_frames = set()
@@ -149,6 +247,30 @@ class VMDExporter:
                 break
             yield data
 
+    def __allFrameArrays(self, curves):
+        # __allFrameKeys as the frame numbers and the (values, control points) arrays of each curve
+        all_frames = set()
+        for i in curves:
+            all_frames |= i.frameNumbers()
+
+        if len(all_frames) < 1:
+            return np.zeros(0, np.int64), [i.sampleFrames(np.zeros(0, np.int64)) for i in curves]
+
+        frame_start = min(all_frames)
+        if frame_start < self.__frame_start:
+            frame_start = self.__frame_start
+            all_frames.add(frame_start)
+
+        frame_end = max(all_frames)
+        if frame_end > self.__frame_end:
+            frame_end = self.__frame_end
+            all_frames.add(frame_end)
+
+        all_frames = np.array(sorted(all_frames), np.int64)
+        all_keys = [i.sampleFrames(all_frames) for i in curves]
+        mask = (all_frames >= frame_start) & (all_frames <= frame_end)
+        return all_frames[mask], [(values[mask], control_points[mask]) for values, control_points in all_keys]
+
     @staticmethod
     def __minRotationDiff(prev_q, curr_q):
         t1 = (prev_q.w - curr_q.w)**2 + (prev_q.x - curr_q.x)**2 + (prev_q.y - curr_q.y)**2 + (prev_q.z - curr_q.z)**2
@@ -180,6 +302,24 @@ class VMDExporter:
             r_x1, x_y1, y_y1, z_y1, r_y1, x_x2, y_x2, z_x2, r_x2, x_y2, y_y2, z_y2, r_y2,    0,    0,    0,
             ]
 
+    @staticmethod
+    def __getVMDBoneInterpolations(x_axis, y_axis, z_axis, rotation):
+        # __getVMDBoneInterpolation of (n, 4) control point arrays
+        values = np.stack((x_axis, y_axis, z_axis, rotation), axis=2).reshape(-1, 16)
+        interp = np.zeros((len(values), 64), np.int8)
+        for i in range(4):
+            interp[:, 16*i:16*(i+1)-i] = values[:, i:]
+        return interp
+
+    @staticmethod
+    def __pickRotationInterpolations(rotation_interps):
+        # __pickRotationInterpolation of (n, 4) control point arrays, the first one which is not the default
+        picked = np.tile(np.array(_FCurveArrays.DEFAULT_CONTROL_POINTS, np.int64), (len(rotation_interps[0]), 1))
+        for ir in reversed(rotation_interps):
+            mask = (ir != _FCurveArrays.DEFAULT_CONTROL_POINTS).any(axis=1)
+            picked[mask] = ir[mask]
+        return picked
+
     @staticmethod
     def __pickRotationInterpolation(rotation_interps):
         for ir in rotation_interps:
@@ -215,6 +355,7 @@ class VMDExporter:
         vmd_bone_anim = vmd.BoneAnimation()
 
         anim_bones = {}
+        curve_cls = _FCurveArrays if self.__columnar else _FCurve
         rePath = re.compile(r'^pose\.bones\["(.+)"\]\.([a-z_]+)$')
         prop_rotation_map = {'QUATERNION':'rotation_quaternion', 'AXIS_ANGLE':'rotation_axis_angle'}
         for fcurve in animation_data.action.fcurves:
@@ -242,7 +383,7 @@ class VMDExporter:
                     data += list(bone.rotation_axis_angle)
                 else:
                     data += ([bone.rotation_mode] + list(bone.rotation_euler))
-                anim_bones[bone] = [_FCurve(i) for i in data] # x, y, z, rw, rx, ry, rz
+                anim_bones[bone] = [curve_cls(i) for i in data] # x, y, z, rw, rx, ry, rz
             bone_curves = anim_bones[bone]
             if prop_name == 'location': # x, y, z
                 bone_curves[fcurve.array_index].setFCurve(fcurve)
@@ -256,10 +397,16 @@ class VMDExporter:
         for bone, bone_curves in anim_bones.items():
             key_name = bone.mmd_bone.name_j or bone.name
             assert(key_name not in vmd_bone_anim) # VMD bone name collision
-            frame_keys = vmd_bone_anim[key_name]
 
             get_xyzw = self.__xyzw_from_rotation_mode(bone.rotation_mode)
             converter = self.__bone_converter_cls(bone, self.__scale, invert=True)
+            if self.__columnar:
+                frames = self.__boneFrameArrays(bone_curves, get_xyzw, converter)
+                vmd_bone_anim.setFrameArrays(key_name, frames)
+                logging.info('(bone) frames:%5d  name: %s', len(frames), key_name)
+                continue
+
+            frame_keys = vmd_bone_anim[key_name]
             prev_rot = None
             for frame_number, x, y, z, rw, rx, ry, rz in self.__allFrameKeys(bone_curves):
                 key = vmd.BoneFrameKey()
@@ -279,6 +426,29 @@ class VMDExporter:
         logging.info('---- bone animations:%5d  source: %s', len(vmd_bone_anim), armObj.name)
         return vmd_bone_anim
 
+    def __boneFrameArrays(self, bone_curves, get_xyzw, converter):
+        frame_numbers, samples = self.__allFrameArrays(bone_curves)
+        # The locations and rotations are converted with mathutils one by one to get the same values as the frame objects
+        locations, rotations = [], []
+        prev_rot = None
+        for x, y, z, rw, rx, ry, rz in zip(*[values.tolist() for values, _ in samples]):
+            locations.append(converter.convert_location([x, y, z])[:])
+            curr_rot = converter.convert_rotation(get_xyzw([rx, ry, rz, rw]))
+            if prev_rot is not None:
+                curr_rot = self.__minRotationDiff(prev_rot, curr_rot)
+            prev_rot = curr_rot
+            rotations.append(curr_rot[1:] + curr_rot[0:1]) # (w, x, y, z) to (x, y, z, w)
+
+        x, y, z, rw, rx, ry, rz = [control_points for _, control_points in samples]
+        frames = np.zeros(len(frame_numbers), vmd.BoneFrameKey.DTYPE)
+        frames['frame_number'] = frame_numbers - self.__frame_start
+        frames['location'] = np.array(locations).reshape(-1, 3)
+        frames['rotation'] = np.array(rotations).reshape(-1, 4)
+        ir = self.__pickRotationInterpolations([rw, rx, ry, rz])
+        ix, iy, iz = converter.convert_interpolation([x, y, z])
+        frames['interp'] = self.__getVMDBoneInterpolations(ix, iy, iz, ir)
+        return frames
+
 
     def __exportMorphAnimation(self, meshObj):
         if meshObj is None:
@@ -316,11 +486,19 @@ class VMDExporter:
 
             key_name = kb.name
             assert(key_name not in vmd_morph_anim)
-            anim = vmd_morph_anim[key_name]
-
-            curve = _FCurve(kb.value)
+            curve = (_FCurveArrays if self.__columnar else _FCurve)(kb.value)
             curve.setFCurve(fcurve)
 
+            if self.__columnar:
+                frame_numbers, ((weights, _),) = self.__allFrameArrays([curve])
+                frames = np.zeros(len(frame_numbers), vmd.ShapeKeyFrameKey.DTYPE)
+                frames['frame_number'] = frame_numbers - self.__frame_start
+                frames['weight'] = weights
+                vmd_morph_anim.setFrameArrays(key_name, frames)
+                logging.info('(mesh) frames:%5d  name: %s', len(frames), key_name)
+                continue
+
+            anim = vmd_morph_anim[key_name]
             for frame_number, weight in self.__allFrameKeys([curve]):
                 key = vmd.ShapeKeyFrameKey()
                 key.frame_number = frame_number - self.__frame_start
@@ -382,7 +560,7 @@ class VMDExporter:
         data.append(mmd_cam.mmd_camera.angle)
         data.append(mmd_cam.mmd_camera.is_perspective)
         data.append(camera.location.y)
-        cam_curves = [_FCurve(i) for i in data] # x, y, z, rx, ry, rz, fov, persp, distance
+        cam_curves = [(_FCurveArrays if self.__columnar else _FCurve)(i) for i in data] # x, y, z, rx, ry, rz, fov, persp, distance
 
         animation_data = mmd_cam.animation_data
         if animation_data and animation_data.action:
@@ -402,6 +580,11 @@ class VMDExporter:
                 if fcurve.data_path == 'location' and fcurve.array_index == 1: # distance
                     cam_curves[8].setFCurve(fcurve)
 
+        if self.__columnar:
+            vmd_cam_anim.extend(vmd.CameraKeyFrameKey.fromArray(self.__cameraFrameArrays(cam_curves)))
+            logging.info('(camera) frames:%5d  name: %s', len(vmd_cam_anim), mmd_cam.name)
+            return vmd_cam_anim
+
         for frame_number, x, y, z, rx, ry, rz, fov, persp, distance in self.__allFrameKeys(cam_curves):
             key = vmd.CameraKeyFrameKey()
             key.frame_number = frame_number - self.__frame_start
@@ -427,6 +610,22 @@ class VMDExporter:
         logging.info('(camera) frames:%5d  name: %s', len(vmd_cam_anim), mmd_cam.name)
         return vmd_cam_anim
 
+    def __cameraFrameArrays(self, cam_curves):
+        frame_numbers, samples = self.__allFrameArrays(cam_curves)
+        x, y, z, rx, ry, rz, fov, persp, distance = [values for values, _ in samples]
+        frames = np.zeros(len(frame_numbers), vmd.CameraKeyFrameKey.DTYPE)
+        frames['frame_number'] = frame_numbers - self.__frame_start
+        frames['location'] = np.column_stack((x, z, y)) * self.__scale
+        frames['rotation'] = np.column_stack((rx, rz, ry)) # euler
+        frames['angle'] = [int(0.5 + math.degrees(i)) for i in fov.tolist()]
+        frames['distance'] = distance * self.__scale
+        frames['persp'] = np.where(persp.astype(bool), 0, 1)
+
+        x, y, z, rx, ry, rz, fov, persp, distance = [control_points for _, control_points in samples]
+        ir = self.__pickRotationInterpolations([rx, ry, rz])
+        frames['interp'] = np.hstack([i[:, [0, 2, 1, 3]] for i in (x, z, y, ir, distance, fov)])
+        return frames
+
 
     def __exportLampAnimation(self, lampObj):
         if lampObj is None:
@@ -442,7 +641,7 @@ class VMDExporter:
         vmd_lamp_anim = vmd.LampAnimation()
 
         data = list(lamp.data.color) + list(lamp.location)
-        lamp_curves = [_FCurve(i) for i in data] # r, g, b, x, y, z
+        lamp_curves = [(_FCurveArrays if self.__columnar else _FCurve)(i) for i in data] # r, g, b, x, y, z
 
         animation_data = lamp.data.animation_data
         if animation_data and animation_data.action:
@@ -456,6 +655,17 @@ class VMDExporter:
                 if fcurve.data_path == 'location': # x, y, z
                     lamp_curves[3+fcurve.array_index].setFCurve(fcurve)
 
+        if self.__columnar:
+            frame_numbers, samples = self.__allFrameArrays(lamp_curves)
+            r, g, b, x, y, z = [values for values, _ in samples]
+            frames = np.zeros(len(frame_numbers), vmd.LampKeyFrameKey.DTYPE)
+            frames['frame_number'] = frame_numbers - self.__frame_start
+            frames['color'] = np.column_stack((r, g, b))
+            frames['direction'] = -np.column_stack((x, z, y))
+            vmd_lamp_anim.extend(vmd.LampKeyFrameKey.fromArray(frames))
+            logging.info('(lamp) frames:%5d  name: %s', len(vmd_lamp_anim), mmd_lamp.name)
+            return vmd_lamp_anim
+
         for frame_number, r, g, b, x, y, z in self.__allFrameKeys(lamp_curves):
             key = vmd.LampKeyFrameKey()
             key.frame_number = frame_number - self.__frame_start
@@ -474,6 +684,7 @@ class VMDExporter:
         filepath = args.get('filepath', '')
 
         self.__scale = args.get('scale', 1.0)
+        self.__columnar = args.get('columnar', True)
 
         if args.get('use_frame_range', False):
             self.__frame_start = bpy.context.scene.frame_start
@@ -489,7 +700,7 @@ class VMDExporter:
             vmdFile.boneAnimation = self.__exportBoneAnimation(armature)
             vmdFile.shapeKeyAnimation = self.__exportMorphAnimation(mesh)
             vmdFile.propertyAnimation = self.__exportPropertyAnimation(armature)
-            vmdFile.save(filepath=filepath)
+            vmdFile.save(filepath=filepath, in_memory=self.__columnar)
 
         elif camera or lamp:
             vmdFile = vmd.File()
@@ -497,5 +708,24 @@ class VMDExporter:
             vmdFile.header.model_name = u'カメラ・照明'
             vmdFile.cameraAnimation = self.__exportCameraAnimation(camera)
             vmdFile.lampAnimation = self.__exportLampAnimation(lamp)
-            vmdFile.save(filepath=filepath)
-
+            vmdFile.save(filepath=filepath, in_memory=self.__columnar)
+
+
+def _foreach_get_enum(collection, attribute, names):
+    # The index of each enum value in names or -1, older Blender versions don't support foreach_get of enum properties
+    try:
+        values = np.empty(len(collection), np.int32)
+        collection.foreach_get(attribute, values)
+        return np.where(values < len(names), values, -1)
+    except (TypeError, RuntimeError):
+        indices = {name:i for i, name in enumerate(names)}
+        return np.array([indices.get(getattr(i, attribute), -1) for i in collection], np.int32)
+
+def _vmd_control_points(p0, p1, p2, p3):
+    # _FCurve.toVMDControlPoints of the (n, 2) float32 bezier points as (n, 4) rows of x1, y1, x2, y2
+    delta = (p3 - p0).astype(np.float64)
+    points = np.hstack((p1 - p0, p2 - p0)).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        points = np.clip(np.trunc(0.5 + points*127.0/np.tile(delta, 2)), 0, 127)
+    points[(np.abs(delta[:, 1]) < 1e-6) | (np.abs(delta[:, 0]) < 1.5)] = _FCurveArrays.DEFAULT_CONTROL_POINTS
+    return points.astype(np.int64)
@@ -5,6 +5,7 @@ import os
 
 import bpy
 import math
+import numpy as np
 from mathutils import Vector, Quaternion
 
 from mmd_tools_local import utils
@@ -89,6 +90,20 @@ class BoneConverter:
         rot.x, rot.y, rot.z, rot.w = rotation_xyzw
         return Quaternion(matmul(self.__mat, rot.axis) * -1, rot.angle).normalized()
 
+    def convert_locations(self, locations):
+        return np.dot(locations, np.array(self.__mat).T) * self.__scale
+
+    def convert_rotations(self, rotations_xyzw):
+        # convert_rotation of (n, 4) xyzw rotations as (n, 4) wxyz quaternions,
+        # the rotation axis gets transformed and keeps the length of the vector part
+        rotations = rotations_xyzw / np.linalg.norm(rotations_xyzw, axis=1, keepdims=True)
+        vectors = rotations[:, :3]
+        axes = np.dot(vectors, np.array(self.__mat).T) * -1
+        lengths = np.linalg.norm(axes, axis=1, keepdims=True)
+        axes *= np.divide(np.linalg.norm(vectors, axis=1, keepdims=True), lengths, out=np.zeros_like(lengths), where=lengths>0)
+        quaternions = np.hstack((rotations[:, 3:], axes))
+        return quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)
+
 class BoneConverterPoseMode:
     def __init__(self, pose_bone, scale, invert=False):
         mat = pose_bone.matrix.to_3x3()
@@ -126,6 +141,12 @@ class BoneConverterPoseMode:
         rot = matmul(self.__mat_rot, rot.to_matrix()).to_quaternion()
         return Quaternion(matmul(self.__mat, rot.axis) * -1, rot.angle).normalized()
 
+    def convert_locations(self, locations):
+        return np.array([tuple(self.convert_location(i)) for i in locations.tolist()]).reshape(-1, 3)
+
+    def convert_rotations(self, rotations_xyzw):
+        return np.array([tuple(self.convert_rotation(i)) for i in rotations_xyzw.tolist()]).reshape(-1, 4)
+
 
 class _FnBezier:
 
@@ -254,7 +275,7 @@ class _FnBezier:
 
 class VMDImporter:
     def __init__(self, filepath, scale=1.0, bone_mapper=None, use_pose_mode=False,
-            convert_mmd_camera=True, convert_mmd_lamp=True, frame_margin=5, use_mirror=False):
+            convert_mmd_camera=True, convert_mmd_lamp=True, frame_margin=5, use_mirror=False, columnar=True):
         self.__vmdFile = vmd.File()
         self.__vmdFile.load(filepath=filepath)
         logging.debug(str(self.__vmdFile.header))
@@ -265,6 +286,8 @@ class VMDImporter:
         self.__bone_util_cls = BoneConverterPoseMode if use_pose_mode else BoneConverter
         self.__frame_margin = frame_margin + 1
         self.__mirror = use_mirror
+        # columnar adds the keyframes of each F-Curve at once from the frame arrays
+        self.__columnar = columnar
 
 
     @staticmethod
@@ -302,6 +325,8 @@ class VMDImporter:
         compatible_quaternion = self.__minRotationDiff
         class _ConverterWrap:
             convert_location = converter.convert_location
+            convert_locations = converter.convert_locations
+            convert_quaternions = converter.convert_rotations
             convert_interpolation = converter.convert_interpolation
             if mode == 'QUATERNION':
                 convert_rotation = converter.convert_rotation
@@ -327,6 +352,17 @@ class VMDImporter:
                 compatible_rotation = lambda prev, curr: curr.make_compatible(prev) or curr
         return _ConverterWrap
 
+    @staticmethod
+    def __convertRotations(converter, rotations, prev_rot):
+        values = []
+        for rotation in rotations.tolist():
+            curr_rot = converter.convert_rotation(rotation)
+            if prev_rot is not None:
+                curr_rot = converter.compatible_rotation(prev_rot, curr_rot)
+            prev_rot = curr_rot
+            values.append(tuple(curr_rot))
+        return np.array(values).reshape(len(rotations), -1)
+
     def __assignToArmature(self, armObj, action_name=None):
         boneAnim = self.__vmdFile.boneAnimation
         logging.info('---- bone animations:%5d  target: %s', len(boneAnim), armObj.name)
@@ -352,6 +388,7 @@ class VMDImporter:
         dummy_keyframe_points = iter(lambda: _Dummy, None)
         prop_rot_map = {'QUATERNION':'rotation_quaternion', 'AXIS_ANGLE':'rotation_axis_angle'}
 
+        frame_arrays = boneAnim.getFrameArrays() if self.__columnar else None
         bone_name_table = {}
         for name, keyFrames in boneAnim.items():
             num_frame = len(keyFrames)
@@ -376,6 +413,10 @@ class VMDImporter:
             for axis_i in range(len(bone_rotation)):
                 fcurves[3+axis_i] = action.fcurves.new(data_path=data_path, index=axis_i, action_group=bone.name)
 
+            if self.__columnar:
+                self.__assignBoneFrames(fcurves[:len(default_values)], frame_arrays[name], bone, default_values if extra_frame else None)
+                continue
+
             for i in range(len(default_values)):
                 c = fcurves[i]
                 c.keyframe_points.add(extra_frame+num_frame)
@@ -416,8 +457,9 @@ class VMDImporter:
                         self.__setInterpolation(interp[idx:idx+16:4], prev_kp, kp)
                 prev_kps = curr_kps
 
-        for c in action.fcurves:
-            self.__fixFcurveHandles(c)
+        if not self.__columnar:
+            for c in action.fcurves:
+                self.__fixFcurveHandles(c)
 
         # ensure IK's default state
         for b in armObj.pose.bones:
@@ -439,6 +481,39 @@ class VMDImporter:
                     bone.keyframe_insert(data_path='mmd_ik_toggle', frame=frame)
 
 
+    def __assignBoneFrames(self, fcurves, frames, bone, default_values=None):
+        # The keyframes of a bone like __assignToArmature, default_values adds the extra frame
+        frames = frames[np.argsort(frames['frame_number'], kind='mergesort')] # stable, kind='stable' needs numpy 1.15
+        locations = frames['location'].astype(np.float64)
+        rotations = frames['rotation'].astype(np.float64)
+        if self.__mirror: # the mirror functions work on columns too
+            locations = np.array(_MirrorMapper.get_location(locations.T)).T
+            rotations = np.array(_MirrorMapper.get_rotation(rotations.T)).T
+
+        converter = self.__getBoneConverter(bone)
+        prev_rot = default_values[3:] if default_values is not None else None
+        if bone.rotation_mode == 'QUATERNION':
+            rotations = _compatible_quaternions(converter.convert_quaternions(rotations), prev_rot)
+        else:
+            rotations = self.__convertRotations(converter, rotations, prev_rot)
+        values = np.hstack((converter.convert_locations(locations), rotations))
+
+        frame_numbers = frames['frame_number'] + self.__frame_margin
+        indices = tuple(converter.convert_interpolation((0, 16, 32))) + (48,)*(len(fcurves)-3)
+        for i, (c, idx) in enumerate(zip(fcurves, indices)):
+            co = np.column_stack((frame_numbers, values[:, i]))
+            bezier = frames['interp'][:, idx:idx+16:4]
+            start = 0
+            if default_values is not None:
+                co = np.vstack(((1, default_values[i]), co))
+                bezier = np.vstack((np.zeros(4, bezier.dtype), bezier))
+                start = 1
+            keyframes = _FCurveKeyframes(c, co)
+            keyframes.interpolation[:start] = _FCurveKeyframes.LINEAR
+            keyframes.set_bezier(bezier, start)
+            keyframes.fix_handles()
+            keyframes.apply()
+
     def __assignToMesh(self, meshObj, action_name=None):
         shapeKeyAnim = self.__vmdFile.shapeKeyAnimation
         logging.info('---- morph animations:%5d  target: %s', len(shapeKeyAnim), meshObj.name)
@@ -453,6 +528,7 @@ class VMDImporter:
         shapeKeyDict = {k:mirror_map.get(k, v) for k, v in meshObj.data.shape_keys.key_blocks.items()}
 
         from math import floor, ceil
+        frame_arrays = shapeKeyAnim.getFrameArrays() if self.__columnar else None
         for name, keyFrames in shapeKeyAnim.items():
             if name not in shapeKeyDict:
                 logging.warning('WARNING: not found shape key %s (%d frames)', name, len(keyFrames))
@@ -460,12 +536,20 @@ class VMDImporter:
             logging.info('(mesh) frames:%5d  name: %s', len(keyFrames), name)
             shapeKey = shapeKeyDict[name]
             fcurve = action.fcurves.new(data_path='key_blocks["%s"].value'%shapeKey.name)
-            fcurve.keyframe_points.add(len(keyFrames))
-            keyFrames.sort(key=lambda x:x.frame_number)
-            for k, v in zip(keyFrames, fcurve.keyframe_points):
-                v.co = (k.frame_number+self.__frame_margin, k.weight)
-                v.interpolation = 'LINEAR'
-            weights = tuple(i.weight for i in keyFrames)
+            if self.__columnar:
+                frames = frame_arrays[name]
+                frames = frames[np.argsort(frames['frame_number'], kind='mergesort')]
+                keyframes = _FCurveKeyframes(fcurve, np.column_stack((frames['frame_number']+self.__frame_margin, frames['weight'])))
+                keyframes.interpolation[:] = _FCurveKeyframes.LINEAR
+                keyframes.apply()
+                weights = frames['weight'].tolist()
+            else:
+                fcurve.keyframe_points.add(len(keyFrames))
+                keyFrames.sort(key=lambda x:x.frame_number)
+                for k, v in zip(keyFrames, fcurve.keyframe_points):
+                    v.co = (k.frame_number+self.__frame_margin, k.weight)
+                    v.interpolation = 'LINEAR'
+                weights = tuple(i.weight for i in keyFrames)
             shapeKey.slider_min = min(shapeKey.slider_min, floor(min(weights)))
             shapeKey.slider_max = max(shapeKey.slider_max, ceil(max(weights)))
 
@@ -526,6 +610,10 @@ class VMDImporter:
         fcurves.append(parent_action.fcurves.new(data_path='mmd_camera.angle')) # fov
         fcurves.append(parent_action.fcurves.new(data_path='mmd_camera.is_perspective')) # persp
         fcurves.append(distance_action.fcurves.new(data_path='location', index=1)) # dis
+        if self.__columnar:
+            self.__assignCameraFrames(fcurves, cameraAnim.getFrameArrays())
+            return
+
         for c in fcurves:
             c.keyframe_points.add(len(cameraAnim))
 
@@ -553,6 +641,31 @@ class VMDImporter:
                 self.detectCameraChange(fcurve)
 
 
+    def __assignCameraFrames(self, fcurves, frames):
+        # The keyframes of the camera like __assignToCamera
+        frames = frames[np.argsort(frames['frame_number'], kind='mergesort')]
+        locations = frames['location'].astype(np.float64)
+        rotations = frames['rotation'].astype(np.float64)
+        if self.__mirror: # the mirror functions work on columns too
+            locations = np.array(_MirrorMapper.get_location(locations.T)).T
+            rotations = np.array(_MirrorMapper.get_rotation3(rotations.T)).T
+        locations *= self.__scale
+
+        frame_numbers = frames['frame_number'] + self.__frame_margin
+        values = (locations[:, 0], locations[:, 2], locations[:, 1], rotations[:, 0], rotations[:, 2], rotations[:, 1],
+                  np.radians(frames['angle']), frames['persp'] == 0, frames['distance'].astype(np.float64)*self.__scale)
+        indices = (0, 8, 4, 12, 12, 12, 20, None, 16) # x, y, z, rx, ry, rz, fov, persp, dis
+        for fcurve, value, idx in zip(fcurves, values, indices):
+            keyframes = _FCurveKeyframes(fcurve, np.column_stack((frame_numbers, value)))
+            if idx is None:
+                keyframes.interpolation[:] = _FCurveKeyframes.CONSTANT
+            else:
+                keyframes.set_bezier(frames['interp'][:, (idx, idx+2, idx+1, idx+3)])
+            keyframes.fix_handles()
+            if fcurve.data_path == 'rotation_euler':
+                keyframes.set_constant_changes(threshold=10.0) # detectCameraChange
+            keyframes.apply()
+
     @staticmethod
     def detectLampChange(fcurve, threshold=0.1):
         frames = list(fcurve.keyframe_points)
@@ -582,6 +695,10 @@ class VMDImporter:
         lampObj.animation_data_create().action = location_action
 
         _loc = _MirrorMapper.get_location if self.__mirror else lambda i: i
+        if self.__columnar:
+            self.__assignLampFrames(lampObj, color_action, location_action, lampAnim.getFrameArrays(), _loc)
+            return
+
         for keyFrame in lampAnim:
             frame = keyFrame.frame_number + self.__frame_margin
             lampObj.data.color = Vector(keyFrame.color)
@@ -593,6 +710,26 @@ class VMDImporter:
             self.detectLampChange(fcurve)
 
 
+    def __assignLampFrames(self, lampObj, color_action, location_action, frames, _loc):
+        # The keyframes of keyframe_insert in __assignToLamp, the last frame key of a frame replaces the others
+        frame_numbers, indices = np.unique(frames['frame_number'][::-1], return_index=True)
+        indices = len(frames) - 1 - indices
+        colors = frames['color'].astype(np.float64)
+        locations = np.array(_loc(frames['direction'].astype(np.float64).T)).T[:, (0, 2, 1)] * -1 # the mirror functions work on columns too
+
+        frame_numbers = frame_numbers + self.__frame_margin
+        for action, data_path, values, group in ((color_action, 'color', colors, ''), (location_action, 'location', locations, 'Object Transforms')):
+            for i in range(3):
+                fcurve = action.fcurves.new(data_path=data_path, index=i, action_group=group)
+                keyframes = _FCurveKeyframes(fcurve, np.column_stack((frame_numbers, values[indices, i])))
+                if data_path == 'location': # detectLampChange
+                    keyframes.interpolation[:] = _FCurveKeyframes.LINEAR
+                    keyframes.set_constant_changes(threshold=0.1)
+                keyframes.apply()
+                fcurve.update()
+        lampObj.data.color = colors[-1]
+        lampObj.location = locations[-1]
+
     def assign(self, obj, action_name=None):
         if obj is None:
             return
@@ -616,3 +753,98 @@ class VMDImporter:
         else:
             pass
 
+
+class _FCurveKeyframes:
+    """ The keyframes of a new F-Curve as arrays, they are added at once and written with foreach_set by apply().
+    -1 in interpolation and the handle types keeps the value of the added keyframe.
+    """
+    CONSTANT, LINEAR, BEZIER = 0, 1, 2 # values of the interpolation enum
+    FREE = 0 # value of the handle type enum
+    __INTERPOLATION_NAMES = ('CONSTANT', 'LINEAR', 'BEZIER')
+    __HANDLE_TYPE_NAMES = ('FREE',)
+
+    def __init__(self, fcurve, co):
+        self.__keyframe_points = keyframe_points = fcurve.keyframe_points
+        self.co = np.asarray(co, np.float32).reshape(-1, 2)
+        count = len(self.co)
+        keyframe_points.add(count)
+        keyframe_points.foreach_set('co', self.co.ravel())
+        self.handle_left = _foreach_get(keyframe_points, 'handle_left', 2)
+        self.handle_right = _foreach_get(keyframe_points, 'handle_right', 2)
+        self.interpolation = np.full(count, -1, np.int32)
+        self.handle_left_type = np.full(count, -1, np.int32)
+        self.handle_right_type = np.full(count, -1, np.int32)
+
+    def set_bezier(self, bezier, start=0):
+        """ Sets the VMD bezier (x1, y1, x2, y2) of each keyframe to the curve from the previous keyframe,
+        for the keyframes after start, like VMDImporter.__setInterpolation
+        """
+        bezier = np.asarray(bezier, np.float64)[start+1:]
+        if len(bezier) < 1:
+            return
+        co0, co1 = self.co[start:-1].astype(np.float64), self.co[start+1:].astype(np.float64)
+        linear = (bezier[:, 0] == bezier[:, 1]) & (bezier[:, 2] == bezier[:, 3])
+        self.interpolation[start:-1] = np.where(linear, self.LINEAR, self.BEZIER)
+        self.handle_right_type[start:-1] = self.FREE
+        self.handle_left_type[start+1:] = self.FREE
+        d = (co1 - co0) / 127.0
+        self.handle_right[start:-1] = co0 + d * bezier[:, :2]
+        self.handle_left[start+1:] = co0 + d * bezier[:, 2:]
+
+    def fix_handles(self):
+        """ Like VMDImporter.__fixFcurveHandles """
+        self.handle_left_type[0] = self.FREE
+        self.handle_left[0] = self.co[0] + (-1, 0)
+        self.handle_right_type[-1] = self.FREE
+        self.handle_right[-1] = self.co[-1] + (1, 0)
+
+    def set_constant_changes(self, threshold):
+        """ Like VMDImporter.detectCameraChange, a change within one frame becomes CONSTANT """
+        order = np.argsort(self.co[:, 0], kind='mergesort')
+        co = self.co[order].astype(np.float64)
+        changes = (co[1:, 0] - co[:-1, 0] <= 1.0) & (abs(co[:-1, 1] - co[1:, 1]) > threshold)
+        self.interpolation[order[:-1][changes]] = self.CONSTANT
+
+    def apply(self):
+        keyframe_points = self.__keyframe_points
+        _foreach_set_enum(keyframe_points, 'handle_left_type', self.handle_left_type, self.__HANDLE_TYPE_NAMES)
+        _foreach_set_enum(keyframe_points, 'handle_right_type', self.handle_right_type, self.__HANDLE_TYPE_NAMES)
+        keyframe_points.foreach_set('handle_left', self.handle_left.ravel())
+        keyframe_points.foreach_set('handle_right', self.handle_right.ravel())
+        _foreach_set_enum(keyframe_points, 'interpolation', self.interpolation, self.__INTERPOLATION_NAMES)
+
+
+def _foreach_get(collection, attribute, size):
+    array = np.empty(len(collection)*size, np.float32)
+    collection.foreach_get(attribute, array)
+    return array.reshape(-1, size)
+
+def _foreach_set_enum(collection, attribute, values, names):
+    # Sets the values >= 0, older Blender versions don't support foreach_get/foreach_set of enum properties
+    mask = values >= 0
+    if not mask.any():
+        return
+    try:
+        current = np.empty(len(values), np.int32)
+        collection.foreach_get(attribute, current)
+        collection.foreach_set(attribute, np.where(mask, values, current))
+    except (TypeError, RuntimeError):
+        for i in np.flatnonzero(mask).tolist():
+            setattr(collection[i], attribute, names[values[i]])
+
+def _compatible_quaternions(quaternions, prev=None):
+    # VMDImporter.__minRotationDiff of each (w, x, y, z) quaternion and the previous one after its sign change,
+    # a quaternion at the same distance to both signs of the previous one keeps its sign
+    if len(quaternions) < 1:
+        return quaternions
+    previous = np.vstack((quaternions[:1] if prev is None else [prev], quaternions[:-1]))
+    t1 = ((previous - quaternions)**2).sum(axis=1)
+    t2 = ((previous + quaternions)**2).sum(axis=1)
+    flips, resets = t2 < t1, t1 == t2
+    if prev is None:
+        flips[0], resets[0] = False, True
+    index = np.arange(len(quaternions))
+    last_resets = np.maximum.accumulate(np.where(resets, index, -1))
+    flip_counts = np.concatenate(([0], np.cumsum(flips)))
+    signs = np.where((flip_counts[index+1] - flip_counts[last_resets+1]) % 2, -1.0, 1.0)
+    return quaternions * signs[:, None]
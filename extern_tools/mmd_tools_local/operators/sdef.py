@@ -39,6 +39,7 @@ class BindSDEF(Operator):
         name='Mode',
         description='Select mode',
         items = [
+            ('3', 'Vectorized', 'Update all SDEF vertices at once with numpy', 3),
             ('2', 'Bulk', 'Speed up with numpy (may be slower in some cases)', 2),
             ('1', 'Normal', 'Normal mode', 1),
             ('0', '- Auto -', 'Select best mode by benchmark result', 0),
@@ -62,7 +63,7 @@ class BindSDEF(Operator):
 
     def execute(self, context):
         selected_objects = _get_selected_objects(context)
-        param = ((None, False, True)[int(self.mode)], self.use_skip, self.use_scale)
+        param = ((None, False, True, True)[int(self.mode)], self.use_skip, self.use_scale, self.mode == '3')
         count = sum(FnSDEF.bind(i, *param) for i in selected_objects)
         self.report({'INFO'}, 'Binded %d of %d selected mesh(es)'%(count, len(selected_objects)))
         return {'FINISHED'}
@@ -0,0 +1,216 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats, Hotox
+
+# Measures how long the add-on startup takes.
+# It is only active if the environment variable CATS_PROFILE_STARTUP is set, either to the path of the json report
+# or to 1 to write it into the temp folder. See tests/startup_profile.py for running it headless.
+# This gets imported before bpy and the other Cats modules, so it can't use any of them
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+
+from contextlib import contextmanager
+
+report_env = 'CATS_PROFILE_STARTUP'
+default_report_name = 'cats_startup_profile.json'
+
+enabled = bool(os.environ.get(report_env))
+
+
+class ImportTimer:
+    # Meta path finder which times the execution of every module of the given packages.
+    # It doesn't load anything itself, it only wraps the loaders found by the other finders
+
+    def __init__(self, packages):
+        self.packages = packages
+        self.records = []
+        self.stack = []
+        self.finding = set()
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname in self.finding or not fullname.split('.')[0] in self.packages:
+            return None
+
+        # Ask the other finders, without asking this one again
+        self.finding.add(fullname)
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self.finding.discard(fullname)
+
+        loader = spec.loader
+        if loader is not None and hasattr(loader, 'exec_module') and not getattr(loader, 'cats_timed', False):
+            loader.exec_module = self.timed(fullname, loader.exec_module)
+            loader.cats_timed = True
+        return spec
+
+    def timed(self, fullname, exec_module):
+        def exec_module_timed(module):
+            # Children are subtracted from the parent to get the time spent in the module itself
+            self.stack.append(0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                duration = time.perf_counter() - start
+                children = self.stack.pop()
+                if self.stack:
+                    self.stack[-1] += duration
+                self.records.append({
+                    'module': fullname,
+                    'time': duration,
+                    'self_time': duration - children,
+                })
+        return exec_module_timed
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.import_timer = None
+        self.steps = []
+        self.counts = {}
+
+    def start_imports(self, packages):
+        self.import_timer = ImportTimer(packages)
+        sys.meta_path.insert(0, self.import_timer)
+
+    def stop_imports(self):
+        if self.import_timer in sys.meta_path:
+            sys.meta_path.remove(self.import_timer)
+
+    @contextmanager
+    def measure(self, step):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append({
+                'step': step,
+                'time': time.perf_counter() - start,
+            })
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def get_report(self, version_str=''):
+        imports = self.import_timer.records if self.import_timer else []
+        return {
+            'cats_version': version_str,
+            'blender_version': self.get_blender_version(),
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'total_time': time.perf_counter() - self.start_time,
+            'import_time': sum(record['self_time'] for record in imports),
+            'register_time': sum(step['time'] for step in self.steps),
+            'imports': sorted(imports, key=lambda record: record['self_time'], reverse=True),
+            'register': self.steps,
+            'counts': self.counts,
+        }
+
+    @staticmethod
+    def get_blender_version():
+        bpy = sys.modules.get('bpy')
+        if bpy:
+            return '.'.join(str(n) for n in bpy.app.version)
+        return ''
+
+    def finish(self, version_str=''):
+        self.stop_imports()
+        report = self.get_report(version_str=version_str)
+
+        path = get_report_path()
+        try:
+            with open(path, 'w', encoding="utf8") as outfile:
+                json.dump(report, outfile, indent=4)
+        except OSError as e:
+            print('Could not write the startup profile:', e)
+            path = None
+
+        print_summary(report)
+        if path:
+            print('Startup profile saved to', path)
+        return report
+
+
+class DisabledProfiler:
+    # Used when profiling is off, so the measured code stays the same
+
+    def start_imports(self, packages):
+        pass
+
+    def stop_imports(self):
+        pass
+
+    @contextmanager
+    def measure(self, step):
+        yield
+
+    def count(self, name, value):
+        pass
+
+    def finish(self, version_str=''):
+        return None
+
+
+def get_report_path():
+    path = os.environ.get(report_env, '')
+    if not path or path == '1':
+        return os.path.join(tempfile.gettempdir(), default_report_name)
+    return path
+
+
+def print_summary(report, top=10):
+    print('\n### CATS startup profile')
+    print('Total:    %.3fs' % report['total_time'])
+    print('Imports:  %.3fs (%d modules)' % (report['import_time'], len(report['imports'])))
+    print('Register: %.3fs' % report['register_time'])
+
+    print('Slowest modules:')
+    for record in report['imports'][:top]:
+        print('  %-50s %.3fs (%.3fs total)' % (record['module'], record['self_time'], record['time']))
+
+    print('Register steps:')
+    for step in sorted(report['register'], key=lambda s: s['time'], reverse=True):
+        print('  %-50s %.3fs' % (step['step'], step['time']))
+
+    for name, value in report['counts'].items():
+        print('%s: %s' % (name.replace('_', ' ').capitalize(), value))
+    print('')
+
+
+profiler = StartupProfiler() if enabled else DisabledProfiler()
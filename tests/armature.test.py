@@ -26,8 +26,50 @@
 
 import unittest
 import sys
+import time
 import bpy
 
+from cats.tools import common as Common
+from cats.tools import armature_bones as Bones
+
+
+def standardize_bone_name_reference(name):
+    # The original standardization of FixArmature, rule by rule
+    upper_name = ''
+    for i, s in enumerate(name.split('_')):
+        if i != 0:
+            upper_name += '_'
+        upper_name += s[:1].upper() + s[1:]
+    name = upper_name
+
+    for replacement in Bones.bone_name_replaces:
+        name = name.replace(replacement[0], replacement[1])
+    for replacement in Bones.bone_name_starts_with:
+        if name.startswith(replacement[0]):
+            name = replacement[1] + name[len(replacement[0]):]
+    for replacement in Bones.bone_name_ends_with:
+        if name.endswith(replacement[0]):
+            name = name[:-len(replacement[0])] + replacement[1]
+
+    name_split = name.split('_')
+    if len(name_split) > 1 and name_split[0].isdigit():
+        name = name_split[1]
+    name_split = name.split('"')
+    if len(name_split) > 3:
+        name = name_split[1]
+    if ':' in name:
+        for i, split in enumerate(name.split(':')):
+            if i == 0:
+                name = ''
+            else:
+                name += split
+
+    if name[-2:] == 'S0':
+        name = name[:-2]
+    if name[-4:] == '_Jnt':
+        name = name[:-4]
+    return name
+
 
 class TestAddon(unittest.TestCase):
     def test_armature(self):
@@ -35,6 +77,21 @@ class TestAddon(unittest.TestCase):
         result = bpy.ops.cats_armature.fix()
         self.assertTrue(result == {'FINISHED'})
 
+    def test_standardize_bone_names(self):
+        names = set()
+        for key, new_name, old_name in Bones.bone_rename_aliases + Bones.bone_reweight_aliases:
+            names.update((new_name, old_name, old_name.lower(), old_name.upper(), old_name.replace('_', ' ')))
+
+        for name in sorted(names):
+            self.assertEqual(Common.standardize_bone_name(name), standardize_bone_name_reference(name), name)
+
+    def test_armature_benchmark(self):
+        bone_count = sum(len(obj.data.bones) for obj in bpy.data.objects if obj.type == 'ARMATURE')
+        start = time.time()
+        result = bpy.ops.cats_armature.fix()
+        self.assertTrue(result == {'FINISHED'})
+        print('Fixed model with', bone_count, 'bones in', round(time.time() - start, 3), 's')
+
     def test_armature_with_zero_weights_off(self):
         bpy.context.scene.remove_zero_weight = False
         result = bpy.ops.cats_armature.fix()
@@ -0,0 +1,332 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats
+
+import os
+import unittest
+import sys
+import time
+import tempfile
+import numpy as np
+import bpy
+
+from cats.tools import bake as Bake
+from cats.tools import common as Common
+from cats.tools import bake_cache as BakeCache
+from cats.tools import bake_graph as BakeGraph
+from cats.tools import image_ops as ImageOps
+
+
+def create_image(name, resolution, seed):
+    image = bpy.data.images.new(name, width=resolution, height=resolution, alpha=True)
+    pixels = np.random.RandomState(seed).random_sample(resolution * resolution * 4).astype(np.float32)
+    ImageOps.write_pixels(image, pixels)
+    return image
+
+
+def legacy_post_process(smoothness, diffuse, ao, opacity):
+    # The per pixel loops which the bake post-processing used before the image ops, on pixel lists
+    for idx in range(0, len(smoothness)):
+        if (idx % 4) != 3:
+            smoothness[idx] = 1.0 - smoothness[idx]
+    for idx in range(3, len(diffuse), 4):
+        diffuse[idx] = smoothness[idx - 3]
+    quest = [0.0] * len(diffuse)
+    for idx in range(0, len(quest)):
+        if (idx % 4 != 3):
+            quest[idx] = diffuse[idx] * ((1.0 - opacity) + (opacity * ao[idx]))
+        else:
+            quest[idx] = 1.0
+    return smoothness, diffuse, quest
+
+
+def post_process(smoothness, diffuse, ao, quest, opacity):
+    ImageOps.invert_image_rgb(smoothness)
+    ImageOps.pack_image_alpha(diffuse, smoothness)
+    ImageOps.multiply_image_ao(quest, diffuse, ao, opacity)
+
+
+def create_bake_plane(metallic, roughness):
+    bpy.ops.mesh.primitive_plane_add()
+    obj = bpy.context.active_object
+    material = bpy.data.materials.new('bake_test')
+    material.use_nodes = True
+    obj.data.materials.append(material)
+    bsdf = next(node for node in material.node_tree.nodes if node.type == 'BSDF_PRINCIPLED')
+    bsdf.inputs['Metallic'].default_value = metallic
+    bsdf.inputs['Roughness'].default_value = roughness
+    bake_node = material.node_tree.nodes.new('ShaderNodeTexImage')
+    material.node_tree.nodes.active = bake_node
+    return obj, bsdf, bake_node
+
+
+def legacy_group_relevant(obj, groupname):
+    # The per vertex scan the emission eye passes used before the group presence
+    if obj.type == "MESH" and groupname in obj.vertex_groups:
+        idx = obj.vertex_groups[groupname].index
+        return any(any(group.group == idx and group.weight > 0.0 for group in vert.groups)
+                   for vert in obj.data.vertices)
+    return False
+
+
+class TestAddon(unittest.TestCase):
+    def test_image_ops(self):
+        images = [create_image('bake_test_' + str(i), 64, i) for i in range(4)]
+        smoothness, diffuse, ao, quest = images
+        expected = legacy_post_process(list(smoothness.pixels), list(diffuse.pixels), list(ao.pixels), 0.75)
+
+        post_process(smoothness, diffuse, ao, quest, 0.75)
+        for image, pixels in zip((smoothness, diffuse, quest), expected):
+            self.assertTrue(np.allclose(ImageOps.read_pixels(image).ravel(), pixels, atol=1e-6), image.name)
+
+        ImageOps.fill_image(quest, [0.5, 0.25, 0.0, 1.0])
+        self.assertEqual(list(quest.pixels[:8]), [0.5, 0.25, 0.0, 1.0] * 2)
+        for image in images:
+            bpy.data.images.remove(image)
+
+    def test_image_ops_benchmark(self):
+        for resolution in (1024, 2048, 4096):
+            images = [create_image('bake_benchmark_' + str(i), resolution, i) for i in range(4)]
+            start = time.time()
+            post_process(*images, opacity=0.75)
+            duration = time.time() - start
+
+            message = str(resolution) + 'px: vectorized ' + str(round(duration, 3)) + ' s'
+            if resolution == 1024:
+                start = time.time()
+                legacy_post_process(*[list(image.pixels) for image in images[:3]], opacity=0.75)
+                message += ', legacy ' + str(round(time.time() - start, 3)) + ' s'
+            print(message)
+            for image in images:
+                bpy.data.images.remove(image)
+
+    def test_bake_graph_schedule(self):
+        log = []
+        specular_fix = BakeGraph.rewire('Specular', 'Transmission Roughness', 0.5)
+        rewires = {
+            'diffuse': [BakeGraph.rewire('Metallic', 'Anisotropic Rotation', 0.0)],
+            'smoothness': [specular_fix],
+            'emission': [],
+            'alpha': [specular_fix, BakeGraph.rewire('Alpha', 'Roughness'), BakeGraph.rewire('Alpha', 'Anisotropic Rotation', 1.0)],
+            'metallic': [specular_fix, BakeGraph.rewire('Metallic', 'Roughness')],
+            'ao': [],
+        }
+        # ao pretends to load from the bake cache
+        passes = [BakeGraph.BakePass(name, lambda name=name: log.append(name) or name == 'ao', rewires=rewires[name]) for name in rewires]
+        passes.append(BakeGraph.BakePass('metallic_alpha_pack', lambda: log.append('metallic_alpha_pack'),
+                                         inputs=('metallic', 'smoothness'), rewires=None))
+        passes.append(BakeGraph.BakePass('questdiffuse', lambda: log.append('questdiffuse'), inputs=('diffuse', 'ao'), rewires=None))
+
+        # Baking one after the other undoes every rewire right after its pass
+        legacy_mutations = 2 * sum(len(rewire) for rewire in rewires.values())
+        mutations = []
+        timings = BakeGraph.BakeGraph(passes).run(mutations.append, mutations.append)
+        self.assertEqual(sorted(log), sorted(bake_pass.name for bake_pass in passes))
+        self.assertLess(log.index('metallic'), log.index('metallic_alpha_pack'))
+        self.assertLess(log.index('smoothness'), log.index('metallic_alpha_pack'))
+        self.assertLess(log.index('ao'), log.index('questdiffuse'))
+        self.assertEqual([timing[0] for timing in timings], log)
+        self.assertEqual([timing[0] for timing in timings if timing[2]], ['ao'])
+        self.assertLess(len(mutations), legacy_mutations)
+        print('Rewires: scheduled ' + str(len(mutations)) + ', sequential ' + str(legacy_mutations))
+
+        with self.assertRaises(ValueError):
+            BakeGraph.BakeGraph([BakeGraph.BakePass('a', None, inputs=('b',)), BakeGraph.BakePass('b', None, inputs=('a',))]).schedule()
+
+    def test_bake_graph_cycles(self):
+        bpy.context.scene.render.engine = 'CYCLES'
+        bpy.context.scene.cycles.device = 'CPU'
+        bpy.context.scene.cycles.samples = 1
+        bpy.context.scene.cycles.bake_type = 'ROUGHNESS'
+        obj, bsdf, bake_node = create_bake_plane(1.0, 0.25)
+
+        def apply_rewire(rewire):
+            input1, input2, value = rewire
+            bsdf.inputs[input1].default_value, bsdf.inputs[input2].default_value = bsdf.inputs[input2].default_value, bsdf.inputs[input1].default_value
+            if value is not None:
+                bsdf.inputs[input1].default_value = value
+
+        def undo_rewire(rewire):
+            apply_rewire(rewire[:2] + (None,))
+
+        def bake_roughness(name):
+            image = bpy.data.images.new(name, width=8, height=8)
+            image.colorspace_settings.name = 'Non-Color'
+            bake_node.image = image
+            bpy.ops.object.select_all(action='DESELECT')
+            obj.select_set(True)
+            bpy.context.view_layer.objects.active = obj
+            bpy.ops.object.bake(type='ROUGHNESS')
+
+        specular_fix = BakeGraph.rewire('Specular', 'Transmission Roughness', 0.5)
+        BakeGraph.BakeGraph([
+            BakeGraph.BakePass('smoothness', lambda: bake_roughness('bake_test_smoothness'), rewires=[specular_fix]),
+            BakeGraph.BakePass('metallic', lambda: bake_roughness('bake_test_metallic'),
+                               rewires=[specular_fix, BakeGraph.rewire('Metallic', 'Roughness')]),
+        ]).run(apply_rewire, undo_rewire)
+
+        self.assertAlmostEqual(ImageOps.read_pixels(bpy.data.images['bake_test_smoothness'])[:, 0].mean(), 0.25, places=3)
+        self.assertAlmostEqual(ImageOps.read_pixels(bpy.data.images['bake_test_metallic'])[:, 0].mean(), 1.0, places=3)
+        self.assertAlmostEqual(bsdf.inputs['Metallic'].default_value, 1.0)
+        self.assertAlmostEqual(bsdf.inputs['Roughness'].default_value, 0.25)
+
+    def test_bake_cache(self):
+        obj, bsdf, bake_node = create_bake_plane(0.0, 0.5)
+        directory = tempfile.mkdtemp()
+        cache = BakeCache.BakeCache(directory, 1 << 30)
+        settings = ('smoothness', 'ROUGHNESS', set(), (64, 64), 32)
+        key = cache.key(bpy.context, [obj], settings)
+        self.assertEqual(key, cache.key(bpy.context, [obj], settings))
+        self.assertNotEqual(key, cache.key(bpy.context, [obj], settings + (1,)))
+
+        image = create_image('bake_test_cache', 64, 0)
+        self.assertFalse(cache.load(key, image))
+        cache.store(key, image, 'smoothness', 12.0)
+
+        # A new session reads the manifest, a hit loads the exact pixels
+        cache = BakeCache.BakeCache(directory, 1 << 30)
+        loaded = create_image('bake_test_cache_loaded', 64, 1)
+        self.assertTrue(cache.load(key, loaded))
+        self.assertTrue(np.array_equal(ImageOps.read_pixels(loaded), ImageOps.read_pixels(image)))
+        self.assertEqual((cache.hits, cache.misses, cache.seconds_saved), (1, 0, 12.0))
+
+        # Material, mesh and image changes all change the key
+        bsdf.inputs['Roughness'].default_value = 0.25
+        roughness_key = cache.key(bpy.context, [obj], settings)
+        self.assertNotEqual(key, roughness_key)
+        obj.data.vertices[0].co.x += 0.1
+        mesh_key = cache.key(bpy.context, [obj], settings)
+        self.assertNotEqual(roughness_key, mesh_key)
+        texture_node = bsdf.id_data.nodes.new('ShaderNodeTexImage')
+        texture_node.image = image
+        image_key = cache.key(bpy.context, [obj], settings)
+        ImageOps.fill_image(image, [1.0, 0.0, 0.0, 1.0])
+        self.assertNotEqual(image_key, cache.key(bpy.context, [obj], settings))
+
+        # Value and RGB nodes keep their value on the output socket
+        tree = bsdf.id_data
+        rgb_node = tree.nodes.new('ShaderNodeRGB')
+        tree.links.new(bsdf.inputs['Base Color'], rgb_node.outputs[0])
+        value_node = tree.nodes.new('ShaderNodeValue')
+        tree.links.new(bsdf.inputs['Metallic'], value_node.outputs[0])
+        rgb_key = cache.key(bpy.context, [obj], settings)
+        rgb_node.outputs[0].default_value = (0.0, 1.0, 0.0, 1.0)
+        value_key = cache.key(bpy.context, [obj], settings)
+        self.assertNotEqual(rgb_key, value_key)
+        value_node.outputs[0].default_value = 0.75
+        self.assertNotEqual(value_key, cache.key(bpy.context, [obj], settings))
+
+        # Color ramps, curves and texture coordinate objects are part of the key
+        ramp_node = tree.nodes.new('ShaderNodeValToRGB')
+        curve_node = tree.nodes.new('ShaderNodeRGBCurve')
+        coordinate_node = tree.nodes.new('ShaderNodeTexCoord')
+        coordinate_node.object = obj
+        ramp_key = cache.key(bpy.context, [obj], settings)
+        ramp_node.color_ramp.elements[1].position = 0.5
+        curve_key = cache.key(bpy.context, [obj], settings)
+        self.assertNotEqual(ramp_key, curve_key)
+        curve_node.mapping.curves[3].points.new(0.5, 0.75)
+        object_key = cache.key(bpy.context, [obj], settings)
+        self.assertNotEqual(curve_key, object_key)
+        obj.location.x += 1
+        bpy.context.view_layer.update()
+        self.assertNotEqual(object_key, cache.key(bpy.context, [obj], settings))
+
+        # Nodes pointing to anything else can't be cached
+        script_node = tree.nodes.new('ShaderNodeScript')
+        script_node.mode = 'INTERNAL'
+        script_node.script = bpy.data.texts.new('bake_test_script')
+        self.assertIsNone(cache.key(bpy.context, [obj], settings))
+        tree.nodes.remove(script_node)
+
+        # A corrupt cached result is a miss and gets dropped
+        with open(os.path.join(directory, key + '.png'), 'r+b') as file:
+            file.truncate(40)
+        self.assertFalse(cache.load(key, loaded))
+        self.assertNotIn(key, cache.entries)
+        cache.store(key, image, 'smoothness', 12.0)
+
+        # Lights only count for passes baking direct or indirect light
+        light = bpy.data.objects.new('bake_test_light', bpy.data.lights.new('bake_test_light', 'POINT'))
+        bpy.context.scene.collection.objects.link(light)
+        light_key = cache.key(bpy.context, [obj], settings, lights=True)
+        unlit_key = cache.key(bpy.context, [obj], settings)
+        light.data.energy *= 2
+        self.assertNotEqual(light_key, cache.key(bpy.context, [obj], settings, lights=True))
+        light.location.x += 1
+        light_key = cache.key(bpy.context, [obj], settings, lights=True)
+        bpy.context.view_layer.update()
+        self.assertNotEqual(light_key, cache.key(bpy.context, [obj], settings, lights=True))
+        self.assertEqual(unlit_key, cache.key(bpy.context, [obj], settings))
+
+        # Storing more than fits evicts the least recently used pass
+        cache.max_bytes = cache.entries[key]['bytes']
+        cache.store(mesh_key, image, 'smoothness', 1.0)
+        self.assertEqual(list(cache.entries), [mesh_key])
+        self.assertFalse(os.path.isfile(os.path.join(directory, key + '.png')))
+        print(cache.summary())
+
+        BakeCache.clear_cache(directory)
+        self.assertFalse(os.path.isdir(directory))
+        self.assertEqual(BakeCache.BakeCache(directory, 1 << 30).entries, {})
+
+    def test_group_presence(self):
+        bpy.ops.mesh.primitive_grid_add(x_subdivisions=448, y_subdivisions=448)
+        obj = bpy.context.active_object
+        vertex_count = len(obj.data.vertices)
+        obj.vertex_groups.new(name='Body').add(list(range(vertex_count)), 1.0, 'REPLACE')
+        left_eye = obj.vertex_groups.new(name='LeftEye')
+        obj.vertex_groups.new(name='RightEye').add([0], 0.0, 'REPLACE')  # Only a zero weight
+
+        # The old scan stops at the first weighted vertex, so time the eye at the start and at the end of the mesh
+        for layout, eye_vertices in (('early', range(100)), ('late', range(vertex_count - 100, vertex_count))):
+            left_eye.remove(list(range(vertex_count)))
+            left_eye.add(list(eye_vertices), 1.0, 'REPLACE')
+
+            # The emission eye passes query every eye once to add the masks and once to pick the objects to bake
+            queries = ['LeftEye', 'LeftEye', 'RightEye', 'RightEye', 'Head']
+            start = time.time()
+            expected = [legacy_group_relevant(obj, name) for name in queries]
+            time_legacy = time.time() - start
+
+            Common.invalidate_weight_index(obj)
+            start = time.time()
+            Common.get_weight_index(obj)
+            time_index = time.time() - start
+
+            start = time.time()
+            presence = Bake.GroupPresence()
+            relevant = [presence.relevant(obj, name) for name in queries]
+            time_presence = time.time() - start
+
+            self.assertEqual(relevant, expected)
+            self.assertEqual(relevant, [True, True, False, False, False])
+            print(vertex_count, 'verts, eye ' + layout + ': weight index', round(time_index, 3), 's, group presence',
+                  round(time_presence, 3), 's, legacy', round(time_legacy, 3), 's')
+
+suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestAddon)
+runner = unittest.TextTestRunner()
+ret = not runner.run(suite).wasSuccessful()
+sys.exit(ret)
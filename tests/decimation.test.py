@@ -0,0 +1,171 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats
+
+import math
+import unittest
+import sys
+import time
+import bpy
+
+from cats.tools import common as Common
+from cats.tools import decimation as Decimation
+
+
+def get_animation_weights_legacy(mesh):
+    # The per vertex implementation get_animation_weights replaced
+    # Weight by multiplied bone weights for every pair of bones.
+    # This is O(n*m^2) for n verts and m bones, generally runs relatively quickly.
+    weights = dict()
+    for vertex in mesh.data.vertices:
+        v_weights = [group.weight for group in vertex.groups]
+        v_mults = []
+        for idx1, w1 in enumerate(vertex.groups):
+            for idx2, w2 in enumerate(vertex.groups):
+                if idx1 != idx2:
+                    # Weight [vgroup * vgroup] for index = <mult>
+                    if (w1.group, w2.group) not in weights:
+                        weights[(w1.group, w2.group)] = dict()
+                    weights[(w1.group, w2.group)][vertex.index] = w1.weight * w2.weight
+
+    # Normalize per vertex group pair
+    normalizedweights = dict()
+    for pair, weighting in weights.items():
+        m_min = 1
+        m_max = 0
+        for _, weight in weighting.items():
+            m_min = min(m_min, weight)
+            m_max = max(m_max, weight)
+
+        if pair not in normalizedweights:
+            normalizedweights[pair] = dict()
+        for v_index, weight in weighting.items():
+            try:
+                normalizedweights[pair][v_index] = (weight - m_min) / (m_max - m_min)
+            except ZeroDivisionError:
+                normalizedweights[pair][v_index] = weight
+
+    newweights = dict()
+    for pair, weighting in normalizedweights.items():
+        for v_index, weight in weighting.items():
+            try:
+                newweights[v_index] = max(newweights[v_index], weight)
+            except KeyError:
+                newweights[v_index] = weight
+
+    s_weights = dict()
+
+    # Weight by relative shape key movement. This is kind of slow, but not too bad. It's O(n*m) for n verts and m shape keys,
+    # but shape keys contain every vert (not just the ones they impact)
+    # For shape key in shape keys:
+    if mesh.data.shape_keys is not None:
+        for key_block in mesh.data.shape_keys.key_blocks[1:]:
+            basis = mesh.data.shape_keys.key_blocks[0]
+            s_weights[key_block.name] = dict()
+
+            for idx, vert in enumerate(key_block.data):
+                s_weights[key_block.name][idx] = math.sqrt(math.pow(basis.data[idx].co[0] - vert.co[0], 2.0) +
+                                                                math.pow(basis.data[idx].co[1] - vert.co[1], 2.0) +
+                                                                math.pow(basis.data[idx].co[2] - vert.co[2], 2.0))
+
+    # normalize min/max vert movement
+    s_normalizedweights = dict()
+    for keyname, weighting in s_weights.items():
+        m_min = math.inf
+        m_max = 0
+        for _, weight in weighting.items():
+            m_min = min(m_min, weight)
+            m_max = max(m_max, weight)
+
+        if keyname not in s_normalizedweights:
+            s_normalizedweights[keyname] = dict()
+        for v_index, weight in weighting.items():
+            try:
+                s_normalizedweights[keyname][v_index] = (weight - m_min) / (m_max - m_min)
+            except ZeroDivisionError:
+                s_normalizedweights[keyname][v_index] = weight
+
+    # find max normalized movement over all shape keys
+    for pair, weighting in s_normalizedweights.items():
+        for v_index, weight in weighting.items():
+            try:
+                newweights[v_index] = max(newweights[v_index], weight)
+            except KeyError:
+                newweights[v_index] = weight
+
+    return newweights
+
+
+class TestAddon(unittest.TestCase):
+    def test_animation_weighting(self):
+        bpy.ops.cats_armature.fix()
+
+        for mesh in Common.get_meshes_objects():
+            start = time.time()
+            vertex_indices, weights = Decimation.get_animation_weights(mesh)
+            time_vectorized = time.time() - start
+
+            start = time.time()
+            weights_legacy = get_animation_weights_legacy(mesh)
+            time_legacy = time.time() - start
+
+            self.assertEqual(sorted(weights_legacy.keys()), vertex_indices.tolist())
+            for index, weight in zip(vertex_indices.tolist(), weights.tolist()):
+                self.assertAlmostEqual(weights_legacy[index], weight, places=6)
+
+            print(mesh.name, len(mesh.data.vertices), 'verts: vectorized', round(time_vectorized, 3), 's, legacy', round(time_legacy, 3), 's')
+
+    def test_shape_key_motion(self):
+        bpy.ops.cats_armature.fix()
+
+        for mesh in Common.get_meshes_objects():
+            if not Common.has_shapekeys(mesh):
+                continue
+            start = time.time()
+            Common.invalidate_shape_key_motion(mesh)
+            moving = Common.get_shape_key_motion(mesh).moving_vertices()
+            time_vectorized = time.time() - start
+
+            # The per vertex loop optimize_static used before
+            start = time.time()
+            moving_legacy = [False] * len(mesh.data.vertices)
+            basis = mesh.data.shape_keys.key_blocks[0]
+            for key_block in mesh.data.shape_keys.key_blocks[1:]:
+                for idx, vert in enumerate(key_block.data):
+                    if (math.sqrt(math.pow(basis.data[idx].co[0] - vert.co[0], 2.0) +
+                                  math.pow(basis.data[idx].co[1] - vert.co[1], 2.0) +
+                                  math.pow(basis.data[idx].co[2] - vert.co[2], 2.0)) > 0.0001):
+                        moving_legacy[idx] = True
+            time_legacy = time.time() - start
+
+            self.assertEqual(moving.tolist(), moving_legacy)
+            self.assertIs(Common.get_shape_key_motion(mesh), Common.get_shape_key_motion(mesh))
+            print(mesh.name, len(mesh.data.vertices), 'verts: vectorized', round(time_vectorized, 3), 's, legacy', round(time_legacy, 3), 's')
+
+
+suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestAddon)
+runner = unittest.TextTestRunner()
+ret = not runner.run(suite).wasSuccessful()
+sys.exit(ret)
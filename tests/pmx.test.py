@@ -0,0 +1,408 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats
+
+import unittest
+import sys
+import os
+import copy
+import time
+import random
+import tempfile
+import numpy as np
+import bpy
+import bmesh
+
+import mmd_tools_local.core.model as mmd_model
+from mmd_tools_local.core import pmx
+from mmd_tools_local.core.pmx import exporter as pmx_exporter
+from mmd_tools_local.core.pmx.importer import PMXImporter, _PMXCleaner, find_overlapping_faces
+from cats.tools import armature as Armature
+from cats.tools import common as Common
+from cats.tools.translations import t
+
+
+def create_model(vertex_count, bone_count, additional_uvs=1, seed=0):
+    # Synthetic model with all weight types and vertex/uv morphs
+    rand = random.Random(seed)
+
+    def vector(size):
+        return tuple(rand.uniform(-1, 1) for i in range(size))
+
+    model = pmx.Model()
+    model.name = 'Test'
+
+    for i in range(bone_count):
+        bone = pmx.Bone()
+        bone.name = 'Bone' + str(i)
+        bone.location = vector(3)
+        bone.displayConnection = -1
+        model.bones.append(bone)
+
+    for i in range(vertex_count):
+        vertex = pmx.Vertex()
+        vertex.co = vector(3)
+        vertex.normal = vector(3)
+        vertex.uv = vector(2)
+        vertex.additional_uvs = [vector(4) for j in range(additional_uvs)]
+        vertex.edge_scale = rand.uniform(0, 2)
+
+        weight = pmx.BoneWeight()
+        weight.type = i % 4
+        if weight.type == pmx.BoneWeight.BDEF1:
+            weight.bones = [rand.randrange(-1, bone_count)]
+        elif weight.type == pmx.BoneWeight.BDEF2:
+            weight.bones = [rand.randrange(bone_count) for j in range(2)]
+            weight.weights = [rand.random()]
+        elif weight.type == pmx.BoneWeight.BDEF4:
+            weight.bones = [rand.randrange(bone_count) for j in range(4)]
+            weight.weights = tuple(rand.random() / 4 for j in range(4))
+        else:
+            weight.bones = [rand.randrange(bone_count) for j in range(2)]
+            weight.weights = pmx.BoneWeightSDEF(rand.random(), vector(3), vector(3), vector(3))
+        vertex.weight = weight
+        model.vertices.append(vertex)
+
+    for i in range(0, vertex_count - 2, 3):
+        model.faces.append((i, i + 1, i + 2))
+
+    material = pmx.Material()
+    material.name = 'Material'
+    material.diffuse = (1, 1, 1, 1)
+    material.specular = (0, 0, 0)
+    material.ambient = (0.5, 0.5, 0.5)
+    material.edge_color = (0, 0, 0, 1)
+    material.vertex_count = len(model.faces) * 3
+    model.materials.append(material)
+
+    vertex_morph = pmx.VertexMorph('Vertex', 'Vertex', pmx.Morph.CATEGORY_OHTER)
+    for i in range(0, vertex_count, 2):
+        offset = pmx.VertexMorphOffset()
+        offset.index = i
+        offset.offset = vector(3)
+        vertex_morph.offsets.append(offset)
+    model.morphs.append(vertex_morph)
+
+    uv_morph = pmx.UVMorph('UV', 'UV', pmx.Morph.CATEGORY_OHTER, type_index=4)
+    for i in range(0, vertex_count, 3):
+        offset = pmx.UVMorphOffset()
+        offset.index = i
+        offset.offset = vector(4)
+        uv_morph.offsets.append(offset)
+    model.morphs.append(uv_morph)
+
+    return model
+
+
+def add_doubles(model):
+    vertex_count = len(model.vertices)
+    for i in range(1, vertex_count - 4, 12):
+        model.vertices[i + 4].co = model.vertices[i].co  # doubles without morph offsets
+
+    for i in range(7, vertex_count - 12, 37):
+        model.vertices[i + 12].co = model.vertices[i].co  # doubles with the same morph offsets
+        for morph in model.morphs:
+            for offset in [x for x in morph.offsets if x.index == i]:
+                double = type(offset)()
+                double.index = i + 12
+                double.offset = offset.offset
+                morph.offsets.append(double)
+
+    model.vertices[11].co = (-0.0, 0.0, 1.0)
+    model.vertices[23].co = (0.0, -0.0, 1.0)
+    model.vertices[35].co = (float('nan'), 0.0, 1.0)
+    model.vertices[47].co = (float('nan'), 0.0, 1.0)
+
+    model.faces += model.faces[:50]
+    model.materials[0].vertex_count = len(model.faces) * 3
+
+
+def vertex_values(vertex):
+    weights = vertex.weight.weights
+    if isinstance(weights, pmx.BoneWeightSDEF):
+        weights = (weights.weight, weights.c, weights.r0, weights.r1)
+    return (vertex.co, vertex.normal, vertex.uv, vertex.additional_uvs, vertex.edge_scale,
+            vertex.weight.type, vertex.weight.bones, weights, type(vertex.weight.weights))
+
+
+def offset_values(morph):
+    return [(offset.index, offset.offset, type(offset)) for offset in morph.offsets]
+
+
+def import_pmx(path, **args):
+    objects = set(bpy.data.objects)
+    start = time.time()
+    PMXImporter().execute(filepath=path, types={'MESH', 'ARMATURE', 'MORPHS'}, scale=0.08, **args)
+    duration = time.time() - start
+    mesh = next(obj for obj in bpy.data.objects if obj not in objects and obj.type == 'MESH')
+    return mesh, duration
+
+
+def export_pmx(mesh, **args):
+    rig = mmd_model.Model(mmd_model.Model.findRoot(mesh))
+    path = os.path.join(tempfile.mkdtemp(), 'export.pmx')
+    start = time.time()
+    pmx_exporter.export(filepath=path, scale=12.5, root=rig.rootObject(), armature=rig.armature(), meshes=rig.meshes(), **args)
+    duration = time.time() - start
+    return pmx.load(path), duration
+
+
+def get_mesh_data(obj):
+    mesh = obj.data
+
+    def values(collection, attribute, size):
+        array = np.empty(len(collection) * size, dtype=np.float32)
+        collection.foreach_get(attribute, array)
+        return array.tolist()
+
+    group_names = [group.name for group in obj.vertex_groups]
+    data = {
+        'co': values(mesh.vertices, 'co', 3),
+        'loops': values(mesh.loops, 'vertex_index', 1),
+        'materials': values(mesh.polygons, 'material_index', 1),
+        'groups': [sorted((group_names[g.group], round(g.weight, 6)) for g in v.groups) for v in mesh.vertices],
+        'uvs': {layer.name: values(layer.data, 'uv', 2) for layer in mesh.uv_layers},
+        'shape_keys': {},
+    }
+    if mesh.shape_keys:
+        data['shape_keys'] = {key.name: values(key.data, 'co', 3) for key in mesh.shape_keys.key_blocks}
+    return data
+
+
+class TestAddon(unittest.TestCase):
+    def save_load(self, model, additional_uvs):
+        path = os.path.join(tempfile.mkdtemp(), 'test.pmx')
+        pmx.save(path, model, add_uv_count=additional_uvs)
+        return path, pmx.load(path), pmx.load(path, in_memory=False)
+
+    def check_model(self, vertex_count, bone_count, additional_uvs):
+        source = create_model(vertex_count, bone_count, additional_uvs)
+        path, model, model_legacy = self.save_load(source, additional_uvs)
+
+        self.assertEqual(len(model.vertices), vertex_count)
+        self.assertEqual([vertex_values(v) for v in model.vertices], [vertex_values(v) for v in model_legacy.vertices])
+        self.assertEqual(list(model.faces), list(model_legacy.faces))
+        self.assertEqual(len(model.morphs), len(model_legacy.morphs))
+        for morph, morph_legacy in zip(model.morphs, model_legacy.morphs):
+            self.assertEqual(offset_values(morph), offset_values(morph_legacy))
+
+        # The arrays hold the same values as the objects
+        arrays = model.vertex_arrays
+        self.assertEqual(arrays.co.tolist(), [list(v.co) for v in model_legacy.vertices])
+        self.assertEqual(arrays.bones[:, 0].tolist(), [v.weight.bones[0] for v in model_legacy.vertices])
+        self.assertTrue(np.allclose(arrays.weights.sum(axis=1)[arrays.weight_type != pmx.BoneWeight.BDEF4], 1))
+        self.assertEqual(model.face_array.tolist(), [list(f) for f in model_legacy.faces])
+        self.assertEqual(model.morphs[0].offset_indices.tolist(), [o.index for o in model_legacy.morphs[0].offsets])
+
+        # The object writer, the array writer and saving the loaded model again give the same file
+        with open(path, 'rb') as file:
+            data = file.read()
+        for saved_model, in_memory in ((source, False), (model, True), (model_legacy, True), (model_legacy, False)):
+            path_copy = path + '.copy.pmx'
+            pmx.save(path_copy, saved_model, add_uv_count=additional_uvs, in_memory=in_memory)
+            with open(path_copy, 'rb') as file_copy:
+                self.assertEqual(data, file_copy.read())
+
+    def test_pmx_round_trip(self):
+        self.check_model(200, 10, 0)
+        self.check_model(1000, 200, 2)  # 2 byte bone indices
+        self.check_model(70000, 5, 1)  # 4 byte vertex indices
+
+    def test_pmx_lazy_objects(self):
+        path, model, model_legacy = self.save_load(create_model(30, 5), 1)
+
+        # The object lists are only built when they are used and can be changed like lists
+        self.assertFalse(model.vertices.isBuilt())
+        self.assertEqual(len(model.vertices), 30)
+        self.assertFalse(model.vertices.isBuilt())
+        del model.vertices[0]
+        model.faces.append((0, 1, 2))
+        self.assertTrue(model.vertices.isBuilt())
+        self.assertEqual(len(model.vertices), 29)
+        self.assertEqual(model.faces[-1], (0, 1, 2))
+
+    def test_pmx_corrupted(self):
+        path, model, model_legacy = self.save_load(create_model(100, 5), 1)
+        with open(path, 'rb') as file:
+            data = file.read()
+        with open(path, 'wb') as file:
+            file.write(data[:len(data) // 2])
+
+        # Corrupted files are logged, not raised
+        self.assertIsNotNone(pmx.load(path))
+        self.assertIsNotNone(pmx.load(path, in_memory=False))
+
+    def test_pmx_import(self):
+        model = create_model(3000, 20, 2)
+        add_doubles(model)
+        path, model, model_legacy = self.save_load(model, 2)
+        for remove_doubles in (False, True):
+            mesh, time_columnar = import_pmx(path, columnar=True, remove_doubles=remove_doubles)
+            mesh_legacy, time_legacy = import_pmx(path, columnar=False, remove_doubles=remove_doubles)
+            data, data_legacy = get_mesh_data(mesh), get_mesh_data(mesh_legacy)
+            for key in data_legacy:
+                self.assertEqual(data[key], data_legacy[key], key)
+
+    def test_pmx_export(self):
+        path, model, model_legacy = self.save_load(create_model(3000, 20, 2), 2)
+        mesh, duration = import_pmx(path)
+        for sort_vertices in ('NONE', 'BLENDER', 'CUSTOM'):
+            exported, time_columnar = export_pmx(mesh, sort_vertices=sort_vertices, columnar=True)
+            exported_legacy, time_legacy = export_pmx(mesh, sort_vertices=sort_vertices, columnar=False)
+
+            # Same vertices, faces and morphs, only the normals are rounded differently
+            self.assertEqual(len(exported.vertices), len(exported_legacy.vertices))
+            for vertex, vertex_legacy in zip(exported.vertices, exported_legacy.vertices):
+                values, values_legacy = vertex_values(vertex), vertex_values(vertex_legacy)
+                self.assertTrue(np.allclose(values[1], values_legacy[1], atol=1e-5))
+                self.assertEqual(values[:1] + values[2:], values_legacy[:1] + values_legacy[2:])
+            self.assertEqual(list(exported.faces), list(exported_legacy.faces))
+            self.assertEqual([m.vertex_count for m in exported.materials], [m.vertex_count for m in exported_legacy.materials])
+            for morph, morph_legacy in zip(exported.morphs, exported_legacy.morphs):
+                self.assertEqual(offset_values(morph), offset_values(morph_legacy))
+            print('Exported', len(exported.vertices), 'verts: columnar', round(time_columnar, 3), 's, legacy', round(time_legacy, 3), 's')
+
+    def test_pmx_export_near_doubles(self):
+        path, model, model_legacy = self.save_load(create_model(30, 5), 1)
+        mesh, duration = import_pmx(path)
+
+        # A quad, a pentagon and a triangle. The corners of vertex 1 and 2 have uvs closer than the tolerance
+        # but on both sides of a grid cell border, only the corners of vertex 3 are far apart
+        data = bpy.data.meshes.new('NearDoubles')
+        data.from_pydata([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (2, 0, 0), (2.5, 0.5, 0), (2, 1, 0), (0.5, 2, 0)], [],
+                         [(0, 1, 2, 3), (1, 4, 5, 6, 2), (3, 2, 7)])
+        uvs = [(0.25, 0.25)] * len(data.loops)
+        uvs[1], uvs[4] = (0.00035, 0.25), (0.00036, 0.25)
+        uvs[2], uvs[8], uvs[10] = (0.00049, 0.25), (0.00051, 0.25), (0.0005, 0.25)
+        uvs[9] = (0.75, 0.25)
+        data.uv_layers.new().data.foreach_set('uv', [x for uv in uvs for x in uv])
+        mesh.data = data
+
+        exported, time_columnar = export_pmx(mesh, columnar=True)
+        exported_legacy, time_legacy = export_pmx(mesh, columnar=False)
+        self.assertEqual(len(exported_legacy.vertices), 9)
+        self.assertEqual(len(exported.vertices), len(exported_legacy.vertices))
+        self.assertEqual([vertex.uv for vertex in exported.vertices], [vertex.uv for vertex in exported_legacy.vertices])
+        self.assertEqual(list(exported.faces), list(exported_legacy.faces))
+
+    def test_pmx_remove_doubles(self):
+        source = create_model(3000, 20)
+        add_doubles(source)
+        for mesh_only in (True, False):
+            path, model, model_legacy = self.save_load(source, 1)
+            start = time.time()
+            vertex_map = _PMXCleaner.remove_doubles(model, mesh_only)
+            time_vectorized = time.time() - start
+            start = time.time()
+            vertex_map_legacy = _PMXCleaner.remove_doubles_legacy(model_legacy, mesh_only)
+            time_legacy = time.time() - start
+
+            self.assertEqual(vertex_map, [tuple(x) for x in vertex_map_legacy])
+            self.assertEqual([tuple(f) for f in model.faces], [tuple(f) for f in model_legacy.faces])
+            self.assertEqual([m.vertex_count for m in model.materials], [m.vertex_count for m in model_legacy.materials])
+            for morph, morph_legacy in zip(model.morphs, model_legacy.morphs):
+                self.assertEqual([(x.index, tuple(x.offset)) for x in morph.offsets], [(x.index, tuple(x.offset)) for x in morph_legacy.offsets])
+            print('Removed doubles: vectorized', round(time_vectorized, 3), 's, legacy', round(time_legacy, 3), 's')
+
+    def test_overlapping_faces(self):
+        co = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 0, 0.0000001), (0, 1, 0), (0, 0, 1)]
+        loop_indices = [0, 1, 2,  2, 3, 0,  0, 1, 5,  0, 1, 5,  4, 0, 1]
+        material_indices = [0, 1, 0, 0, 2]
+        # Corners are compared rounded and in any order, duplicates in the same material don't count
+        self.assertEqual(find_overlapping_faces(co, loop_indices, material_indices).tolist(), [0, 1, 4])
+
+        # Fix Model warns about the overlapping faces it leaves, add a copy of a face with another material
+        mesh = next(obj for obj in Common.get_meshes_objects() if len(obj.data.materials) > 1)
+        bm = bmesh.new()
+        bm.from_mesh(mesh.data)
+        bm.faces.ensure_lookup_table()
+        face = bm.faces[0]
+        face_copy = bm.faces.new([bm.verts.new(vert.co) for vert in face.verts])
+        face_copy.material_index = (face.material_index + 1) % len(mesh.data.materials)
+        for layer in bm.verts.layers.shape.values():
+            for vert, vert_copy in zip(face.verts, face_copy.verts):
+                vert_copy[layer] = vert[layer]
+        bm.to_mesh(mesh.data)
+        bm.free()
+
+        reports = []
+        Armature.FixArmature.report = lambda operator, report_type, message: reports.append((report_type, message))
+        self.addCleanup(delattr, Armature.FixArmature, 'report')
+        result = bpy.ops.cats_armature.fix()
+        self.assertTrue(result == {'FINISHED'})
+        overlapping_faces = sum(len(Common.get_overlapping_faces(obj)) for obj in Common.get_meshes_objects())
+        self.assertGreaterEqual(overlapping_faces, 2)
+        self.assertIn(({'WARNING'}, t('FixArmature.overlappingFaces', faces=str(overlapping_faces))), reports)
+
+        # The importer blends the material whose faces lie on faces of an earlier material
+        model = create_model(30, 5)
+        model.faces += [tuple(reversed(face)) for face in model.faces[:3]]
+        material = copy.copy(model.materials[0])
+        material.name = 'Overlapping'
+        material.vertex_count = 9
+        model.materials.append(material)
+        path, model, model_legacy = self.save_load(model, 1)
+        mesh, duration = import_pmx(path)
+        self.assertNotEqual(mesh.data.materials[0].blend_method, 'BLEND')
+        self.assertEqual(mesh.data.materials[1].blend_method, 'BLEND')
+
+    def test_pmx_import_benchmark(self):
+        path, model, model_legacy = self.save_load(create_model(100000, 100), 1)
+        mesh, time_columnar = import_pmx(path, columnar=True)
+        mesh_legacy, time_legacy = import_pmx(path, columnar=False)
+        print('Imported', len(mesh.data.vertices), 'verts: columnar', round(time_columnar, 3), 's, legacy', round(time_legacy, 3), 's')
+
+    def test_pmx_benchmark(self):
+        path, model, model_legacy = self.save_load(create_model(100000, 100), 1)
+        size = os.path.getsize(path) / 1024 / 1024
+
+        start = time.time()
+        pmx.load(path)
+        time_arrays = time.time() - start
+
+        start = time.time()
+        pmx.load(path, in_memory=False)
+        time_legacy = time.time() - start
+
+        print('Loaded', round(size, 1), 'MB: arrays', round(size / time_arrays, 1), 'MB/s, legacy', round(size / time_legacy, 1), 'MB/s')
+
+    def test_pmx_save_benchmark(self):
+        path, model, model_legacy = self.save_load(create_model(150000, 100), 1)
+
+        start = time.time()
+        pmx.save(path, model_legacy, add_uv_count=1)
+        time_arrays = time.time() - start
+
+        start = time.time()
+        pmx.save(path, model_legacy, add_uv_count=1, in_memory=False)
+        time_legacy = time.time() - start
+
+        print('Saved', len(model_legacy.vertices), 'verts: arrays', round(time_arrays, 3), 's, legacy', round(time_legacy, 3), 's')
+
+
+suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestAddon)
+runner = unittest.TextTestRunner()
+ret = not runner.run(suite).wasSuccessful()
+sys.exit(ret)
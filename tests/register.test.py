@@ -0,0 +1,67 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats
+
+import unittest
+import sys
+import time
+import bpy
+import addon_utils
+
+from cats.tools import register as Register
+from cats.tools import supporter as Supporter
+
+
+class TestAddon(unittest.TestCase):
+    def test_bundle_benchmark(self):
+        # Enable time with the rarely used classes deferred
+        addon_utils.disable('cats')
+        start = time.time()
+        addon_utils.enable('cats')
+        time_deferred = time.time() - start
+
+        deferred_count = Register.count_deferred_classes()
+        if hasattr(bpy.app, 'timers'):
+            self.assertGreater(deferred_count, 0)
+
+        # What the startup used to register on top of that
+        start = time.time()
+        for bundle in ('installers', 'supporter'):
+            Register.load_bundle(bundle)
+        Supporter.register_dynamic_buttons()
+        time_bundles = time.time() - start
+
+        self.assertEqual(Register.count_deferred_classes(), 0)
+        self.assertTrue(hasattr(bpy.types, 'CATS_IMPORTER_OT_install_xps'))
+        print('Enabled Cats in', round(time_deferred, 3), 's, registering the', deferred_count, 'deferred classes and', len(Supporter.button_list), 'supporter buttons would add', round(time_bundles, 3), 's')
+
+        # Loading the bundles again does nothing
+        self.assertFalse(Register.load_bundle('installers'))
+
+
+suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestAddon)
+runner = unittest.TextTestRunner()
+ret = not runner.run(suite).wasSuccessful()
+sys.exit(ret)
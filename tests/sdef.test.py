@@ -0,0 +1,109 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats
+
+import unittest
+import sys
+import time
+import random
+import numpy as np
+import bpy
+
+from mmd_tools_local.bpyutils import SceneOp
+from mmd_tools_local.core.sdef import FnSDEF
+
+
+def create_sdef_mesh(vertex_count, seed=0):
+    # A mesh with SDEF data of random vertices weighted to bone pairs of the first armature of the scene
+    rand = random.Random(seed)
+    armature = next(obj for obj in bpy.data.objects if obj.type == 'ARMATURE')
+    bone_names = [bone.name for bone in armature.pose.bones][:4]
+
+    vertices = [tuple(rand.uniform(-1, 1) for i in range(3)) for j in range(vertex_count)]
+    mesh = bpy.data.objects.new('SDEF Mesh', bpy.data.meshes.new('SDEF Mesh'))
+    mesh.data.from_pydata(vertices, [], [])
+    SceneOp(bpy.context).link_object(mesh)
+    mesh.parent = armature
+    mod = mesh.modifiers.new(name='mmd_bone_order_override', type='ARMATURE')
+    mod.object = armature
+
+    groups = [mesh.vertex_groups.new(name=name) for name in bone_names]
+    for i in range(vertex_count):
+        group0, group1 = rand.sample(groups, 2)
+        weight = rand.uniform(0.1, 0.9)
+        group0.add([i], weight, 'REPLACE')
+        group1.add([i], 1 - weight, 'REPLACE')
+
+    mesh.shape_key_add(name='Basis')
+    for name in ('mmd_sdef_c', 'mmd_sdef_r0', 'mmd_sdef_r1'):
+        data = mesh.shape_key_add(name=name).data
+        for i, v in enumerate(data):
+            if i % 3 or name != 'mmd_sdef_c': # some vertices are not SDEF
+                v.co = [x + rand.uniform(-0.5, 0.5) for x in v.co]
+
+    for bone in armature.pose.bones[:4]:
+        bone.rotation_mode = 'XYZ'
+        bone.rotation_euler = [rand.uniform(-1, 1) for i in range(3)]
+        bone.scale = [rand.uniform(0.5, 1.5) for i in range(3)]
+    return mesh
+
+
+def sdef_values(mesh, **args):
+    shapekey = mesh.data.shape_keys.key_blocks[FnSDEF.SHAPEKEY_NAME]
+    FnSDEF.clear_cache(mesh)
+    start = time.time()
+    FnSDEF.driver_function(shapekey, mesh.name, use_skip=False, **args)
+    duration = time.time() - start
+    values = np.zeros(len(shapekey.data) * 3, dtype=np.float32)
+    shapekey.data.foreach_get('co', values)
+    return values, duration
+
+
+class TestAddon(unittest.TestCase):
+    def test_sdef_kernels(self):
+        mesh = create_sdef_mesh(20000)
+        self.assertTrue(FnSDEF.bind(mesh, bulk_update=True, use_skip=False, vectorized=True))
+
+        for use_scale in (False, True):
+            values_default, time_default = sdef_values(mesh, bulk_update=False, use_scale=use_scale)
+            values_bulk, time_bulk = sdef_values(mesh, bulk_update=True, use_scale=use_scale)
+            values, time_vectorized = sdef_values(mesh, bulk_update=True, use_scale=use_scale, vectorized=True)
+
+            # The kernels give the same shape, up to the float precision of mathutils
+            self.assertTrue(np.allclose(values_bulk, values_default, atol=1e-5))
+            self.assertTrue(np.allclose(values, values_default, atol=1e-4))
+            print('SDEF use_scale', use_scale, ': default', round(time_default, 3), 's, bulk', round(time_bulk, 3), 's, vectorized', round(time_vectorized, 3), 's')
+
+        # The benchmark picks one of the kernels for the driver
+        self.assertTrue(FnSDEF.bind(mesh))
+        driver = next(i for i in mesh.data.shape_keys.animation_data.drivers if FnSDEF.SHAPEKEY_NAME in i.data_path)
+        self.assertIn('vectorized=', driver.driver.expression)
+        FnSDEF.unbind(mesh)
+
+
+suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestAddon)
+runner = unittest.TextTestRunner()
+ret = not runner.run(suite).wasSuccessful()
+sys.exit(ret)
@@ -0,0 +1,67 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats, Hotox
+
+# Enables Cats with the startup profiler and checks the startup time against a budget.
+# Don't enable Cats with --addons here, otherwise it is already imported and the import times are missing:
+# blender --factory-startup -noaudio --background --python tests/startup_profile.py -- --report profile.json --budget 3
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import addon_utils
+
+argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+parser = argparse.ArgumentParser(description='Profile the startup of Cats')
+parser.add_argument('--report', default=os.path.join(tempfile.gettempdir(), 'cats_startup_profile.json'), help='path of the json report')
+parser.add_argument('--budget', type=float, default=0, help='fail if the startup takes longer than this many seconds')
+parser.add_argument('--module', default='cats', help='module name of the installed add-on')
+args = parser.parse_args(argv)
+
+if args.module in sys.modules:
+    print('WARNING:', args.module, 'is already imported, the import times will be missing')
+
+os.environ['CATS_PROFILE_STARTUP'] = args.report
+if os.path.isfile(args.report):
+    os.remove(args.report)
+
+if not addon_utils.enable(args.module, default_set=False):
+    print('ERROR: Could not enable', args.module)
+    sys.exit(1)
+
+try:
+    with open(args.report, encoding="utf8") as file:
+        report = json.load(file)
+except (FileNotFoundError, json.decoder.JSONDecodeError):
+    print('ERROR: No startup profile was written to', args.report)
+    sys.exit(1)
+
+if args.budget and report['total_time'] > args.budget:
+    print('ERROR: Startup took %.3fs, the budget is %.3fs' % (report['total_time'], args.budget))
+    sys.exit(1)
+
+sys.exit(0)
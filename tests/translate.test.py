@@ -24,16 +24,195 @@
 # Repo: https://github.com/michaeldegroot/cats-blender-plugin
 # Edits by: GiveMeAllYourCats
 
-import unittest
+import os
 import sys
+import time
+import tempfile
+import unittest
+import threading
+import requests
+import addon_utils
+import http.server
+import urllib.parse
 import bpy
 
+from cats.tools import translate as Translate
+from cats.tools import translate_cache as TranslateCache
+
+
+class StubTranslationHandler(http.server.BaseHTTPRequestHandler):
+    received = []
+
+    def do_GET(self):
+        text = urllib.parse.unquote(self.path[1:])
+        StubTranslationHandler.received.append(text)
+        time.sleep(0.05)  # Simulate network latency
+
+        body = ('translated ' + str(len(text))).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubBackend:
+    def __init__(self, url):
+        self.url = url
+
+    def reset(self):
+        pass
+
+    def translate(self, text):
+        return requests.get(self.url + urllib.parse.quote(text)).text
+
 
 class TestAddon(unittest.TestCase):
     def test_translate_shapekeys(self):
         result = bpy.ops.cats_translate.shapekeys()
         self.assertTrue(result == {'FINISHED'})
 
+    def test_dictionary_engines(self):
+        Translate.load_translations()
+        keys = list(Translate.dictionary.keys())
+
+        # Every key on its own plus combinations of neighbouring keys and bone name suffixes
+        names = keys + [keys[i] + keys[-i - 1] + suffix for i in range(len(keys)) for suffix in ('', '_L', '.R', ' 2')]
+
+        for addition in ('', ' '):
+            start = time.time()
+            results = [Translate.dictionary_replace(name, addition=addition) for name in names]
+            time_automaton = time.time() - start
+
+            start = time.time()
+            results_linear = [Translate.dictionary_replace_linear(name, addition=addition) for name in names]
+            time_linear = time.time() - start
+
+            self.assertEqual(results, results_linear)
+            print('Translated', len(names), 'names: automaton', round(time_automaton, 3), 's, linear', round(time_linear, 3), 's')
+
+    def test_dictionary_loading(self):
+        # What register() used to do: parse and sort the json dictionaries and build the automaton
+        start = time.time()
+        Translate.load_translations()
+        Translate.load_json_dictionary()
+        Translate.update_automaton()
+        time_json = time.time() - start
+        json_dictionary = list(Translate.dictionary.items())
+
+        # Startup only checks for the dictionary now
+        start = time.time()
+        self.assertTrue(Translate.load_translations(lazy=True))
+        time_lazy = time.time() - start
+
+        # The whole register(), which includes the dictionary check
+        addon_utils.disable('cats')
+        start = time.time()
+        addon_utils.enable('cats', default_set=False)
+        time_register = time.time() - start
+
+        # The first translation loads the compiled dictionary
+        start = time.time()
+        Translate.translate('右腕')
+        time_compiled = time.time() - start
+
+        self.assertIsInstance(Translate.dictionary, TranslateCache.CompiledDictionary)
+        self.assertEqual(list(Translate.dictionary.items()), json_dictionary)
+        print('Loaded', len(json_dictionary), 'translations: json', round(time_json, 3), 's, lazy startup', round(time_lazy, 4), 's, register',
+              round(time_register, 3), 's, compiled on first use', round(time_compiled, 3), 's')
+
+        # Outdated or broken compiled dictionaries are ignored
+        signature = TranslateCache.get_source_signature([Translate.dictionary_file])
+        self.assertIsNone(TranslateCache.read_compiled_dictionary(Translate.dictionary_compiled_file, signature))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dictionary.bin')
+            TranslateCache.write_compiled_dictionary(path, Translate.dictionary, signature)
+            compiled = TranslateCache.read_compiled_dictionary(path, signature)
+            self.assertEqual(list(compiled.items()), json_dictionary)
+            for key, value in json_dictionary[::50]:
+                self.assertEqual(compiled[key], value)
+            self.assertNotIn('\0', compiled)
+            compiled.close()
+            with open(path, 'r+b') as file:
+                file.truncate(TranslateCache.compiled_header.size + 3)
+            self.assertIsNone(TranslateCache.read_compiled_dictionary(path, signature))
+
+    def test_google_fetch(self):
+        server = http.server.HTTPServer(('127.0.0.1', 0), StubTranslationHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        TranslateCache.set_backend(StubBackend('http://127.0.0.1:' + str(server.server_port) + '/'))
+
+        try:
+            texts = ['右腕', '左腕', '右腕', 'まばたき', '左腕']
+            progress = []
+            StubTranslationHandler.received = []
+
+            start = time.time()
+            translations, error = TranslateCache.fetch(texts, progress=lambda done, total: progress.append((done, total)))
+            print('Fetched', len(translations), 'translations in', round(time.time() - start, 3), 's')
+
+            self.assertIsNone(error)
+            self.assertEqual(list(translations.keys()), ['右腕', '左腕', 'まばたき'])
+            self.assertEqual(translations['まばたき'], 'translated 4')
+            self.assertEqual(sorted(StubTranslationHandler.received), sorted(translations.keys()))
+            self.assertEqual(progress[-1], (3, 3))
+        finally:
+            TranslateCache.set_backend()
+            server.shutdown()
+            server.server_close()
+
+    def test_google_fetch_retry(self):
+        class FlakyBackend:
+            calls = 0
+
+            def reset(self):
+                pass
+
+            def translate(self, text):
+                FlakyBackend.calls += 1
+                if FlakyBackend.calls % 3:
+                    raise requests.exceptions.ConnectTimeout()
+                return 'translated ' + text
+
+        # Timeouts and dropped connections are retried, only the last error ends the fetch
+        TranslateCache.set_backend(FlakyBackend())
+        try:
+            translations, error = TranslateCache.fetch(['右腕', '左腕'], retries=3, retry_delay=0.01)
+            self.assertIsNone(error)
+            self.assertEqual(list(translations.values()), ['translated 右腕', 'translated 左腕'])
+
+            FlakyBackend.calls = 0
+            translations, error = TranslateCache.fetch(['右腕'], retries=2, retry_delay=0.01)
+            self.assertEqual(error.reason, 'connection')
+            self.assertEqual(FlakyBackend.calls, 2)
+        finally:
+            TranslateCache.set_backend()
+
+    def test_google_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = TranslateCache.GoogleDictionaryStore(os.path.join(directory, 'dict.json'), os.path.join(directory, 'dict.log'))
+            self.assertIsNone(store.load())
+
+            store.save({'created': 'now', 'translations': {}, 'translations_full': {}})
+            store.append('translations', {'右腕': 'Right Arm'})
+            store.append('translations_full', {'まばたき': 'blink'})
+            store.append('translations', {'右腕': 'Arm R'})
+
+            # An incomplete last line gets skipped
+            with open(store.log_file, 'a', encoding='utf8') as file:
+                file.write('{"t": "translations", "k": "左')
+
+            data = store.load()
+            self.assertEqual(data['translations'], {'右腕': 'Arm R'})
+            self.assertEqual(data['translations_full'], {'まばたき': 'blink'})
+
+            # Compacting writes the snapshot and removes the log
+            store.save(data)
+            self.assertFalse(os.path.exists(store.log_file))
+            self.assertEqual(store.load()['translations'], {'右腕': 'Arm R'})
+
 
 suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestAddon)
 runner = unittest.TextTestRunner()
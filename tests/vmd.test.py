@@ -0,0 +1,269 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats
+
+import unittest
+import sys
+import os
+import time
+import random
+import tempfile
+import numpy as np
+import bpy
+
+from mmd_tools_local.bpyutils import SceneOp
+from mmd_tools_local.core import vmd
+from mmd_tools_local.core.camera import MMDCamera
+from mmd_tools_local.core.lamp import MMDLamp
+from mmd_tools_local.core.vmd.importer import VMDImporter
+from mmd_tools_local.core.vmd.exporter import VMDExporter
+
+
+def create_motion(frame_count, bone_count, seed=0, bone_names=None):
+    # Synthetic motion with interleaved bone/morph frames, camera and lamp frames
+    rand = random.Random(seed)
+
+    def vector(size):
+        return [rand.uniform(-1, 1) for i in range(size)]
+
+    motion = vmd.File()
+    motion.header = vmd.Header()
+    motion.header.model_name = 'Test'
+    motion.boneAnimation = vmd.BoneAnimation()
+    motion.shapeKeyAnimation = vmd.ShapeKeyAnimation()
+    motion.cameraAnimation = vmd.CameraAnimation()
+    motion.lampAnimation = vmd.LampAnimation()
+
+    bone_names = (bone_names or ['ボーン' + str(i) for i in range(bone_count)]) + ['センター', '全ての親']
+    for i in range(frame_count):
+        frame = vmd.BoneFrameKey()
+        frame.frame_number = rand.randrange(10000)
+        frame.location = vector(3)
+        frame.rotation = vector(4) if i % 5 else [0, 0, 0, 0]
+        frame.interp = [rand.randrange(128) for j in range(64)]
+        motion.boneAnimation[rand.choice(bone_names)].append(frame)
+
+    for i in range(frame_count // 10):
+        frame = vmd.ShapeKeyFrameKey()
+        frame.frame_number = rand.randrange(10000)
+        frame.weight = rand.random()
+        motion.shapeKeyAnimation['まばたき' if i % 2 else 'あ'].append(frame)
+
+    for i in range(100):
+        frame = vmd.CameraKeyFrameKey()
+        frame.frame_number = i
+        frame.distance = rand.uniform(-50, 0)
+        frame.location = vector(3)
+        frame.rotation = vector(3)
+        frame.interp = [rand.randrange(128) for j in range(24)]
+        frame.angle = rand.randrange(10, 90)
+        frame.persp = bool(i % 3)
+        motion.cameraAnimation.append(frame)
+
+        frame = vmd.LampKeyFrameKey()
+        frame.frame_number = i - i % 2
+        frame.color = [rand.random() for j in range(3)]
+        frame.direction = vector(3)
+        motion.lampAnimation.append(frame)
+
+    return motion
+
+
+def create_targets():
+    # The first armature of the scene with bones in all rotation modes, a mesh with shape keys, a camera and a lamp
+    scene = SceneOp(bpy.context)
+    armature = next(obj for obj in bpy.data.objects if obj.type == 'ARMATURE')
+    bone_names = [bone.name for bone in armature.pose.bones if len(bone.name.encode('shift_jis', errors='replace')) <= 15]
+    for bone, rotation_mode in zip(armature.pose.bones, ('XYZ', 'AXIS_ANGLE', 'ZXY')):
+        bone.rotation_mode = rotation_mode
+
+    mesh = bpy.data.objects.new('VMD Mesh', bpy.data.meshes.new('VMD Mesh'))
+    mesh.data.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+    scene.link_object(mesh)
+    for name in ('Basis', 'あ', 'まばたき'):
+        mesh.shape_key_add(name=name)
+
+    camera = bpy.data.objects.new('VMD Camera', bpy.data.cameras.new('VMD Camera'))
+    scene.link_object(camera)
+    camera = MMDCamera.convertToMMDCamera(camera).camera()
+
+    lamps = bpy.data.lamps if bpy.app.version < (2, 80, 0) else bpy.data.lights
+    lamp = bpy.data.objects.new('VMD Lamp', lamps.new('VMD Lamp', 'SUN'))
+    scene.link_object(lamp)
+    lamp = MMDLamp.convertToMMDLamp(lamp).lamp()
+    return bone_names, (armature, mesh, camera, lamp)
+
+
+def fcurve_values(actions):
+    values = {}
+    for action in actions:
+        for fcurve in action.fcurves:
+            points = fcurve.keyframe_points
+            arrays = []
+            for attribute in ('co', 'handle_left', 'handle_right'):
+                array = np.empty(len(points) * 2, dtype=np.float32)
+                points.foreach_get(attribute, array)
+                arrays.append(array)
+            enums = [(p.interpolation, p.handle_left_type, p.handle_right_type) for p in points]
+            values[(action.name.split('.')[0], fcurve.data_path, fcurve.array_index)] = (np.concatenate(arrays), enums)
+    return values
+
+
+def import_vmd(path, targets, **args):
+    actions = set(bpy.data.actions)
+    start = time.time()
+    importer = VMDImporter(path, **args)
+    for obj in targets:
+        importer.assign(obj, action_name='vmd')
+    duration = time.time() - start
+    return fcurve_values(action for action in bpy.data.actions if action not in actions), duration
+
+
+def frame_values(frame):
+    return {key: list(value) if isinstance(value, (list, tuple)) else value for key, value in vars(frame).items()}
+
+
+class TestAddon(unittest.TestCase):
+    def save_load(self, motion):
+        path = os.path.join(tempfile.mkdtemp(), 'test.vmd')
+        motion.save(filepath=path)
+        loaded, loaded_legacy = vmd.File(), vmd.File()
+        loaded.load(filepath=path)
+        loaded_legacy.load(filepath=path, in_memory=False)
+        return path, loaded, loaded_legacy
+
+    def check_motion(self, motion, motion_legacy):
+        for attr in ('boneAnimation', 'shapeKeyAnimation'):
+            animation, animation_legacy = getattr(motion, attr), getattr(motion_legacy, attr)
+            self.assertEqual(list(animation.keys()), list(animation_legacy.keys()))
+            for name, frames in animation_legacy.items():
+                self.assertEqual([frame_values(f) for f in animation[name]], [frame_values(f) for f in frames])
+        for attr in ('cameraAnimation', 'lampAnimation', 'selfShadowAnimation', 'propertyAnimation'):
+            animation, animation_legacy = getattr(motion, attr), getattr(motion_legacy, attr)
+            self.assertEqual([frame_values(f) for f in animation], [frame_values(f) for f in animation_legacy])
+
+    def test_vmd_round_trip(self):
+        path, motion, motion_legacy = self.save_load(create_motion(5000, 30))
+        self.check_motion(motion, motion_legacy)
+
+        # Saving the loaded motions again gives the same file
+        data = []
+        for saved_motion, in_memory in ((motion, True), (motion_legacy, False)):
+            path_copy = path + '.copy.vmd'
+            saved_motion.save(filepath=path_copy, in_memory=in_memory)
+            with open(path_copy, 'rb') as file_copy:
+                data.append(file_copy.read())
+        self.assertEqual(data[0], data[1])
+
+    def test_vmd_frame_arrays(self):
+        path, motion, motion_legacy = self.save_load(create_motion(2000, 10))
+        arrays = motion.boneAnimation.getFrameArrays()
+        arrays_legacy = motion_legacy.boneAnimation.getFrameArrays()
+
+        # The arrays are grouped by name in file order and hold the same values as the objects
+        self.assertFalse(any(frames.isBuilt() for frames in motion.boneAnimation.values()))
+        self.assertEqual(list(arrays.keys()), list(motion_legacy.boneAnimation.keys()))
+        for name, frames in arrays.items():
+            self.assertEqual(frames.tobytes(), arrays_legacy[name].tobytes())
+            self.assertEqual(frames['frame_number'].tolist(), [f.frame_number for f in motion_legacy.boneAnimation[name]])
+        self.assertEqual(motion.cameraAnimation.getFrameArrays().tobytes(), motion_legacy.cameraAnimation.getFrameArrays().tobytes())
+
+        # Sorting builds the objects, changed objects are used for the arrays
+        name = next(iter(arrays))
+        motion.boneAnimation[name].sort(key=lambda x: x.frame_number)
+        self.assertEqual(motion.boneAnimation.getFrameArrays()[name]['frame_number'].tolist(), sorted(arrays[name]['frame_number'].tolist()))
+
+    def test_vmd_import(self):
+        bone_names, targets = create_targets()
+        path, motion, motion_legacy = self.save_load(create_motion(20000, 0, bone_names=bone_names))
+        for use_mirror in (False, True):
+            values, time_columnar = import_vmd(path, targets, use_mirror=use_mirror, columnar=True)
+            values_legacy, time_legacy = import_vmd(path, targets, use_mirror=use_mirror, columnar=False)
+
+            # Same keyframes, only the converted rotations and the handles are rounded differently
+            self.assertEqual(sorted(values.keys()), sorted(values_legacy.keys()))
+            for key, (array, enums) in values_legacy.items():
+                self.assertEqual(values[key][1], enums, key)
+                self.assertTrue(np.allclose(values[key][0], array, atol=1e-4), key)
+            print('Imported', len(values), 'F-Curves: columnar', round(time_columnar, 3), 's, legacy', round(time_legacy, 3), 's')
+
+    def test_vmd_export(self):
+        bone_names, targets = create_targets()
+        path, motion, motion_legacy = self.save_load(create_motion(20000, 0, bone_names=bone_names))
+        import_vmd(path, targets)
+
+        # Keyframes between the imported ones are sampled by splitting the beziers of the other F-Curves
+        armature = targets[0]
+        for fcurve in armature.animation_data.action.fcurves[::4]:
+            for frame in range(3, 10000, 97):
+                fcurve.keyframe_points.insert(frame + 0.3, fcurve.evaluate(frame) + 0.1)
+
+        for objects in ({'armature': targets[0], 'mesh': targets[1]}, {'camera': targets[2], 'lamp': targets[3]}):
+            data, durations = [], []
+            for columnar in (True, False):
+                path_export = os.path.join(tempfile.mkdtemp(), 'export.vmd')
+                start = time.time()
+                VMDExporter().export(filepath=path_export, columnar=columnar, **objects)
+                durations.append(time.time() - start)
+                with open(path_export, 'rb') as file:
+                    data.append(file.read())
+            self.assertEqual(data[0], data[1])
+            print('Exported', sorted(objects), round(len(data[0]) / 1024 / 1024, 1), 'MB: columnar', round(durations[0], 3), 's, legacy', round(durations[1], 3), 's')
+
+    def test_vmd_corrupted(self):
+        path, motion, motion_legacy = self.save_load(create_motion(1000, 10))
+        with open(path, 'rb') as file:
+            data = file.read()
+        with open(path, 'wb') as file:
+            file.write(data[:len(data) // 2])
+
+        # The complete frames before the end of the file are loaded
+        motion, motion_legacy = vmd.File(), vmd.File()
+        motion.load(filepath=path)
+        motion_legacy.load(filepath=path, in_memory=False)
+        self.check_motion(motion, motion_legacy)
+
+    def test_vmd_benchmark(self):
+        path, motion, motion_legacy = self.save_load(create_motion(200000, 100))
+        size = os.path.getsize(path) / 1024 / 1024
+
+        start = time.time()
+        motion = vmd.File()
+        motion.load(filepath=path)
+        motion.boneAnimation.getFrameArrays()
+        time_arrays = time.time() - start
+
+        start = time.time()
+        motion = vmd.File()
+        motion.load(filepath=path, in_memory=False)
+        time_legacy = time.time() - start
+
+        print('Loaded', round(size, 1), 'MB: arrays', round(size / time_arrays, 1), 'MB/s, legacy', round(size / time_legacy, 1), 'MB/s')
+
+
+suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestAddon)
+runner = unittest.TextTestRunner()
+ret = not runner.run(suite).wasSuccessful()
+sys.exit(ret)
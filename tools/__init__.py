@@ -7,6 +7,8 @@ if "bpy" not in locals():
     from . import armature_manual
     from . import armature_custom
     from . import atlas
+    from . import bake_cache
+    from . import bake_graph
     from . import bonemerge
     from . import common
     from . import copy_protection
@@ -14,6 +16,7 @@ if "bpy" not in locals():
     from . import decimation
     from . import eyetracking
     from . import fbx_patch
+    from . import image_ops
     from . import importer
     from . import material
     from . import rootbone
@@ -21,6 +24,7 @@ if "bpy" not in locals():
     from . import settings
     from . import shapekey
     from . import supporter
+    from . import translate_cache
     from . import translate
     from . import translations
     from . import viseme
@@ -33,6 +37,8 @@ else:
     importlib.reload(armature_manual)
     importlib.reload(armature_custom)
     importlib.reload(atlas)
+    importlib.reload(bake_cache)
+    importlib.reload(bake_graph)
     importlib.reload(bonemerge)
     importlib.reload(common)
     importlib.reload(copy_protection)
@@ -40,6 +46,7 @@ else:
     importlib.reload(decimation)
     importlib.reload(eyetracking)
     importlib.reload(fbx_patch)
+    importlib.reload(image_ops)
     importlib.reload(importer)
     importlib.reload(material)
     importlib.reload(rootbone)
@@ -47,6 +54,7 @@ else:
     importlib.reload(settings)
     importlib.reload(shapekey)
     importlib.reload(supporter)
+    importlib.reload(translate_cache)
     importlib.reload(translate)
     importlib.reload(translations)
     importlib.reload(viseme)
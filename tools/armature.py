@@ -95,58 +95,22 @@ class FixArmature(bpy.types.Operator):
         # Check if bone matrix == world matrix, important for xps models
         x_cord, y_cord, z_cord, fbx = Common.get_bone_orientations(armature)
 
-        # Add rename bones to reweight bones
-        temp_rename_bones = copy.deepcopy(Bones.bone_rename)
-        temp_reweight_bones = copy.deepcopy(Bones.bone_reweight)
+        # The rename and reweight lists including both sides of each bone are precompiled in armature_bones
         temp_list_reweight_bones = copy.deepcopy(Bones.bone_list_weight)
         temp_list_reparent_bones = copy.deepcopy(Bones.bone_list_parenting)
 
-        for key, value in Bones.bone_rename_fingers.items():
-            temp_rename_bones[key] = value
-
-        for key, value in temp_rename_bones.items():
-            if key == 'Spine':
-                continue
-            list = temp_reweight_bones.get(key)
-            if not list:
-                temp_reweight_bones[key] = value
-            else:
-                for name in value:
-                    if name not in list:
-                        temp_reweight_bones.get(key).append(name)
-
         # Count objects for loading bar
-        steps = 0
-        for key, value in temp_rename_bones.items():
-            if '\Left' in key or '\L' in key:
-                steps += 2 * len(value)
-            else:
-                steps += len(value)
-        for key, value in temp_reweight_bones.items():
-            if '\Left' in key or '\L' in key:
-                steps += 2 * len(value)
-            else:
-                steps += len(value)
+        steps = len(Bones.bone_rename_aliases) + len(Bones.bone_reweight_aliases)
         steps += len(temp_list_reweight_bones)  # + len(Bones.bone_list_parenting)
 
         # Get Double Entries
         print('DOUBLE ENTRIES:')
         print('RENAME:')
-        list = []
-        for key, value in temp_rename_bones.items():
-            for name in value:
-                if name.lower() not in list:
-                    list.append(name.lower())
-                else:
-                    print(key + " | " + name)
+        for key, name in Bones.bone_rename_doubles:
+            print(key + " | " + name)
         print('REWEIGHT:')
-        list = []
-        for key, value in temp_reweight_bones.items():
-            for name in value:
-                if name.lower() not in list:
-                    list.append(name.lower())
-                else:
-                    print(key + " | " + name)
+        for key, name in Bones.bone_reweight_doubles:
+            print(key + " | " + name)
         print('DOUBLES END')
 
         # Check if model is mmd model
@@ -359,6 +323,7 @@ class FixArmature(bpy.types.Operator):
         else:
             meshes = Common.get_meshes_objects()
 
+        overlapping_faces = 0
         for mesh in meshes:
             Common.unselect_all()
             Common.set_active(mesh)
@@ -418,6 +383,9 @@ class FixArmature(bpy.types.Operator):
                     Common.fix_vrm_shader(mesh)
                     Common.add_principled_shader(mesh)
 
+                # Faces on top of faces of other materials flicker, the user has to fix them manually
+                overlapping_faces += len(Common.get_overlapping_faces(mesh))
+
             # Reorders vrc shape keys to the correct order
             Common.sort_shape_keys(mesh.name)
 
@@ -489,112 +457,12 @@ class FixArmature(bpy.types.Operator):
         current_step = 0
         wm.progress_begin(current_step, steps)
 
-        # List of chars to replace if they are at the start of a bone name
-        starts_with = [
-            ('_', ''),
-            ('ValveBiped_', ''),
-            ('Valvebiped_', ''),
-            ('Bip1_', 'Bip_'),
-            ('Bip01_', 'Bip_'),
-            ('Bip001_', 'Bip_'),
-            ('Bip01', ''),
-            ('Bip02_', 'Bip_'),
-            ('Character1_', ''),
-            ('HLP_', ''),
-            ('JD_', ''),
-            ('JU_', ''),
-            ('Armature|', ''),
-            ('Bone_', ''),
-            ('C_', ''),
-            ('Cf_S_', ''),
-            ('Cf_J_', ''),
-            ('G_', ''),
-            ('Joint_', ''),
-            ('Def_C_', ''),
-            ('Def_', ''),
-            ('DEF_', ''),
-            ('Chr_', ''),
-            ('Chr_', ''),
-            ('B_', ''),
-        ]
-        # List of chars to replace if they are at the end of a bone name
-        ends_with = [
-            ('_Bone', ''),
-            ('_Bn', ''),
-            ('_Le', '_L'),
-            ('_Ri', '_R'),
-            ('_', ''),
-        ]
-        # List of chars to replace
-        replaces = [
-            (' ', '_'),
-            ('-', '_'),
-            ('.', '_'),
-            (':', '_'),
-            ('____', '_'),
-            ('___', '_'),
-            ('__', '_'),
-            ('_Le_', '_L_'),
-            ('_Ri_', '_R_'),
-            ('LEFT', 'Left'),
-            ('RIGHT', 'Right'),
-        ]
-
         # Standardize names
         for bone in armature.data.edit_bones:
             current_step += 1
             wm.progress_update(current_step)
 
-            name = bone.name
-
-            # Always uppercase at the start and after an underscore
-            upper_name = ''
-            for i, s in enumerate(name.split('_')):
-                if i != 0:
-                    upper_name += '_'
-                upper_name += s[:1].upper() + s[1:]
-            name = upper_name
-
-            # Replace all the things!
-            for replacement in replaces:
-                name = name.replace(replacement[0], replacement[1])
-
-            # Replace if name starts with specified chars
-            for replacement in starts_with:
-                if name.startswith(replacement[0]):
-                    name = replacement[1] + name[len(replacement[0]):]
-
-            # Replace if name ends with specified chars
-            for replacement in ends_with:
-                if name.endswith(replacement[0]):
-                    name = name[:-len(replacement[0])] + replacement[1]
-
-            # Remove digits from the start
-            name_split = name.split('_')
-            if len(name_split) > 1 and name_split[0].isdigit():
-                name = name_split[1]
-
-            # Specific condition
-            name_split = name.split('"')
-            if len(name_split) > 3:
-                name = name_split[1]
-
-            # Another specific condition
-            if ':' in name:
-                for i, split in enumerate(name.split(':')):
-                    if i == 0:
-                        name = ''
-                    else:
-                        name += split
-
-            # Remove S0 from the end
-            if name[-2:] == 'S0':
-                name = name[:-2]
-
-            if name[-4:] == '_Jnt':
-                name = name[:-4]
-
-            bone.name = name
+            bone.name = Common.standardize_bone_name(bone.name)
 
         # Add conflicting bone names to new list
         conflicting_bones = []
@@ -623,34 +491,19 @@ class FixArmature(bpy.types.Operator):
             conflicting_bones.append((names0, name1, name2))
 
         # Resolve conflicting bone names
+        bone_index = Common.NameIndex(armature.data.edit_bones)
         for names in conflicting_bones:
 
             # Search for bone in armature
-            bone = None
-            for bone_tmp in armature.data.edit_bones:
-                if bone_tmp.name.lower() == names[1].lower():
-                    bone = bone_tmp
-                    break
+            bone = bone_index.get(names[1])
 
             # Cancel if bone was not found
             if not bone:
                 continue
 
-            # Search for all the required bones
-            found_all = True
-            for name in names[0]:
-                found = False
-                for bone_tmp in armature.data.edit_bones:
-                    if bone_tmp.name.lower() == name.lower():
-                        found = True
-                        break
-                if not found:
-                    found_all = False
-                    break
-
             # Rename only if all required bones are found
-            if found_all:
-                bone.name = names[2]
+            if all(name in bone_index for name in names[0]):
+                bone_index.rename(bone, names[2])
 
         # Standardize bone names again (new duplicate bones have ".001" in it)
         for bone in armature.data.edit_bones:
@@ -659,46 +512,30 @@ class FixArmature(bpy.types.Operator):
         # Rename all the bones
         spines = []
         spine_parts = []
-        for bone_new, bones_old in temp_rename_bones.items():
-            if '\Left' in bone_new or '\L' in bone_new:
-                bones = [[bone_new.replace('\Left', 'Left').replace('\left', 'left').replace('\L', 'L').replace('\l', 'l'), ''],
-                         [bone_new.replace('\Left', 'Right').replace('\left', 'right').replace('\L', 'R').replace('\l', 'r'), '']]
-            else:
-                bones = [[bone_new, '']]
-            for bone_old in bones_old:
-                if '\Left' in bone_new or '\L' in bone_new:
-                    bones[0][1] = bone_old.replace('\Left', 'Left').replace('\left', 'left').replace('\L', 'L').replace('\l', 'l')
-                    bones[1][1] = bone_old.replace('\Left', 'Right').replace('\left', 'right').replace('\L', 'R').replace('\l', 'r')
-                else:
-                    bones[0][1] = bone_old
-
-                for bone in bones:  # bone[0] = new name, bone[1] = old name
-                    current_step += 1
-                    wm.progress_update(current_step)
+        bone_index = Common.NameIndex(armature.data.edit_bones)
+        for bone_new, new_name, old_name in Bones.bone_rename_aliases:
+            current_step += 1
+            wm.progress_update(current_step)
 
-                    # Seach for bone in armature
-                    bone_final = None
-                    for bone_tmp in armature.data.edit_bones:
-                        if bone_tmp.name.lower() == bone[1].lower():
-                            bone_final = bone_tmp
-                            break
+            # Seach for bone in armature
+            bone_final = bone_index.get(old_name)
 
-                    # Cancel if bone was not found
-                    if not bone_final:
-                        continue
+            # Cancel if bone was not found
+            if not bone_final:
+                continue
 
-                    # If spine bone, then don't rename for now, and ignore spines with no children
-                    if bone_new == 'Spine':
-                        if len(bone_final.children) > 0:
-                            spines.append(bone_final.name)
-                        else:
-                            spine_parts.append(bone_final.name)
-                        continue
+            # If spine bone, then don't rename for now, and ignore spines with no children
+            if bone_new == 'Spine':
+                if len(bone_final.children) > 0:
+                    spines.append(bone_final.name)
+                else:
+                    spine_parts.append(bone_final.name)
+                continue
 
-                    # Rename the bone
-                    if bone[0] not in armature.data.edit_bones:
-                        # print(bone_final.name, '>', bone[0])
-                        bone_final.name = bone[0]
+            # Rename the bone
+            if new_name not in armature.data.edit_bones:
+                # print(bone_final.name, '>', new_name)
+                bone_index.rename(bone_final, new_name)
 
         # Check if it is a mixamo model
         mixamo = False
@@ -970,132 +807,100 @@ class FixArmature(bpy.types.Operator):
             print(bones_to_delete)
 
             # Add bones to parent reweight list
-            for name in Bones.bone_reweigth_to_parent:
-                if '\Left' in name or '\L' in name:
-                    bones = [name.replace('\Left', 'Left').replace('\left', 'left').replace('\L', 'L').replace('\l', 'l'),
-                             name.replace('\Left', 'Right').replace('\left', 'right').replace('\L', 'R').replace('\l', 'r')]
-                else:
-                    bones = [name]
-
-                for bone_name in bones:
-                    bone_child = None
-                    bone_parent = None
-                    for bone in armature.data.bones:
-                        if bone_name.lower() == bone.name.lower():
-                            bone_child = bone
-                            bone_parent = bone.parent
+            bones_by_name = {bone.name.lower(): bone for bone in armature.data.bones}
+            for bone_name in Bones.bone_reweigth_to_parent_aliases:
+                bone_child = bones_by_name.get(bone_name.lower())
+                if not bone_child or not bone_child.parent:
+                    continue
+                bone_parent = bone_child.parent
 
-                    if not bone_child or not bone_parent:
-                        continue
+                if context.scene.keep_twist_bones and 'twist' in bone_child.name.lower():
+                    continue
+                if context.scene.fix_twist_bones and bone_child.name.lower() in ['handtwist_l', 'handtwist_r', 'armtwist_l', 'armtwist_r']:
+                    print('TWIST FOUND!')
+                    continue
 
-                    if context.scene.keep_twist_bones and 'twist' in bone_child.name.lower():
-                        continue
-                    if context.scene.fix_twist_bones and bone_child.name.lower() in ['handtwist_l', 'handtwist_r', 'armtwist_l', 'armtwist_r']:
-                        print('TWIST FOUND!')
-                        continue
+                # search for next parent that is not in the "reweight to parent" list
+                while bone_parent and bone_parent.name in Bones.bone_reweigth_to_parent_names:
+                    bone_parent = bone_parent.parent
 
-                    # search for next parent that is not in the "reweight to parent" list
-                    parent_in_list = True
-                    while parent_in_list:
-                        parent_in_list = False
-                        for name_tmp in Bones.bone_reweigth_to_parent:
-                            if bone_parent.name == name_tmp.replace('\Left', 'Left').replace('\left', 'left').replace('\L', 'L').replace('\l', 'l') \
-                                    or bone_parent.name == name_tmp.replace('\Left', 'Right').replace('\left', 'right').replace('\L', 'R').replace('\l', 'r'):
-                                bone_parent = bone_parent.parent
-                                parent_in_list = True
-                                break
-
-                    if not bone_parent:
-                        continue
+                if not bone_parent:
+                    continue
 
-                    if bone_child.name not in mesh.vertex_groups:
-                        # Add bone to delete list
-                        if bone_child.name not in bones_to_delete:
-                            bones_to_delete.append(bone_child.name)
-                        continue
+                if bone_child.name not in mesh.vertex_groups:
+                    # Add bone to delete list
+                    if bone_child.name not in bones_to_delete:
+                        bones_to_delete.append(bone_child.name)
+                    continue
 
-                    if bone_parent.name not in mesh.vertex_groups:
-                        mesh.vertex_groups.new(name=bone_parent.name)
+                if bone_parent.name not in mesh.vertex_groups:
+                    mesh.vertex_groups.new(name=bone_parent.name)
 
-                    bone_tmp = armature.data.bones.get(bone_child.name)
-                    if bone_tmp:
-                        for child in bone_tmp.children:
-                            if not temp_list_reparent_bones.get(child.name):
-                                temp_list_reparent_bones[child.name] = bone_parent.name
+                bone_tmp = armature.data.bones.get(bone_child.name)
+                if bone_tmp:
+                    for child in bone_tmp.children:
+                        if not temp_list_reparent_bones.get(child.name):
+                            temp_list_reparent_bones[child.name] = bone_parent.name
 
-                    # Mix the weights
-                    Common.mix_weights(mesh, bone_child.name, bone_parent.name)
+                # Mix the weights
+                Common.mix_weights(mesh, bone_child.name, bone_parent.name)
 
-                    # Add bone to delete list
-                    if bone_child.name not in bones_to_delete:
-                        bones_to_delete.append(bone_child.name)
+                # Add bone to delete list
+                if bone_child.name not in bones_to_delete:
+                    bones_to_delete.append(bone_child.name)
 
             # Merge weights
-            for bone_new, bones_old in temp_reweight_bones.items():
-                if '\Left' in bone_new or '\L' in bone_new:
-                    bones = [[bone_new.replace('\Left', 'Left').replace('\left', 'left').replace('\L', 'L').replace('\l', 'l'), ''],
-                             [bone_new.replace('\Left', 'Right').replace('\left', 'right').replace('\L', 'R').replace('\l', 'r'), '']]
-                else:
-                    bones = [[bone_new, '']]
-                for bone_old in bones_old:
-                    if '\Left' in bone_new or '\L' in bone_new:
-                        bones[0][1] = bone_old.replace('\Left', 'Left').replace('\left', 'left').replace('\L', 'L').replace('\l', 'l')
-                        bones[1][1] = bone_old.replace('\Left', 'Right').replace('\left', 'right').replace('\L', 'R').replace('\l', 'r')
-                    else:
-                        bones[0][1] = bone_old
+            vg_index = Common.NameIndex(mesh.vertex_groups)
+            for bone_new, new_name, old_name in Bones.bone_reweight_aliases:
+                current_step += 1
+                wm.progress_update(current_step)
 
-                    for bone in bones:  # bone[0] = new name, bone[1] = old name
-                        current_step += 1
-                        wm.progress_update(current_step)
+                # Seach for vertex group
+                vg = vg_index.get(old_name)
 
-                        # Seach for vertex group
-                        vg = None
-                        for vg_tmp in mesh.vertex_groups:
-                            if vg_tmp.name.lower() == bone[1].lower():
-                                vg = vg_tmp
-                                break
-
-                        # Cancel if vertex group was not found
-                        if not vg:
-                            # Add bone to delete list
-                            if bone[1] not in bones_to_delete:
-                                bones_to_delete.append(bone[1])
-                            continue
+                # Cancel if vertex group was not found
+                if not vg:
+                    # Add bone to delete list
+                    if old_name not in bones_to_delete:
+                        bones_to_delete.append(old_name)
+                    continue
 
-                        if bone[0] == vg.name:
-                            print('BUG: ' + bone[0] + ' tried to mix weights with itself!')
-                            continue
+                if new_name == vg.name:
+                    print('BUG: ' + new_name + ' tried to mix weights with itself!')
+                    continue
 
-                        if context.scene.keep_twist_bones and 'twist' in bone[1].lower():
-                            continue
-                        if context.scene.fix_twist_bones and bone[1].lower() in ['handtwist_l', 'handtwist_r', 'armtwist_l', 'armtwist_r']:
-                            print('TWIST FOUND!')
-                            continue
+                if context.scene.keep_twist_bones and 'twist' in old_name.lower():
+                    continue
+                if context.scene.fix_twist_bones and old_name.lower() in ['handtwist_l', 'handtwist_r', 'armtwist_l', 'armtwist_r']:
+                    print('TWIST FOUND!')
+                    continue
 
-                        # print(bone[1] + " to1 " + bone[0])
+                # print(old_name + " to1 " + new_name)
 
-                        # If important vertex group is not there create it
-                        if mesh.vertex_groups.get(bone[0]) is None:
-                            if bone[0] in Bones.dont_delete_these_bones and bone[0] in armature.data.bones:
-                                bpy.ops.object.vertex_group_add()
-                                mesh.vertex_groups.active.name = bone[0]
-                                if mesh.vertex_groups.get(bone[0]) is None:
-                                    continue
-                            else:
-                                continue
+                # If important vertex group is not there create it
+                if mesh.vertex_groups.get(new_name) is None:
+                    if new_name in Bones.dont_delete_these_bones and new_name in armature.data.bones:
+                        bpy.ops.object.vertex_group_add()
+                        vg_index.rename(mesh.vertex_groups.active, new_name)
+                        if mesh.vertex_groups.get(new_name) is None:
+                            continue
+                    else:
+                        continue
 
-                        bone_tmp = armature.data.bones.get(vg.name)
-                        if bone_tmp:
-                            for child in bone_tmp.children:
-                                if not temp_list_reparent_bones.get(child.name):
-                                    temp_list_reparent_bones[child.name] = bone[0]
+                vg_name = vg.name
+                bone_tmp = armature.data.bones.get(vg_name)
+                if bone_tmp:
+                    for child in bone_tmp.children:
+                        if not temp_list_reparent_bones.get(child.name):
+                            temp_list_reparent_bones[child.name] = new_name
 
-                        # print(vg.name + " to " + bone[0])
-                        Common.mix_weights(mesh, vg.name, bone[0])
+                # print(vg_name + " to " + new_name)
+                Common.mix_weights(mesh, vg_name, new_name)
+                vg_index.discard(vg_name)
 
-                        # Add bone to delete list
-                        if vg.name not in bones_to_delete:
-                            bones_to_delete.append(vg.name)
+                # Add bone to delete list
+                if vg_name not in bones_to_delete:
+                    bones_to_delete.append(vg_name)
 
             # Old mixing weights. Still important
             for key, value in temp_list_reweight_bones.items():
@@ -1103,17 +908,8 @@ class FixArmature(bpy.types.Operator):
                 wm.progress_update(current_step)
 
                 # Search for vertex groups
-                vg_from = None
-                vg_to = None
-                for vg_tmp in mesh.vertex_groups:
-                    if vg_tmp.name.lower() == key.lower():
-                        vg_from = vg_tmp
-                        if vg_to:
-                            break
-                    elif vg_tmp.name.lower() == value.lower():
-                        vg_to = vg_tmp
-                        if vg_from:
-                            break
+                vg_from = vg_index.get(key)
+                vg_to = vg_index.get(value) if value.lower() != key.lower() else None
 
                 # Cancel if vertex groups was not found
                 if not vg_from:
@@ -1144,11 +940,13 @@ class FixArmature(bpy.types.Operator):
 
                 # Mix the weights
                 # print(vg_from.name, 'into', vg_to.name)
-                Common.mix_weights(mesh, vg_from.name, vg_to.name)
+                vg_from_name = vg_from.name
+                Common.mix_weights(mesh, vg_from_name, vg_to.name)
+                vg_index.discard(vg_from_name)
 
                 # Add bone to delete list
-                if vg_from.name not in bones_to_delete:
-                    bones_to_delete.append(vg_from.name)
+                if vg_from_name not in bones_to_delete:
+                    bones_to_delete.append(vg_from_name)
 
             # Put back armature modifier
             mod = mesh.modifiers.new("Armature", 'ARMATURE')
@@ -1243,6 +1041,10 @@ class FixArmature(bpy.types.Operator):
 
         saved_data.load()
 
+        if overlapping_faces:
+            self.report({'WARNING'}, t('FixArmature.overlappingFaces', faces=str(overlapping_faces)))
+            return {'FINISHED'}
+
         self.report({'INFO'}, t('FixArmature.fixedSuccess'))
         return {'FINISHED'}
 
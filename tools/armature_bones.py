@@ -337,6 +337,58 @@ bone_finger_list = [
 #   L/R = \L
 #   l/r = \l
 ################################
+# Rules to standardize bone names, applied in this order
+# List of chars to replace
+bone_name_replaces = [
+    (' ', '_'),
+    ('-', '_'),
+    ('.', '_'),
+    (':', '_'),
+    ('____', '_'),
+    ('___', '_'),
+    ('__', '_'),
+    ('_Le_', '_L_'),
+    ('_Ri_', '_R_'),
+    ('LEFT', 'Left'),
+    ('RIGHT', 'Right'),
+]
+# List of chars to replace if they are at the start of a bone name
+bone_name_starts_with = [
+    ('_', ''),
+    ('ValveBiped_', ''),
+    ('Valvebiped_', ''),
+    ('Bip1_', 'Bip_'),
+    ('Bip01_', 'Bip_'),
+    ('Bip001_', 'Bip_'),
+    ('Bip01', ''),
+    ('Bip02_', 'Bip_'),
+    ('Character1_', ''),
+    ('HLP_', ''),
+    ('JD_', ''),
+    ('JU_', ''),
+    ('Armature|', ''),
+    ('Bone_', ''),
+    ('C_', ''),
+    ('Cf_S_', ''),
+    ('Cf_J_', ''),
+    ('G_', ''),
+    ('Joint_', ''),
+    ('Def_C_', ''),
+    ('Def_', ''),
+    ('DEF_', ''),
+    ('Chr_', ''),
+    ('Chr_', ''),
+    ('B_', ''),
+]
+# List of chars to replace if they are at the end of a bone name
+bone_name_ends_with = [
+    ('_Bone', ''),
+    ('_Bn', ''),
+    ('_Le', '_L'),
+    ('_Ri', '_R'),
+    ('_', ''),
+]
+
 bone_rename = OrderedDict()
 bone_rename['Hips'] = [
     'LowerBody',
@@ -2292,3 +2344,68 @@ bone_rename_fingers['LittleFinger3_\L'] = [
     '\LHandPinky2',
     '\LFinger42',
 ]
+
+
+# Everything below is built once at import time from the lists above
+
+def has_side(name):
+    return '\Left' in name or '\L' in name
+
+
+def to_left(name):
+    return name.replace('\Left', 'Left').replace('\left', 'left').replace('\L', 'L').replace('\l', 'l')
+
+
+def to_right(name):
+    return name.replace('\Left', 'Right').replace('\left', 'right').replace('\L', 'R').replace('\l', 'r')
+
+
+def expand_aliases(alias_table):
+    # Returns a flat list of (key, new name, old name) with both sides of \L and \Left names resolved
+    aliases = []
+    for bone_new, bones_old in alias_table.items():
+        for bone_old in bones_old:
+            if has_side(bone_new):
+                aliases.append((bone_new, to_left(bone_new), to_left(bone_old)))
+                aliases.append((bone_new, to_right(bone_new), to_right(bone_old)))
+            else:
+                aliases.append((bone_new, bone_new, bone_old))
+    return aliases
+
+
+def find_double_aliases(alias_table):
+    doubles = []
+    names = set()
+    for key, value in alias_table.items():
+        for name in value:
+            if name.lower() not in names:
+                names.add(name.lower())
+            else:
+                doubles.append((key, name))
+    return doubles
+
+
+# Rename list including the fingers and reweight list including all the rename bones
+bone_rename_all = OrderedDict((key, list(value)) for key, value in bone_rename.items())
+for key, value in bone_rename_fingers.items():
+    bone_rename_all[key] = list(value)
+
+bone_reweight_all = OrderedDict((key, list(value)) for key, value in bone_reweight.items())
+for key, value in bone_rename_all.items():
+    if key == 'Spine':
+        continue
+    if not bone_reweight_all.get(key):
+        bone_reweight_all[key] = list(value)
+    else:
+        for name in value:
+            if name not in bone_reweight_all[key]:
+                bone_reweight_all[key].append(name)
+
+bone_rename_aliases = expand_aliases(bone_rename_all)
+bone_reweight_aliases = expand_aliases(bone_reweight_all)
+bone_rename_doubles = find_double_aliases(bone_rename_all)
+bone_reweight_doubles = find_double_aliases(bone_reweight_all)
+
+bone_reweigth_to_parent_names = set(to_left(name) for name in bone_reweigth_to_parent) | set(to_right(name) for name in bone_reweigth_to_parent)
+bone_reweigth_to_parent_aliases = [name_side for name in bone_reweigth_to_parent
+                                   for name_side in ((to_left(name), to_right(name)) if has_side(name) else (name,))]
@@ -155,6 +155,7 @@ class AttachMesh(bpy.types.Operator):
         bpy.ops.object.vertex_group_assign()
 
         Common.switch('OBJECT')
+        Common.invalidate_weight_index(mesh)
 
         # Switch armature to edit mode
         Common.unselect_all()
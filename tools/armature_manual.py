@@ -1487,3 +1487,4 @@ class TestButton(bpy.types.Operator):
             i += 1
             # if i == 1000:
             #     break
+        Common.invalidate_weight_index(mesh_target)
@@ -29,7 +29,7 @@ import webbrowser
 import addon_utils
 
 from . import common as Common
-from .register import register_wrap
+from .register import register_wrap, register_wrap_bundle
 from .. import globs
 from .translations import t
 
@@ -393,7 +393,7 @@ class AtlasHelpButton(bpy.types.Operator):
 #     print('UPDATED MAT LIST')
 
 
-@register_wrap
+@register_wrap_bundle('installers')
 class InstallShotariya(bpy.types.Operator):
     bl_idname = "cats_atlas.install_shotariya_popup"
     bl_label = t('InstallShotariya.label')
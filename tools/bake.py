@@ -24,10 +24,13 @@
 
 import os
 import bpy
-import math
+import time
 import webbrowser
 
 from . import common as Common
+from . import bake_cache as BakeCache
+from . import bake_graph as BakeGraph
+from . import image_ops as ImageOps
 from .register import register_wrap
 from .translations import t
 
@@ -46,6 +49,21 @@ class BakeTutorialButton(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class GroupPresence:
+    # Which vertex groups of the baked meshes have any vertex with a non-zero weight.
+    # Read once per object from the weight index, modifiers added while baking don't change it
+
+    def __init__(self):
+        self.__presence = {}
+
+    def relevant(self, obj, groupname):
+        if obj.type != "MESH" or groupname not in obj.vertex_groups:
+            return False
+        if obj.name not in self.__presence:
+            self.__presence[obj.name] = Common.get_weight_index(obj).group_presence()
+        return bool(self.__presence[obj.name][obj.vertex_groups[groupname].index])
+
+
 def autodetect_passes(self, context, tricount, is_desktop):
     context.scene.bake_max_tris = tricount
     context.scene.bake_resolution = 2048 if is_desktop else 1024
@@ -162,6 +180,23 @@ class BakePresetQuest(bpy.types.Operator):
         return {'FINISHED'}
 
 
+@register_wrap
+class BakeClearCacheButton(bpy.types.Operator):
+    bl_idname = 'cats_bake.clear_cache'
+    bl_label = t('cats_bake.clear_cache.label')
+    bl_description = t('cats_bake.clear_cache.desc')
+    bl_options = {'INTERNAL'}
+
+    def execute(self, context):
+        if not bpy.data.is_saved:
+            self.report({'ERROR'}, "You need to save your .blend somewhere first!")
+            return {'FINISHED'}
+        BakeCache.clear_cache(BakeCache.cache_directory())
+
+        self.report({'INFO'}, t('cats_bake.clear_cache.success'))
+        return {'FINISHED'}
+
+
 @register_wrap
 class BakeButton(bpy.types.Operator):
     bl_idname = 'cats_bake.bake'
@@ -169,6 +204,9 @@ class BakeButton(bpy.types.Operator):
     bl_description = t('cats_bake.bake.desc')
     bl_options = {'REGISTER', 'UNDO', 'INTERNAL'}
 
+    # Set by perform_bake when bake results are cached
+    bake_cache = None
+
     # Only works between equal data types.
     def swap_links(self, objects, input1, input2):
         already_swapped = set()
@@ -219,6 +257,19 @@ class BakeButton(bpy.types.Operator):
                         if node.type == "BSDF_PRINCIPLED":
                             node.inputs[input_name].default_value = input_value
 
+    # Run a bake graph, with rewires swapping (and pinning) Principled BSDF inputs on the given objects
+    def run_passes(self, passes, objects):
+        def apply_rewire(rewire):
+            input1, input2, value = rewire
+            self.swap_links(objects, input1, input2)
+            if value is not None:
+                self.set_values(objects, input1, value)
+
+        def undo_rewire(rewire):
+            self.swap_links(objects, rewire[0], rewire[1])
+
+        return BakeGraph.BakeGraph(passes).run(apply_rewire, undo_rewire)
+
     # "Bake pass" function. Run a single bake to "<bake_name>.png" against all selected objects.
     def bake_pass(self, context, bake_name, bake_type, bake_pass_filter, objects, bake_size, bake_samples, bake_ray_distance, background_color, clear, bake_margin, bake_active=None, bake_multires=False,
                   normal_space='TANGENT'):
@@ -248,7 +299,7 @@ class BakeButton(bpy.types.Operator):
                 image.colorspace_settings.name = 'Non-Color'
             if bake_name == 'diffuse' or bake_name == 'metallic':  # For packing smoothness to alpha
                 image.alpha_mode = 'CHANNEL_PACKED'
-            image.pixels[:] = background_color * bake_size[0] * bake_size[1]
+            ImageOps.fill_image(image, background_color)
         image = bpy.data.images["SCRIPT_" + bake_name + ".png"]
 
         # Select only objects we're baking
@@ -284,7 +335,22 @@ class BakeButton(bpy.types.Operator):
                         node.location.x += 500
                         node.location.y -= 500
 
+        # Look the pass up in the bake cache, images baked on top of (clear=False) are keyed by their current pixels too
+        cache_key = None
+        if self.bake_cache is not None and bake_active is None and "VERTEX_COLORS" not in bake_pass_filter:
+            settings = (bake_name, bake_type, bake_pass_filter, bake_size, bake_samples, bake_ray_distance, background_color,
+                        clear, bake_margin, bake_multires, normal_space)
+            if not clear:
+                settings += (self.bake_cache.image_digest(image),)
+            cache_key = self.bake_cache.key(context, objects, settings,
+                                            lights=bool({"DIRECT", "INDIRECT"} & set(bake_pass_filter)))
+            if cache_key is not None and self.bake_cache.load(cache_key, image):
+                print("Loaded " + bake_name + " from the bake cache")
+                self.reset_value_nodes(objects, bake_name)
+                return True
+
         # Run bake.
+        start = time.time()
         context.scene.cycles.bake_type = bake_type
         context.scene.render.bake.use_pass_direct = "DIRECT" in bake_pass_filter
         context.scene.render.bake.use_pass_indirect = "INDIRECT" in bake_pass_filter
@@ -308,7 +374,13 @@ class BakeButton(bpy.types.Operator):
                             cage_extrusion=bake_ray_distance,
                             normal_space=normal_space
                             )
-        # For all materials in use, change any value node labeled "bake_<bake_name>" to 1.0, then back to 0.0.
+        if cache_key is not None:
+            self.bake_cache.store(cache_key, image, bake_name, time.time() - start)
+        self.reset_value_nodes(objects, bake_name)
+        return False
+
+    # For all materials in use, change any value node labeled "bake_<bake_name>" to 1.0, then back to 0.0.
+    def reset_value_nodes(self, objects, bake_name):
         for obj in objects:
             for slot in obj.material_slots:
                 if slot.material:
@@ -440,6 +512,9 @@ class BakeButton(bpy.types.Operator):
         create_disable_shapekeys = context.scene.bake_create_disable_shapekeys
         ignore_hidden = context.scene.bake_ignore_hidden
 
+        self.bake_cache = (BakeCache.BakeCache(BakeCache.cache_directory(), context.scene.bake_cache_size * 1024 * 1024)
+                           if context.scene.bake_use_cache else None)
+
         # Save reference to original armature
         armature = Common.get_armature()
 
@@ -613,147 +688,111 @@ class BakeButton(bpy.types.Operator):
                 if obj.type == 'MESH':
                     obj.data.uv_layers.active = obj.data.uv_layers["CATS UV"]
 
+        # Declare the bake passes, the graph orders them so shared BSDF rewires stay applied between passes
+        meshes = [obj for obj in collection.all_objects if obj.type == "MESH"]
+        bake_size = (resolution, resolution)
+        bake_margin = int(margin * resolution / 2)
+        passes = []
+        group_presence = GroupPresence()
+
+        def add_bake(bake_name, bake_type, bake_pass_filter, bake_samples, background_color, rewires=(), post=None):
+            def run():
+                cached = self.bake_pass(context, bake_name, bake_type, bake_pass_filter, meshes,
+                                        bake_size, bake_samples, 0, background_color, True, bake_margin)
+                if post is not None:
+                    post()
+                return cached
+            passes.append(BakeGraph.BakePass(bake_name, run, rewires=rewires))
+
+        # Specularity of 0 messes up 'roughness' bakes. Fix that here.
+        specular_fix = BakeGraph.rewire("Specular", "Transmission Roughness", 0.5)
+
         # Bake diffuse
         if pass_diffuse:
             # Metallic can cause issues baking diffuse, so we put it somewhere typically unused
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", "Anisotropic Rotation")
-            self.set_values([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", 0.0)
-
-            self.bake_pass(context, "diffuse", "DIFFUSE", {"COLOR"}, [obj for obj in collection.all_objects if obj.type == "MESH"],
-                           (resolution, resolution), 32, 0, [0.5, 0.5, 0.5, 1.0], True, int(margin * resolution / 2))
-
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", "Anisotropic Rotation")
+            add_bake("diffuse", "DIFFUSE", {"COLOR"}, 32, [0.5, 0.5, 0.5, 1.0],
+                     rewires=[BakeGraph.rewire("Metallic", "Anisotropic Rotation", 0.0)])
 
         # Bake roughness, invert
         if pass_smoothness:
-            # Specularity of 0 messes up 'roughness' bakes. Fix that here.
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", "Transmission Roughness")
-            self.set_values([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", 0.5)
-            self.bake_pass(context, "smoothness", "ROUGHNESS", set(), [obj for obj in collection.all_objects if obj.type == "MESH"],
-                           (resolution, resolution), 32, 0, [1.0, 1.0, 1.0, 1.0], True, int(margin * resolution / 2))
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", "Transmission Roughness")
-            image = bpy.data.images["SCRIPT_smoothness.png"]
-            pixel_buffer = list(image.pixels)
-            for idx in range(0, len(image.pixels)):
-                # invert r, g, b, but not a
-                if (idx % 4) != 3:
-                    pixel_buffer[idx] = 1.0 - pixel_buffer[idx]
-            image.pixels[:] = pixel_buffer
+            add_bake("smoothness", "ROUGHNESS", set(), 32, [1.0, 1.0, 1.0, 1.0], rewires=[specular_fix],
+                     post=lambda: ImageOps.invert_image_rgb(bpy.data.images["SCRIPT_smoothness.png"]))
 
         # bake emit
         if pass_emit:
             if not emit_indirect:
-                self.bake_pass(context, "emission", "EMIT", set(), [obj for obj in collection.all_objects if obj.type == "MESH"],
-                               (resolution, resolution), 32, 0, [0, 0, 0, 1.0], True, int(margin * resolution / 2))
+                add_bake("emission", "EMIT", set(), 32, [0, 0, 0, 1.0])
             else:
-                # Bake indirect lighting contributions: Turn off the lights and bake all diffuse passes
-                # TODO: disable scene lights?
-                original_color = bpy.data.worlds["World"].node_tree.nodes["Background"].inputs[0].default_value
-                bpy.data.worlds["World"].node_tree.nodes["Background"].inputs[0].default_value = (0,0,0,1)
-                self.bake_pass(context, "emission", "COMBINED", {"COLOR", "DIRECT", "INDIRECT", "EMIT", "AO", "DIFFUSE"}, [obj for obj in collection.all_objects if obj.type == "MESH"],
-                               (resolution, resolution), 512, 0, [0.0, 0.0, 0.0, 1.0], True, int(margin * resolution / 2))
-                if emit_exclude_eyes:
-                    def group_relevant(obj, groupname):
-                        if obj.type == "MESH" and groupname in obj.vertex_groups:
-                            idx = obj.vertex_groups[groupname].index
-                            return any( any(group.group == idx and group.weight > 0.0 for group in vert.groups)
-                                    for vert in obj.data.vertices)
-
-                    # Bake each eye on top individually
-                    for obj in collection.all_objects:
-                        if group_relevant(obj, "LeftEye"):
-                            leyemask = obj.modifiers.new(type='MASK', name="leyemask")
-                            leyemask.mode = "VERTEX_GROUP"
-                            leyemask.vertex_group = "LeftEye"
-                            leyemask.invert_vertex_group = False
-                    self.bake_pass(context, "emission", "EMIT", set(), [obj for obj in collection.all_objects if group_relevant(obj, "LeftEye")],
-                               (resolution, resolution), 32, 0, [0, 0, 0, 1.0], False, int(margin * resolution / 2))
-                    for obj in collection.all_objects:
-                        if "leyemask" in obj.modifiers:
-                            obj.modifiers.remove(obj.modifiers["leyemask"])
-
-                    for obj in collection.all_objects:
-                        if group_relevant(obj, "RightEye"):
-                            reyemask = obj.modifiers.new(type='MASK', name="reyemask")
-                            reyemask.mode = "VERTEX_GROUP"
-                            reyemask.vertex_group = "RightEye"
-                            reyemask.invert_vertex_group = False
-                    self.bake_pass(context, "emission", "EMIT", set(), [obj for obj in collection.all_objects if group_relevant(obj, "RightEye")],
-                               (resolution, resolution), 32, 0, [0, 0, 0, 1.0], False, int(margin * resolution / 2))
-                    for obj in collection.all_objects:
-                        if "reyemask" in obj.modifiers:
-                            obj.modifiers.remove(obj.modifiers["reyemask"])
-
-                bpy.data.worlds["World"].node_tree.nodes["Background"].inputs[0].default_value = original_color
-
+                def bake_emission_indirect():
+                    # Bake indirect lighting contributions: Turn off the lights and bake all diffuse passes
+                    # TODO: disable scene lights?
+                    original_color = bpy.data.worlds["World"].node_tree.nodes["Background"].inputs[0].default_value
+                    bpy.data.worlds["World"].node_tree.nodes["Background"].inputs[0].default_value = (0,0,0,1)
+                    cached = self.bake_pass(context, "emission", "COMBINED", {"COLOR", "DIRECT", "INDIRECT", "EMIT", "AO", "DIFFUSE"}, meshes,
+                                            bake_size, 512, 0, [0.0, 0.0, 0.0, 1.0], True, bake_margin)
+                    if emit_exclude_eyes:
+                        # Bake each eye on top individually
+                        for obj in collection.all_objects:
+                            if group_presence.relevant(obj, "LeftEye"):
+                                leyemask = obj.modifiers.new(type='MASK', name="leyemask")
+                                leyemask.mode = "VERTEX_GROUP"
+                                leyemask.vertex_group = "LeftEye"
+                                leyemask.invert_vertex_group = False
+                        cached &= self.bake_pass(context, "emission", "EMIT", set(), [obj for obj in collection.all_objects if group_presence.relevant(obj, "LeftEye")],
+                                                 bake_size, 32, 0, [0, 0, 0, 1.0], False, bake_margin)
+                        for obj in collection.all_objects:
+                            if "leyemask" in obj.modifiers:
+                                obj.modifiers.remove(obj.modifiers["leyemask"])
+
+                        for obj in collection.all_objects:
+                            if group_presence.relevant(obj, "RightEye"):
+                                reyemask = obj.modifiers.new(type='MASK', name="reyemask")
+                                reyemask.mode = "VERTEX_GROUP"
+                                reyemask.vertex_group = "RightEye"
+                                reyemask.invert_vertex_group = False
+                        cached &= self.bake_pass(context, "emission", "EMIT", set(), [obj for obj in collection.all_objects if group_presence.relevant(obj, "RightEye")],
+                                                 bake_size, 32, 0, [0, 0, 0, 1.0], False, bake_margin)
+                        for obj in collection.all_objects:
+                            if "reyemask" in obj.modifiers:
+                                obj.modifiers.remove(obj.modifiers["reyemask"])
+
+                    bpy.data.worlds["World"].node_tree.nodes["Background"].inputs[0].default_value = original_color
+                    return cached
+
+                passes.append(BakeGraph.BakePass("emission", bake_emission_indirect))
 
         # advanced: bake alpha from bsdf output
         if pass_alpha:
             # when baking alpha as roughness, the -real- alpha needs to be set to 1 to avoid issues
             # this will clobber whatever's in Anisotropic Rotation!
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Alpha", "Roughness")
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Alpha", "Anisotropic Rotation")
-            self.set_values([obj for obj in collection.all_objects if obj.type == "MESH"], "Alpha", 1.0)
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", "Anisotropic")
-            self.set_values([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", 0)
-            # Specularity of 0 messes up 'roughness' bakes. Fix that here.
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", "Transmission Roughness")
-            self.set_values([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", 0.5)
-
-
-            # Run the bake pass (bake roughness)
-            self.bake_pass(context, "alpha", "ROUGHNESS", set(), [obj for obj in collection.all_objects if obj.type == "MESH"],
-                           (resolution, resolution), 32, 0, [1, 1, 1, 1.0], True, int(margin * resolution / 2))
-
-            # Revert the changes (re-flip)
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", "Anisotropic")
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Alpha", "Anisotropic Rotation")
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Alpha", "Roughness")
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", "Transmission Roughness")
-
+            add_bake("alpha", "ROUGHNESS", set(), 32, [1, 1, 1, 1.0],
+                     rewires=[specular_fix,
+                              BakeGraph.rewire("Alpha", "Roughness"),
+                              BakeGraph.rewire("Alpha", "Anisotropic Rotation", 1.0),
+                              BakeGraph.rewire("Metallic", "Anisotropic", 0)])
 
         # advanced: bake metallic from last bsdf output
         if pass_metallic:
-            # Find all Principled BSDF nodes. Flip Roughness and Metallic (default_value and connection)
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", "Roughness")
-            # Specularity of 0 messes up 'roughness' bakes. Fix that here.
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", "Transmission Roughness")
-            self.set_values([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", 0.5)
-
-            # Run the bake pass
-            self.bake_pass(context, "metallic", "ROUGHNESS", set(), [obj for obj in collection.all_objects if obj.type == "MESH"],
-                           (resolution, resolution), 32, 0, [0, 0, 0, 1.0], True, int(margin * resolution / 2))
-
-            # Revert the changes (re-flip)
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", "Roughness")
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Specular", "Transmission Roughness")
+            # Flip Roughness and Metallic (default_value and connection)
+            add_bake("metallic", "ROUGHNESS", set(), 32, [0, 0, 0, 1.0],
+                     rewires=[specular_fix, BakeGraph.rewire("Metallic", "Roughness")])
 
         # Pack to diffuse alpha (if selected)
         if pass_diffuse and ((diffuse_alpha_pack == "SMOOTHNESS" and pass_smoothness) or
                              (diffuse_alpha_pack == "TRANSPARENCY" and pass_alpha)):
-            print("Packing to diffuse alpha")
-            diffuse_image = bpy.data.images["SCRIPT_diffuse.png"]
-            alpha_image = None
-            if diffuse_alpha_pack == "SMOOTHNESS":
-                alpha_image = bpy.data.images["SCRIPT_smoothness.png"]
-            elif diffuse_alpha_pack == "TRANSPARENCY":
-                alpha_image = bpy.data.images["SCRIPT_alpha.png"]
-            pixel_buffer = list(diffuse_image.pixels)
-            alpha_buffer = alpha_image.pixels[:]
-            for idx in range(3, len(pixel_buffer), 4):
-                pixel_buffer[idx] = alpha_buffer[idx - 3]
-            diffuse_image.pixels[:] = pixel_buffer
+            alpha_name = "smoothness" if diffuse_alpha_pack == "SMOOTHNESS" else "alpha"
+
+            def pack_diffuse_alpha():
+                print("Packing to diffuse alpha")
+                ImageOps.pack_image_alpha(bpy.data.images["SCRIPT_diffuse.png"], bpy.data.images["SCRIPT_" + alpha_name + ".png"])
+            passes.append(BakeGraph.BakePass("diffuse_alpha_pack", pack_diffuse_alpha, inputs=("diffuse", alpha_name), rewires=None))
 
         # Pack to metallic alpha (if selected)
         if pass_metallic and (metallic_alpha_pack == "SMOOTHNESS" and pass_smoothness):
-            print("Packing to metallic alpha")
-            metallic_image = bpy.data.images["SCRIPT_metallic.png"]
-            alpha_image = bpy.data.images["SCRIPT_smoothness.png"]
-            pixel_buffer = list(metallic_image.pixels)
-            alpha_buffer = alpha_image.pixels[:]
-            for idx in range(3, len(pixel_buffer), 4):
-                pixel_buffer[idx] = alpha_buffer[idx - 3]
-            metallic_image.pixels[:] = pixel_buffer
+            def pack_metallic_alpha():
+                print("Packing to metallic alpha")
+                ImageOps.pack_image_alpha(bpy.data.images["SCRIPT_metallic.png"], bpy.data.images["SCRIPT_smoothness.png"])
+            passes.append(BakeGraph.BakePass("metallic_alpha_pack", pack_metallic_alpha, inputs=("metallic", "smoothness"), rewires=None))
 
         # TODO: advanced: bake detail mask from diffuse node setup
 
@@ -761,53 +800,51 @@ class BakeButton(bpy.types.Operator):
 
         # Bake AO
         if pass_ao:
-            if illuminate_eyes:
-                # Add modifiers that prevent LeftEye and RightEye being baked
-                for obj in collection.all_objects:
-                    if obj.type == "MESH" and "LeftEye" in obj.vertex_groups:
-                        leyemask = obj.modifiers.new(type='MASK', name="leyemask")
-                        leyemask.mode = "VERTEX_GROUP"
-                        leyemask.vertex_group = "LeftEye"
-                        leyemask.invert_vertex_group = True
-                    if obj.type == "MESH" and "RightEye" in obj.vertex_groups:
-                        reyemask = obj.modifiers.new(type='MASK', name="reyemask")
-                        reyemask.mode = "VERTEX_GROUP"
-                        reyemask.vertex_group = "RightEye"
-                        reyemask.invert_vertex_group = True
-            self.bake_pass(context, "ao", "AO", {"AO"}, [obj for obj in collection.all_objects if obj.type == "MESH"],
-                           (resolution, resolution), 512, 0, [1.0, 1.0, 1.0, 1.0], True, int(margin * resolution / 2))
-            if illuminate_eyes:
-                if "leyemask" in obj.modifiers:
-                    obj.modifiers.remove(leyemask)
-                if "reyemask" in obj.modifiers:
-                    obj.modifiers.remove(reyemask)
+            def bake_ao():
+                if illuminate_eyes:
+                    # Add modifiers that prevent LeftEye and RightEye being baked
+                    # An inverted mask of an unweighted group keeps everything, so checking the name is enough here
+                    for obj in meshes:
+                        if "LeftEye" in obj.vertex_groups:
+                            leyemask = obj.modifiers.new(type='MASK', name="leyemask")
+                            leyemask.mode = "VERTEX_GROUP"
+                            leyemask.vertex_group = "LeftEye"
+                            leyemask.invert_vertex_group = True
+                        if "RightEye" in obj.vertex_groups:
+                            reyemask = obj.modifiers.new(type='MASK', name="reyemask")
+                            reyemask.mode = "VERTEX_GROUP"
+                            reyemask.vertex_group = "RightEye"
+                            reyemask.invert_vertex_group = True
+                cached = self.bake_pass(context, "ao", "AO", {"AO"}, meshes,
+                                        bake_size, 512, 0, [1.0, 1.0, 1.0, 1.0], True, bake_margin)
+                if illuminate_eyes:
+                    for obj in meshes:
+                        for name in ("leyemask", "reyemask"):
+                            if name in obj.modifiers:
+                                obj.modifiers.remove(obj.modifiers[name])
+                return cached
+            passes.append(BakeGraph.BakePass("ao", bake_ao))
 
         # Blend diffuse and AO to create Quest Diffuse (if selected)
         if pass_diffuse and pass_ao and pass_questdiffuse:
-            if "SCRIPT_questdiffuse.png" in bpy.data.images:
+            def blend_questdiffuse():
+                if "SCRIPT_questdiffuse.png" in bpy.data.images:
+                    image = bpy.data.images["SCRIPT_questdiffuse.png"]
+                    image.user_clear()
+                    bpy.data.images.remove(image)
+                bpy.ops.image.new(name="SCRIPT_questdiffuse.png", width=resolution, height=resolution,
+                                  generated_type="BLANK", alpha=False)
                 image = bpy.data.images["SCRIPT_questdiffuse.png"]
-                image.user_clear()
-                bpy.data.images.remove(image)
-            bpy.ops.image.new(name="SCRIPT_questdiffuse.png", width=resolution, height=resolution,
-                              generated_type="BLANK", alpha=False)
-            image = bpy.data.images["SCRIPT_questdiffuse.png"]
-            image.filepath = bpy.path.abspath("//CATS Bake/" + "SCRIPT_questdiffuse.png")
-            diffuse_image = bpy.data.images["SCRIPT_diffuse.png"]
-            ao_image = bpy.data.images["SCRIPT_ao.png"]
-            image.generated_width = resolution
-            image.generated_height = resolution
-            image.scale(resolution, resolution)
-            pixel_buffer = list(image.pixels)
-            diffuse_buffer = diffuse_image.pixels[:]
-            ao_buffer = ao_image.pixels[:]
-            for idx in range(0, len(image.pixels)):
-                if (idx % 4 != 3):
-                    # Map range: set the black point up to 1-opacity
-                    pixel_buffer[idx] = diffuse_buffer[idx] * ((1.0 - questdiffuse_opacity) + (questdiffuse_opacity * ao_buffer[idx]))
-                else:
-                    # Alpha is unused on quest, set to 1 to make sure unity doesn't keep it
-                    pixel_buffer[idx] = 1.0
-            image.pixels[:] = pixel_buffer
+                image.filepath = bpy.path.abspath("//CATS Bake/" + "SCRIPT_questdiffuse.png")
+                diffuse_image = bpy.data.images["SCRIPT_diffuse.png"]
+                ao_image = bpy.data.images["SCRIPT_ao.png"]
+                image.generated_width = resolution
+                image.generated_height = resolution
+                image.scale(resolution, resolution)
+                ImageOps.multiply_image_ao(image, diffuse_image, ao_image, questdiffuse_opacity)
+            passes.append(BakeGraph.BakePass("questdiffuse", blend_questdiffuse, inputs=("diffuse", "ao"), rewires=None))
+
+        self.run_passes(passes, meshes)
 
         # Create 'disable' shape keys, each of which shrinks their relevant mesh down to a single point
         if create_disable_shapekeys:
@@ -1072,11 +1109,13 @@ class BakeButton(bpy.types.Operator):
                     context.view_layer.objects.active = obj
                     bpy.ops.mesh.vertex_color_add()
 
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", "Anisotropic Rotation")
-            self.set_values([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", 0.0)
-            self.bake_pass(context, "vertex_diffuse", "DIFFUSE", {"COLOR", "VERTEX_COLORS"}, [obj for obj in collection.all_objects if obj.type == "MESH"],
-                           (1, 1), 32, 0, [0.5, 0.5, 0.5, 1.0], True, int(margin * resolution / 2))
-            self.swap_links([obj for obj in collection.all_objects if obj.type == "MESH"], "Metallic", "Anisotropic Rotation")
+            meshes = [obj for obj in collection.all_objects if obj.type == "MESH"]
+
+            def bake_vertex_diffuse():
+                self.bake_pass(context, "vertex_diffuse", "DIFFUSE", {"COLOR", "VERTEX_COLORS"}, meshes,
+                               (1, 1), 32, 0, [0.5, 0.5, 0.5, 1.0], True, int(margin * resolution / 2))
+            self.run_passes([BakeGraph.BakePass("vertex_diffuse", bake_vertex_diffuse,
+                                                rewires=[BakeGraph.rewire("Metallic", "Anisotropic Rotation", 0.0)])], meshes)
 
             # TODO: If we're not baking anything else in, remove all UV maps entirely
 
@@ -1130,17 +1169,11 @@ class BakeButton(bpy.types.Operator):
                     bpy.ops.mesh.select_mode(type="VERT")
                     bpy.ops.mesh.select_all(action = 'DESELECT')
                     bpy.ops.object.mode_set(mode = 'OBJECT')
-                    for key_block in mesh.data.shape_keys.key_blocks[1:]:
-                        basis = mesh.data.shape_keys.key_blocks[0]
-
-                        for idx, vert in enumerate(key_block.data):
-                            if (math.sqrt(math.pow(basis.data[idx].co[0] - vert.co[0], 2.0) +
-                            math.pow(basis.data[idx].co[1] - vert.co[1], 2.0) +
-                            math.pow(basis.data[idx].co[2] - vert.co[2], 2.0)) > 0.0001):
-                                mesh.data.vertices[idx].select = True
+                    moving = Common.get_shape_key_motion(mesh).moving_vertices()
+                    mesh.data.vertices.foreach_set('select', moving)
 
-                    if not all(v.select for v in mesh.data.vertices):
-                        if any(v.select for v in mesh.data.vertices):
+                    if not moving.all():
+                        if moving.any():
                             # Some affected, separate
                             bpy.ops.object.mode_set(mode = 'EDIT')
                             bpy.ops.mesh.select_more()
@@ -1195,6 +1228,9 @@ class BakeButton(bpy.types.Operator):
                     for line in infile:
                         outfile.write(line)
 
+        if self.bake_cache is not None:
+            print(self.bake_cache.summary())
+
         # Delete our duplicate scene
         bpy.ops.scene.delete()
 
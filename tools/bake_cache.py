@@ -0,0 +1,284 @@
+# MIT License
+
+# Copyright (c) 2020 Feilen
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Content addressed cache for bake passes. A pass is keyed by hashes of the evaluated meshes it bakes (vertex, loop,
+# UV and color buffers), the node trees of their materials, the images those use and the bake settings. Results are
+# stored as <key>.png next to a manifest.json, a pass with a known key loads the PNG instead of rendering.
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+
+import bpy
+
+from . import image_ops as ImageOps
+
+MANIFEST_VERSION = 1
+
+# Node properties which only change how the node is drawn
+ui_properties = {'name', 'label', 'location', 'width', 'width_hidden', 'height', 'dimensions', 'select', 'hide',
+                 'show_options', 'show_preview', 'show_texture', 'use_custom_color', 'color', 'parent'}
+
+# Structs pointed to by nodes which only hold settings, they get hashed with all their properties and collections
+settings_structs = {'ColorRamp', 'ColorRampElement', 'CurveMapping', 'CurveMap', 'CurveMapPoint', 'ImageUser',
+                    'TexMapping', 'ColorMapping'}
+
+
+class Uncacheable(Exception):
+    # A node points to something the key can't cover, e.g. a script text
+    pass
+
+
+def cache_directory():
+    return bpy.path.abspath("//CATS Bake/cache/")
+
+
+def clear_cache(directory):
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+
+
+def update_array(hasher, collection, attr, dtype, width):
+    data = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(attr, data)
+    hasher.update(data.tobytes())
+
+
+def update_value(hasher, value):
+    hasher.update(repr(value).encode('utf-8'))
+
+
+def plain_value(value):
+    # Turn bpy arrays and enum flag sets into hashable values with a stable repr
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    if isinstance(value, set):
+        return tuple(sorted(value))
+    try:
+        return tuple(plain_value(item) for item in value)
+    except TypeError:
+        return repr(value)
+
+
+class BakeCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self.hash_seconds = 0.0
+        self.__image_digests = {}
+
+        self.entries = {}
+        try:
+            with open(os.path.join(directory, 'manifest.json'), 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.entries = {key: entry for key, entry in manifest['entries'].items()
+                                if os.path.isfile(os.path.join(directory, key + '.png'))}
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def key(self, context, objects, settings, lights=False):
+        # lights: hash the scene lights too, for passes baking direct or indirect lighting
+        # Returns None if the result can't be cached
+        start = time.time()
+        try:
+            return self.__key(context, objects, settings, lights)
+        except Uncacheable as e:
+            print('Bake cache: not caching, a node uses a ' + str(e))
+            return None
+        finally:
+            self.hash_seconds += time.time() - start
+
+    def __key(self, context, objects, settings, lights):
+        hasher = hashlib.sha1()
+        update_value(hasher, (MANIFEST_VERSION, bpy.app.version, plain_value(settings)))
+        for digest in sorted(self.object_digest(context, obj) for obj in objects):
+            hasher.update(digest)
+
+        materials = {slot.material.name: slot.material for obj in objects for slot in obj.material_slots if slot.material}
+        for name in sorted(materials):
+            update_value(hasher, name)
+            if materials[name].node_tree:
+                self.update_tree(hasher, materials[name].node_tree)
+        if context.scene.world and context.scene.world.node_tree:
+            self.update_tree(hasher, context.scene.world.node_tree)
+        if lights:
+            for obj in sorted((obj for obj in context.scene.objects if obj.type == 'LIGHT'), key=lambda obj: obj.name):
+                update_value(hasher, (obj.name, obj.hide_render, obj.data.type, plain_value(obj.data.color), obj.data.energy,
+                                      plain_value(obj.matrix_world)))
+        return hasher.hexdigest()
+
+    def object_digest(self, context, obj):
+        # Hash the evaluated mesh, so modifiers, shape keys and poses are covered
+        hasher = hashlib.sha1()
+        update_value(hasher, (plain_value(obj.matrix_world), [(modifier.type, modifier.show_render) for modifier in obj.modifiers],
+                              [slot.material.name if slot.material else None for slot in obj.material_slots]))
+        evaluated = obj.evaluated_get(context.evaluated_depsgraph_get())
+        mesh = evaluated.to_mesh()
+        try:
+            update_array(hasher, mesh.vertices, 'co', np.float32, 3)
+            update_array(hasher, mesh.loops, 'vertex_index', np.int32, 1)
+            update_array(hasher, mesh.polygons, 'loop_total', np.int32, 1)
+            update_array(hasher, mesh.polygons, 'material_index', np.int32, 1)
+            update_array(hasher, mesh.polygons, 'use_smooth', np.bool_, 1)
+            if hasattr(mesh, 'calc_normals_split'):  # Custom normals, split normals are always there since 4.1
+                mesh.calc_normals_split()
+            update_array(hasher, mesh.loops, 'normal', np.float32, 3)
+            for layer in mesh.uv_layers:
+                update_value(hasher, (layer.name, layer.active, layer.active_render))
+                update_array(hasher, layer.data, 'uv', np.float32, 2)
+            for layer in mesh.vertex_colors:
+                update_value(hasher, (layer.name, layer.active))
+                update_array(hasher, layer.data, 'color', np.float32, 4)
+        finally:
+            evaluated.to_mesh_clear()
+        return hasher.digest()
+
+    def update_tree(self, hasher, tree):
+        for node in sorted(tree.nodes, key=lambda node: node.name):
+            if node.name == 'bake':  # The bake target
+                continue
+            update_value(hasher, (node.name, node.bl_idname, node.mute))
+            self.update_properties(hasher, node)
+            for socket in node.inputs:
+                if hasattr(socket, 'default_value'):
+                    update_value(hasher, (socket.identifier, plain_value(socket.default_value)))
+            # Value and RGB nodes keep their value on the output socket, linked or not
+            for socket in node.outputs:
+                if hasattr(socket, 'default_value'):
+                    update_value(hasher, ('output', socket.identifier, plain_value(socket.default_value)))
+        for link in sorted(((link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier)
+                            for link in tree.links if link.to_node.name != 'bake'), key=repr):
+            update_value(hasher, link)
+
+    def update_properties(self, hasher, struct):
+        # The sockets and links of nodes are hashed by update_tree, only settings structs get their collections hashed
+        use_collections = struct.bl_rna.identifier in settings_structs
+        for prop in struct.bl_rna.properties:
+            if prop.identifier in ui_properties or prop.identifier == 'rna_type':
+                continue
+            value = getattr(struct, prop.identifier, None)
+            if prop.type == 'POINTER':
+                update_value(hasher, prop.identifier)
+                self.update_pointer(hasher, value)
+            elif prop.type == 'COLLECTION':
+                if use_collections:
+                    update_value(hasher, (prop.identifier, len(value)))
+                    for item in value:
+                        self.update_pointer(hasher, item)
+            elif not prop.is_readonly:
+                update_value(hasher, (prop.identifier, plain_value(value)))
+
+    def update_pointer(self, hasher, value):
+        # Color ramps, curves, image users and texture coordinate objects are part of the key, anything else is uncacheable
+        if value is None:
+            update_value(hasher, None)
+        elif isinstance(value, bpy.types.Image):
+            hasher.update(self.image_digest(value))
+        elif isinstance(value, bpy.types.NodeTree):
+            self.update_tree(hasher, value)
+        elif isinstance(value, bpy.types.Object):
+            update_value(hasher, (value.name, plain_value(value.matrix_world)))
+        elif value.bl_rna.identifier in settings_structs:
+            self.update_properties(hasher, value)
+        else:
+            raise Uncacheable(value.bl_rna.identifier)
+
+    def image_digest(self, image):
+        settings = (image.name, image.source, image.colorspace_settings.name, image.alpha_mode, tuple(image.size))
+        path = bpy.path.abspath(image.filepath) if image.filepath else ''
+        if image.source == 'FILE' and image.packed_file is None and not image.is_dirty and os.path.isfile(path):
+            # Unchanged file on disk, only hash it again if the file changed
+            stat = os.stat(path)
+            file_key = (path, stat.st_mtime, stat.st_size)
+            if file_key not in self.__image_digests:
+                hasher = hashlib.sha1()
+                with open(path, 'rb') as file:
+                    for block in iter(lambda: file.read(1 << 20), b''):
+                        hasher.update(block)
+                self.__image_digests[file_key] = hasher.digest()
+            digest = self.__image_digests[file_key]
+        elif image.source == 'FILE' and image.packed_file is not None and not image.is_dirty:
+            digest = hashlib.sha1(image.packed_file.data).digest()
+        else:
+            digest = hashlib.sha1(ImageOps.read_pixels(image).tobytes()).digest()
+        return hashlib.sha1(repr(settings).encode('utf-8') + digest).digest()
+
+    def load(self, key, image):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False
+        try:
+            pixels, width, height = ImageOps.read_png(os.path.join(self.directory, key + '.png'))
+        except (OSError, ValueError):
+            # Unreadable or corrupt, e.g. after a crash while writing it
+            del self.entries[key]
+            path = os.path.join(self.directory, key + '.png')
+            if os.path.isfile(path):
+                os.remove(path)
+            self.save()
+            self.misses += 1
+            return False
+        if (width, height) != tuple(image.size):
+            self.misses += 1
+            return False
+        ImageOps.write_pixels(image, pixels)
+        entry['last_used'] = time.time()
+        self.hits += 1
+        self.seconds_saved += entry['seconds']
+        self.save()
+        return True
+
+    def store(self, key, image, name, seconds):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, key + '.png')
+        ImageOps.write_png(path, ImageOps.read_pixels(image), image.size[0], image.size[1])
+        self.entries[key] = {'pass': name, 'seconds': seconds, 'bytes': os.path.getsize(path), 'last_used': time.time()}
+        self.evict()
+        self.save()
+
+    def evict(self):
+        # Drop the least recently used results until the cache fits in max_bytes
+        total = sum(entry['bytes'] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda key: self.entries[key]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= self.entries.pop(key)['bytes']
+            path = os.path.join(self.directory, key + '.png')
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def save(self):
+        with open(os.path.join(self.directory, 'manifest.json'), 'w', encoding='utf-8') as file:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, file, indent=1, sort_keys=True)
+
+    def summary(self):
+        return ('Bake cache: ' + str(self.hits) + ' hits, ' + str(self.misses) + ' misses, '
+                + str(round(self.seconds_saved, 2)) + ' s saved, ' + str(round(self.hash_seconds, 2)) + ' s hashing')
@@ -0,0 +1,143 @@
+# MIT License
+
+# Copyright (c) 2020 Feilen
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Declarative bake passes. Each pass names the images it reads and writes and the Principled BSDF rewires it needs
+# while baking, the graph then picks an order which keeps shared rewires applied between passes instead of undoing
+# and redoing them. Nothing in here touches Blender, the node tree changes are done by the callbacks given to run().
+# Every pass runs, skipping work is left to the bake cache: a pass whose result is cached loads it in its run callback,
+# after its rewires are applied, since the cache key covers the rewired node trees. Post-processing passes always run,
+# they are cheap and work on their input images in place.
+
+import time
+
+
+def rewire(input1, input2, value=None):
+    # Swap input1 and input2 (default value and link), then optionally pin input1 to value.
+    # Undoing it swaps back, input2 keeps the pinned value.
+    return input1, input2, value
+
+
+class BakePass:
+    def __init__(self, name, run, inputs=(), outputs=None, rewires=()):
+        # run returns True when it loaded its result from the bake cache instead of rendering.
+        # rewires=None marks a pass which doesn't render (image post-processing), it runs with any rewires applied
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = (name,) if outputs is None else tuple(outputs)
+        self.rewires = None if rewires is None else tuple(rewires)
+
+
+def shared_rewires(state, rewires):
+    shared = 0
+    for current, wanted in zip(state, rewires):
+        if current != wanted:
+            break
+        shared += 1
+    return shared
+
+
+def mutation_count(state, rewires):
+    # Node tree walks needed to go from the applied rewires in state to rewires: undo down to the shared prefix, then apply
+    return len(state) + len(rewires) - 2 * shared_rewires(state, rewires)
+
+
+class BakeGraph:
+    def __init__(self, passes):
+        self.passes = list(passes)
+
+        producers = {}
+        for bake_pass in self.passes:
+            for output in bake_pass.outputs:
+                if output in producers:
+                    raise ValueError('Bake output ' + output + ' is written by ' + producers[output].name + ' and ' + bake_pass.name)
+                producers[output] = bake_pass
+        self.dependencies = {}
+        for bake_pass in self.passes:
+            for name in bake_pass.inputs:
+                if name not in producers:
+                    raise ValueError('Bake pass ' + bake_pass.name + ' needs ' + name + ', which no pass writes')
+            self.dependencies[bake_pass.name] = {producers[name].name for name in bake_pass.inputs}
+
+    def schedule(self):
+        # Dependency respecting order with the fewest rewire mutations, including undoing the last rewires.
+        # The applied rewires are always those of the last rendering pass, so memoize on (passes done, rewires).
+        # Ties keep the declaration order.
+        passes = self.passes
+        index = {bake_pass.name: idx for idx, bake_pass in enumerate(passes)}
+        required = [sum(1 << index[name] for name in self.dependencies[bake_pass.name]) for bake_pass in passes]
+        everything = (1 << len(passes)) - 1
+        memo = {}
+
+        def best(done, state):
+            if done == everything:
+                return len(state), ()
+            if (done, state) in memo:
+                return memo[(done, state)]
+            result = None
+            for idx, bake_pass in enumerate(passes):
+                if done & (1 << idx) or required[idx] & ~done:
+                    continue
+                if bake_pass.rewires is None:
+                    cost, next_state = 0, state
+                else:
+                    cost, next_state = mutation_count(state, bake_pass.rewires), bake_pass.rewires
+                rest_cost, rest = best(done | (1 << idx), next_state)
+                if result is None or cost + rest_cost < result[0]:
+                    result = (cost + rest_cost, (idx,) + rest)
+            if result is None:
+                raise ValueError('Bake passes depend on each other: ' + ', '.join(
+                    bake_pass.name for idx, bake_pass in enumerate(passes) if not done & (1 << idx)))
+            memo[(done, state)] = result
+            return result
+
+        return [passes[idx] for idx in best(0, ())[1]]
+
+    def run(self, apply_rewire, undo_rewire):
+        # Run all passes in schedule order. Returns (name, seconds, cached) per pass
+        timings = []
+        state = ()
+        try:
+            for bake_pass in self.schedule():
+                start = time.time()
+                if bake_pass.rewires is not None:
+                    state = self.__transition(state, bake_pass.rewires, apply_rewire, undo_rewire)
+                cached = bool(bake_pass.run())
+                duration = time.time() - start
+                print('Bake pass ' + bake_pass.name + ': ' + str(round(duration, 2)) + ' s' + (' (cached)' if cached else ''))
+                timings.append((bake_pass.name, duration, cached))
+        finally:
+            self.__transition(state, (), apply_rewire, undo_rewire)
+
+        print('Baked ' + str(len(timings)) + ' passes (' + str(sum(timing[2] for timing in timings)) + ' cached) in '
+              + str(round(sum(timing[1] for timing in timings), 2)) + ' s')
+        return timings
+
+    @staticmethod
+    def __transition(state, rewires, apply_rewire, undo_rewire):
+        shared = shared_rewires(state, rewires)
+        for current in reversed(state[shared:]):
+            undo_rewire(current)
+        for wanted in rewires[shared:]:
+            apply_rewire(wanted)
+        return rewires
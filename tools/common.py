@@ -29,10 +29,12 @@ import bpy
 import time
 import bmesh
 import platform
+import numpy as np
 
 from math import degrees
 from mathutils import Vector
 from datetime import datetime
+from bpy.app.handlers import persistent
 from html.parser import HTMLParser
 from html.entities import name2codepoint
 
@@ -301,6 +303,8 @@ def set_default_stage():
 
 
 def apply_modifier(mod, as_shapekey=False):
+    invalidate_weight_index(mod.id_data)
+
     if bpy.app.version < (2, 90):
         bpy.ops.object.modifier_apply(apply_as='SHAPE' if as_shapekey else 'DATA', modifier=mod.name)
         return
@@ -337,25 +341,383 @@ def get_bone_angle(p1, p2):
     return ret
 
 
+class WeightIndex:
+    # CSR style table of the deform weights of one mesh object:
+    # the groups of vertex i are group_indices[indptr[i]:indptr[i + 1]] with the matching weights.
+    # Blender has no bulk accessor for vertex.groups, so the mesh is walked exactly once here
+    # and every following query is answered from the arrays.
+
+    def __init__(self, mesh):
+        verts = mesh.data.vertices
+        self.signature = _weight_index_signature(mesh)
+        self.vertex_count = len(verts)
+        self.group_count = len(mesh.vertex_groups)
+
+        counts = np.empty(self.vertex_count, dtype=np.int32)
+        pairs = []
+        for i, v in enumerate(verts):
+            groups = v.groups
+            counts[i] = len(groups)
+            pairs.extend((g.group, g.weight) for g in groups)
+
+        self.indptr = np.zeros(self.vertex_count + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.indptr[1:])
+
+        pairs = np.array(pairs, dtype=np.float64).reshape(-1, 2)
+        self.group_indices = pairs[:, 0].astype(np.int32)
+        self.weights = pairs[:, 1].astype(np.float32)
+        self.vertex_indices = np.repeat(np.arange(self.vertex_count, dtype=np.int32), counts)
+
+        self.__coords = None
+
+    def used_groups(self, threshold=0.0):
+        # Indices of all groups which have at least one vertex weighted above the threshold
+        return set(np.unique(self.group_indices[self.weights > threshold]).tolist())
+
+    def group_presence(self, threshold=0.0):
+        # Bitmap over the group indices, True for the groups with at least one vertex weighted above the threshold
+        presence = np.zeros(self.group_count, dtype=bool)
+        presence[self.group_indices[self.weights > threshold]] = True
+        return presence
+
+    def unused_groups(self, threshold=0.0):
+        return set(range(self.group_count)) - self.used_groups(threshold=threshold)
+
+    def has_vertices(self, group_index):
+        # True if any vertex is assigned to the group, regardless of its weight
+        return bool(np.any(self.group_indices == group_index))
+
+    def vertices_in_group(self, group_index, threshold=0.0):
+        mask = (self.group_indices == group_index) & (self.weights > threshold)
+        return self.vertex_indices[mask]
+
+    def zero_weight_vertices(self, threshold=0.0):
+        # Returns {group_index: vertex indices} of all assignments with a weight at or below the threshold
+        mask = self.weights <= threshold
+        groups = self.group_indices[mask]
+        verts = self.vertex_indices[mask]
+        return {int(group): verts[groups == group].tolist() for group in np.unique(groups)}
+
+    def coords(self, mesh):
+        # The mesh is passed in instead of kept, references to Blender data become invalid after an undo
+        if self.__coords is None:
+            self.__coords = np.empty(self.vertex_count * 3, dtype=np.float32)
+            mesh.data.vertices.foreach_get('co', self.__coords)
+            self.__coords.shape = (self.vertex_count, 3)
+        return self.__coords
+
+    def group_centroid(self, mesh, group_index):
+        verts = self.vertices_in_group(group_index)
+        if len(verts) == 0:
+            return False
+        return Vector(self.coords(mesh)[verts].mean(axis=0, dtype=np.float64).tolist())
+
+
+_weight_indices = {}  # Object pointer: WeightIndex
+
+
+def _weight_index_signature(mesh):
+    # Cheap check whether the cached table still belongs to this mesh.
+    # Weight changes can't be detected this way, so functions changing weights call invalidate_weight_index
+    return mesh.data.as_pointer(), len(mesh.data.vertices), tuple(vg.name for vg in mesh.vertex_groups)
+
+
+def get_weight_index(mesh):
+    if mesh.mode == 'EDIT':
+        mesh.update_from_editmode()
+
+    index = _weight_indices.get(mesh.as_pointer())
+    if index is None or index.signature != _weight_index_signature(mesh):
+        index = WeightIndex(mesh)
+        _weight_indices[mesh.as_pointer()] = index
+    return index
+
+
+def invalidate_weight_index(mesh=None):
+    if mesh is None:
+        _weight_indices.clear()
+        return
+    _weight_indices.pop(mesh.as_pointer(), None)
+
+
+@persistent
+def weight_index_update_handler(scene, depsgraph=None):
+    # Drops the weight tables and shape key motions of meshes which were edited outside of Cats, eg. by weight painting
+    if not _weight_indices and not _shape_key_motions:
+        return
+
+    if depsgraph is None:  # 2.79
+        for obj in scene.objects:
+            if obj.is_updated_data:
+                _weight_indices.pop(obj.as_pointer(), None)
+                _shape_key_motions.pop(obj.as_pointer(), None)
+        return
+
+    for update in depsgraph.updates:
+        if update.is_updated_geometry and isinstance(update.id, bpy.types.Object):
+            _weight_indices.pop(update.id.original.as_pointer(), None)
+            _shape_key_motions.pop(update.id.original.as_pointer(), None)
+
+
+@persistent
+def weight_index_undo_handler(*args):
+    # Undo and redo restore the meshes without a geometry update and loading a file frees all objects,
+    # so the cached tables of every object could be outdated
+    invalidate_weight_index()
+    invalidate_shape_key_motion()
+
+
+def get_update_post():
+    if hasattr(bpy.app.handlers, 'scene_update_post'):
+        return bpy.app.handlers.scene_update_post
+    return bpy.app.handlers.depsgraph_update_post
+
+
+def register_weight_index_handler():
+    if weight_index_update_handler not in get_update_post():
+        get_update_post().append(weight_index_update_handler)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+        if weight_index_undo_handler not in handlers:
+            handlers.append(weight_index_undo_handler)
+
+
+def unregister_weight_index_handler():
+    if weight_index_update_handler in get_update_post():
+        get_update_post().remove(weight_index_update_handler)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post):
+        if weight_index_undo_handler in handlers:
+            handlers.remove(weight_index_undo_handler)
+    invalidate_weight_index()
+    invalidate_shape_key_motion()
+
+
+class ShapeKeyMotion:
+    # How far the shape keys of one mesh object move each vertex away from the basis.
+    # Every key block is read with one foreach_get and the per key distances are folded into:
+    # max_distances, the largest displacement of each vertex over all keys, and
+    # max_normalized, the largest displacement after scaling each key to its own min/max movement (-inf without keys)
+
+    def __init__(self, mesh):
+        self.signature = _shape_key_motion_signature(mesh)
+        vertex_count = len(mesh.data.vertices)
+        self.max_distances = np.zeros(vertex_count)
+        self.max_normalized = np.full(vertex_count, -np.inf)
+
+        key_blocks = mesh.data.shape_keys.key_blocks if mesh.data.shape_keys else []
+        if len(key_blocks) < 2 or not vertex_count:
+            return
+
+        coords = np.empty(vertex_count * 3, dtype=np.float32)
+        key_blocks[0].data.foreach_get('co', coords)
+        basis = coords.reshape(vertex_count, 3).astype(np.float64)
+        for key_block in key_blocks[1:]:
+            key_block.data.foreach_get('co', coords)
+            distances = np.linalg.norm(coords.reshape(vertex_count, 3) - basis, axis=1)
+            np.maximum(self.max_distances, distances, out=self.max_distances)
+            np.maximum(self.max_normalized, normalize_range(distances, distances.min(), max(distances.max(), 0)),
+                       out=self.max_normalized)
+
+    def moving_vertices(self, threshold=0.0001):
+        # Boolean mask of the vertices any shape key moves further than threshold
+        return self.max_distances > threshold
+
+
+def normalize_range(weights, m_min, m_max):
+    # (weight - min) / (max - min), or the weight itself if all weights are the same
+    span = np.asarray(m_max - m_min, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = (weights - m_min) / span
+    return np.where(span != 0, normalized, weights)
+
+
+_shape_key_motions = {}  # Object pointer: ShapeKeyMotion
+
+
+def _shape_key_motion_signature(mesh):
+    # Like the weight index, edits of key positions aren't part of this, functions changing keys call invalidate_shape_key_motion
+    key_blocks = mesh.data.shape_keys.key_blocks if mesh.data.shape_keys else []
+    return mesh.data.as_pointer(), len(mesh.data.vertices), tuple(key_block.name for key_block in key_blocks)
+
+
+def get_shape_key_motion(mesh):
+    if mesh.mode == 'EDIT':
+        mesh.update_from_editmode()
+
+    motion = _shape_key_motions.get(mesh.as_pointer())
+    if motion is None or motion.signature != _shape_key_motion_signature(mesh):
+        motion = ShapeKeyMotion(mesh)
+        _shape_key_motions[mesh.as_pointer()] = motion
+    return motion
+
+
+def invalidate_shape_key_motion(mesh=None):
+    if mesh is None:
+        _shape_key_motions.clear()
+        return
+    _shape_key_motions.pop(mesh.as_pointer(), None)
+
+
+class NameIndex:
+    # Case insensitive name lookup for a collection like edit_bones or vertex_groups.
+    # Renames, additions and removals have to go through the index to keep it current
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.__names = {}
+        for item in collection:
+            self.__add_name(item.name)
+
+    def __add_name(self, name):
+        self.__names.setdefault(name.lower(), []).append(name)
+
+    def __remove_name(self, name):
+        names = self.__names.get(name.lower())
+        if names and name in names:
+            names.remove(name)
+            if not names:
+                del self.__names[name.lower()]
+
+    def __contains__(self, name):
+        return name.lower() in self.__names
+
+    def get(self, name):
+        names = self.__names.get(name.lower())
+        if not names:
+            return None
+
+        # Names only differing in case, return the first one like a search through the collection would
+        if len(names) > 1:
+            for item in self.collection:
+                if item.name.lower() == name.lower():
+                    return item
+
+        return self.collection.get(names[0])
+
+    def rename(self, item, new_name):
+        old_name = item.name
+        item.name = new_name
+        self.__remove_name(old_name)
+        self.__add_name(item.name)  # Blender adds .001 if the name already exists
+
+    def add(self, item):
+        self.__add_name(item.name)
+        return item
+
+    def remove(self, item):
+        name = item.name
+        self.collection.remove(item)
+        self.__remove_name(name)
+
+    def discard(self, name):
+        # For items which were removed without the index
+        self.__remove_name(name)
+
+
+class BoneNameStandardizer:
+    # Applies the bone name rules from armature_bones. The rules are prepared once and every result is memoized,
+    # so the same names coming in again with the next import are free
+
+    def __init__(self, replaces, starts_with, ends_with):
+        self.memo = {}
+        self.upper_regex = re.compile(r'(?:^|(?<=_))(.)', re.DOTALL)
+
+        # Single characters replaced by an underscore are done in one go, runs of underscores get collapsed as a whole
+        char_replaces = [r for r in replaces if len(r[0]) == 1 and r[1] == '_' and r[0] != '_']
+        underscore_replaces = [r for r in replaces if r[0] and not r[0].strip('_') and r[1] == '_']
+        self.char_table = str.maketrans({r[0]: r[1] for r in char_replaces})
+        self.underscore_replaces = underscore_replaces
+        self.underscore_regex = re.compile('_{2,}')
+        self.underscore_runs = {}
+        self.replaces = [r for r in replaces if r not in char_replaces and r not in underscore_replaces]
+
+        # The chars replaced in one go have to come first, followed by the underscore runs, to keep the order of the rules
+        if replaces != char_replaces + underscore_replaces + self.replaces:
+            raise ValueError('Bone name replaces which are single chars or underscore runs have to come before all other replaces')
+
+        self.starts_with = starts_with
+        self.starts_with_chars = set(r[0][:1] for r in starts_with)
+        self.ends_with = ends_with
+        self.ends_with_chars = set(r[0][-1:] for r in ends_with)
+
+    def __call__(self, name):
+        result = self.memo.get(name)
+        if result is None:
+            result = self.standardize(name)
+            self.memo[name] = result
+        return result
+
+    def collapse_underscores(self, match):
+        length = len(match.group(0))
+        run = self.underscore_runs.get(length)
+        if run is None:
+            run = match.group(0)
+            for replacement in self.underscore_replaces:
+                run = run.replace(replacement[0], replacement[1])
+            self.underscore_runs[length] = run
+        return run
+
+    def standardize(self, name):
+        # Always uppercase at the start and after an underscore
+        name = self.upper_regex.sub(lambda match: match.group(1).upper(), name)
+
+        # Replace all the things!
+        name = name.translate(self.char_table)
+        name = self.underscore_regex.sub(self.collapse_underscores, name)
+        for replacement in self.replaces:
+            name = name.replace(replacement[0], replacement[1])
+
+        # Replace if name starts with specified chars
+        for replacement in self.starts_with:
+            if name[:1] not in self.starts_with_chars:
+                break
+            if name.startswith(replacement[0]):
+                name = replacement[1] + name[len(replacement[0]):]
+
+        # Replace if name ends with specified chars
+        for replacement in self.ends_with:
+            if name[-1:] not in self.ends_with_chars:
+                break
+            if name.endswith(replacement[0]):
+                name = name[:-len(replacement[0])] + replacement[1]
+
+        # Remove digits from the start
+        name_split = name.split('_', 2)
+        if len(name_split) > 1 and name_split[0].isdigit():
+            name = name_split[1]
+
+        # Specific condition
+        name_split = name.split('"', 3)
+        if len(name_split) > 3:
+            name = name_split[1]
+
+        # Another specific condition
+        if ':' in name:
+            name = ''.join(name.split(':')[1:])
+
+        # Remove S0 from the end
+        if name[-2:] == 'S0':
+            name = name[:-2]
+
+        if name[-4:] == '_Jnt':
+            name = name[:-4]
+
+        return name
+
+
+standardize_bone_name = BoneNameStandardizer(Bones.bone_name_replaces, Bones.bone_name_starts_with, Bones.bone_name_ends_with)
+
+
 def remove_unused_vertex_groups(ignore_main_bones=False):
     remove_count = 0
     unselect_all()
     for mesh in get_meshes_objects(mode=2):
         mesh.update_from_editmode()
 
-        vgroup_used = {i: False for i, k in enumerate(mesh.vertex_groups)}
-
-        for v in mesh.data.vertices:
-            for g in v.groups:
-                if g.weight > 0.0:
-                    vgroup_used[g.group] = True
-
-        for i, used in sorted(vgroup_used.items(), reverse=True):
-            if not used:
-                if ignore_main_bones and mesh.vertex_groups[i].name in Bones.dont_delete_these_main_bones:
-                    continue
-                mesh.vertex_groups.remove(mesh.vertex_groups[i])
-                remove_count += 1
+        for i in sorted(get_weight_index(mesh).unused_groups(), reverse=True):
+            if ignore_main_bones and mesh.vertex_groups[i].name in Bones.dont_delete_these_main_bones:
+                continue
+            mesh.vertex_groups.remove(mesh.vertex_groups[i])
+            remove_count += 1
     return remove_count
 
 
@@ -364,63 +726,28 @@ def remove_unused_vertex_groups_of_mesh(mesh):
     unselect_all()
     mesh.update_from_editmode()
 
-    vgroup_used = {i: False for i, k in enumerate(mesh.vertex_groups)}
-
-    for v in mesh.data.vertices:
-        for g in v.groups:
-            if g.weight > 0.0:
-                vgroup_used[g.group] = True
-
-    for i, used in sorted(vgroup_used.items(), reverse=True):
-        if not used:
-            mesh.vertex_groups.remove(mesh.vertex_groups[i])
-            remove_count += 1
+    for i in sorted(get_weight_index(mesh).unused_groups(), reverse=True):
+        mesh.vertex_groups.remove(mesh.vertex_groups[i])
+        remove_count += 1
     return remove_count
 
 
 def find_center_vector_of_vertex_group(mesh, vertex_group):
-    data = mesh.data
-    verts = data.vertices
-    verts_in_group = []
-
-    for vert in verts:
-        i = vert.index
-        try:
-            if mesh.vertex_groups[vertex_group].weight(i) > 0:
-                verts_in_group.append(vert)
-        except RuntimeError:
-            # vertex is not in the group
-            pass
-
-    # Find the average vector point of the vertex cluster
-    divide_by = len(verts_in_group)
-    total = Vector()
-
-    if divide_by == 0:
+    vgroup = mesh.vertex_groups.get(vertex_group)
+    if vgroup is None:
         return False
 
-    for vert in verts_in_group:
-        total += vert.co
-
-    average = total / divide_by
-
-    return average
+    # Find the average vector point of the vertex cluster
+    return get_weight_index(mesh).group_centroid(mesh, vgroup.index)
 
 
 def vertex_group_exists(mesh_name, bone_name):
     mesh = get_objects()[mesh_name]
-    data = mesh.data
-    verts = data.vertices
-
-    for vert in verts:
-        i = vert.index
-        try:
-            mesh.vertex_groups[bone_name].weight(i)
-            return True
-        except:
-            pass
+    vgroup = mesh.vertex_groups.get(bone_name)
+    if vgroup is None:
+        return False
 
-    return False
+    return get_weight_index(mesh).has_vertices(vgroup.index)
 
 
 def get_meshes(self, context):
@@ -1322,56 +1649,63 @@ def sort_shape_keys(mesh_name, shape_key_order=None):
         if shape not in order:
             order.append(shape)
 
-    wm = bpy.context.window_manager
-    current_step = 0
-    wm.progress_begin(current_step, len(order))
+    current_order = [shapekey.name for shapekey in mesh.data.shape_keys.key_blocks]
+    apply_shape_key_order(mesh, get_sorted_shape_key_order(current_order, order))
+
+
+def get_sorted_shape_key_order(current_order, order):
+    # Returns the shape key names in the order they end up in, if every existing name of 'order' is moved to the next position.
+    # All other shape keys keep their relative order behind them
+    target_order = list(current_order)
 
     i = 0
     for name in order:
-        if name == 'Basis' and 'Basis' not in mesh.data.shape_keys.key_blocks:
+        if name == 'Basis' and 'Basis' not in target_order:
             i += 1
-            current_step += 1
-            wm.progress_update(current_step)
             continue
 
-        for index, shapekey in enumerate(mesh.data.shape_keys.key_blocks):
-            if shapekey.name == name:
+        if name not in target_order:
+            continue
 
-                mesh.active_shape_key_index = index
-                new_index = i
-                index_diff = (index - new_index)
+        target_order.remove(name)
+        if i >= len(target_order) + 1:
+            target_order.append(name)
+            continue
 
-                if new_index >= len(mesh.data.shape_keys.key_blocks):
-                    bpy.ops.object.shape_key_move(type='BOTTOM')
-                    break
+        target_order.insert(i, name)
+        i += 1
 
-                position_correct = False
-                if 0 <= index_diff <= (new_index - 1):
-                    while position_correct is False:
-                        if mesh.active_shape_key_index != new_index:
-                            bpy.ops.object.shape_key_move(type='UP')
-                        else:
-                            position_correct = True
-                else:
-                    if mesh.active_shape_key_index > new_index:
-                        bpy.ops.object.shape_key_move(type='TOP')
+    return target_order
 
-                    position_correct = False
-                    while position_correct is False:
-                        if mesh.active_shape_key_index != new_index:
-                            bpy.ops.object.shape_key_move(type='DOWN')
-                        else:
-                            position_correct = True
 
-                i += 1
-                break
+def get_shape_key_moves(current_order, target_order):
+    # Returns the names which have to be moved to the bottom one after another to get from the current to the target order.
+    # The longest start of the target order which is already in the correct relative order doesn't have to be moved at all
+    j = 0
+    for name in current_order:
+        if j < len(target_order) and name == target_order[j]:
+            j += 1
+    return target_order[j:]
 
-        current_step += 1
-        wm.progress_update(current_step)
+
+def apply_shape_key_order(mesh, target_order):
+    # Reorders the shape keys with one move per misplaced shape key instead of moving them step by step
+    # The mesh has to be active
+    key_blocks = mesh.data.shape_keys.key_blocks
+    moves = get_shape_key_moves([shapekey.name for shapekey in key_blocks], target_order)
+
+    wm = bpy.context.window_manager
+    wm.progress_begin(0, len(moves))
+
+    for current_step, name in enumerate(moves):
+        mesh.active_shape_key_index = key_blocks.find(name)
+        bpy.ops.object.shape_key_move(type='BOTTOM')
+        wm.progress_update(current_step + 1)
 
     mesh.active_shape_key_index = 0
 
     wm.progress_end()
+    return len(moves)
 
 
 def isEmptyGroup(group_name):
@@ -1382,35 +1716,18 @@ def isEmptyGroup(group_name):
     if vgroup is None:
         return True
 
-    for vert in mesh.data.vertices:
-        for group in vert.groups:
-            if group.group == vgroup.index:
-                if group.weight > 0:
-                    return False
-
-    return True
+    return len(get_weight_index(mesh).vertices_in_group(vgroup.index)) == 0
 
 
 def removeEmptyGroups(obj, thres=0):
-    z = []
-    for v in obj.data.vertices:
-        for g in v.groups:
-            if g.weight > thres:
-                if g not in z:
-                    z.append(obj.vertex_groups[g.group])
-    for r in obj.vertex_groups:
-        if r not in z:
-            obj.vertex_groups.remove(r)
+    for i in sorted(get_weight_index(obj).unused_groups(threshold=thres), reverse=True):
+        obj.vertex_groups.remove(obj.vertex_groups[i])
 
 
 def removeZeroVerts(obj, thres=0):
-    for v in obj.data.vertices:
-        z = []
-        for g in v.groups:
-            if not g.weight > thres:
-                z.append(g)
-        for r in z:
-            obj.vertex_groups[g.group].remove([v.index])
+    for group_index, verts in get_weight_index(obj).zero_weight_vertices(threshold=thres).items():
+        obj.vertex_groups[group_index].remove(verts)
+    invalidate_weight_index(obj)
 
 
 def delete_hierarchy(parent):
@@ -1483,10 +1800,8 @@ def delete_zero_weight(armature_name=None, ignore=''):
             if vertex_group.name not in vertex_group_name_to_objects_having_same_named_vertex_group:
                 vertex_group_name_to_objects_having_same_named_vertex_group[vertex_group.name] = set()
             vertex_group_name_to_objects_having_same_named_vertex_group[vertex_group.name].add(objects)
-        for vertex in objects.data.vertices:
-            for group in vertex.groups:
-                if group.weight > 0:
-                    vertex_group_names_used.add(vertex_group_id_to_vertex_group_name.get(group.group))
+        for group_index in get_weight_index(objects).used_groups():
+            vertex_group_names_used.add(vertex_group_id_to_vertex_group_name.get(group_index))
 
     not_used_bone_names = bone_names_to_work_on - vertex_group_names_used
 
@@ -1730,6 +2045,29 @@ def remove_doubles(mesh, threshold, save_shapes=True):
     return pre_tris - len(mesh.data.polygons)
 
 
+def get_overlapping_faces(mesh):
+    # Returns the indices of the faces which lie exactly on a face of another material, these cause z-fighting
+    # Only supported in Blender 2.80+, since it uses the loop triangles
+    from mmd_tools_local.core.pmx.importer import find_overlapping_faces  # Only needed here, so it doesn't slow down the startup
+    data = mesh.data
+    if version_2_79_or_older() or len(data.materials) < 2:
+        return np.zeros(0, dtype=np.int64)
+
+    data.calc_loop_triangles()
+    tri_count = len(data.loop_triangles)
+    coords = np.empty(len(data.vertices) * 3, dtype=np.float32)
+    loop_indices = np.empty(tri_count * 3, dtype=np.int32)
+    material_indices = np.empty(tri_count, dtype=np.int32)
+    polygon_indices = np.empty(tri_count, dtype=np.int32)
+    data.vertices.foreach_get('co', coords)
+    data.loop_triangles.foreach_get('vertices', loop_indices)
+    data.loop_triangles.foreach_get('material_index', material_indices)
+    data.loop_triangles.foreach_get('polygon_index', polygon_indices)
+
+    triangles = find_overlapping_faces(coords.reshape(-1, 3), loop_indices, material_indices)
+    return np.unique(polygon_indices[triangles])
+
+
 def get_tricount(obj):
     # Triangulates with Bmesh to avoid messing with the original geometry
     bmesh_mesh = bmesh.new()
@@ -1782,6 +2120,7 @@ def mix_weights(mesh, vg_from, vg_to, mix_strength=1.0, mix_mode='ADD', delete_o
     mod.mix_set = 'B'
     mod.mask_constant = mix_strength
     apply_modifier(mod)
+    invalidate_weight_index(mesh)
     if delete_old_vg:
         mesh.vertex_groups.remove(mesh.vertex_groups.get(vg_from))
     mesh.active_shape_key_index = 0  # This line fixes a visual bug in 2.80 which causes random weights to be stuck after being merged
@@ -25,7 +25,7 @@
 # Edits by:
 
 import bpy
-import math
+import numpy as np
 
 from . import common as Common
 from . import armature_bones as Bones
@@ -217,91 +217,7 @@ class AutoDecimateButton(bpy.types.Operator):
 
         if animation_weighting:
             for mesh in meshes_obj:
-                # Weight by multiplied bone weights for every pair of bones.
-                # This is O(n*m^2) for n verts and m bones, generally runs relatively quickly.
-                weights = dict()
-                for vertex in mesh.data.vertices:
-                    v_weights = [group.weight for group in vertex.groups]
-                    v_mults = []
-                    for idx1, w1 in enumerate(vertex.groups):
-                        for idx2, w2 in enumerate(vertex.groups):
-                            if idx1 != idx2:
-                                # Weight [vgroup * vgroup] for index = <mult>
-                                if (w1.group, w2.group) not in weights:
-                                    weights[(w1.group, w2.group)] = dict()
-                                weights[(w1.group, w2.group)][vertex.index] = w1.weight * w2.weight
-
-                # Normalize per vertex group pair
-                normalizedweights = dict()
-                for pair, weighting in weights.items():
-                    m_min = 1
-                    m_max = 0
-                    for _, weight in weighting.items():
-                        m_min = min(m_min, weight)
-                        m_max = max(m_max, weight)
-
-                    if pair not in normalizedweights:
-                        normalizedweights[pair] = dict()
-                    for v_index, weight in weighting.items():
-                        try:
-                            normalizedweights[pair][v_index] = (weight - m_min) / (m_max - m_min)
-                        except ZeroDivisionError:
-                            normalizedweights[pair][v_index] = weight
-
-                newweights = dict()
-                for pair, weighting in normalizedweights.items():
-                    for v_index, weight in weighting.items():
-                        try:
-                            newweights[v_index] = max(newweights[v_index], weight)
-                        except KeyError:
-                            newweights[v_index] = weight
-
-                s_weights = dict()
-
-                # Weight by relative shape key movement. This is kind of slow, but not too bad. It's O(n*m) for n verts and m shape keys,
-                # but shape keys contain every vert (not just the ones they impact)
-                # For shape key in shape keys:
-                if mesh.data.shape_keys is not None:
-                    for key_block in mesh.data.shape_keys.key_blocks[1:]:
-                        basis = mesh.data.shape_keys.key_blocks[0]
-                        s_weights[key_block.name] = dict()
-
-                        for idx, vert in enumerate(key_block.data):
-                            s_weights[key_block.name][idx] = math.sqrt(math.pow(basis.data[idx].co[0] - vert.co[0], 2.0) +
-                                                                            math.pow(basis.data[idx].co[1] - vert.co[1], 2.0) +
-                                                                            math.pow(basis.data[idx].co[2] - vert.co[2], 2.0))
-
-                # normalize min/max vert movement
-                s_normalizedweights = dict()
-                for keyname, weighting in s_weights.items():
-                    m_min = math.inf
-                    m_max = 0
-                    for _, weight in weighting.items():
-                        m_min = min(m_min, weight)
-                        m_max = max(m_max, weight)
-
-                    if keyname not in s_normalizedweights:
-                        s_normalizedweights[keyname] = dict()
-                    for v_index, weight in weighting.items():
-                        try:
-                            s_normalizedweights[keyname][v_index] = (weight - m_min) / (m_max - m_min)
-                        except ZeroDivisionError:
-                            s_normalizedweights[keyname][v_index] = weight
-
-                # find max normalized movement over all shape keys
-                for pair, weighting in s_normalizedweights.items():
-                    for v_index, weight in weighting.items():
-                        try:
-                            newweights[v_index] = max(newweights[v_index], weight)
-                        except KeyError:
-                            newweights[v_index] = weight
-
-                # TODO: ignore shape keys which move very little?
-                context.view_layer.objects.active = mesh
-                bpy.ops.object.vertex_group_add()
-                mesh.vertex_groups[-1].name = "CATS Animation"
-                for idx, weight in newweights.items():
-                    mesh.vertex_groups[-1].add([idx], weight, "REPLACE")
+                set_animation_weighting(context, mesh)
 
         if save_fingers:
             for mesh in meshes_obj:
@@ -554,3 +470,62 @@ class AutoDecimatePresetQuest(bpy.types.Operator):
     def execute(self, context):
         bpy.context.scene.max_tris = 5000
         return {'FINISHED'}
+
+
+def set_animation_weighting(context, mesh):
+    # Writes the "CATS Animation" vertex group, which is used to preserve the detail of heavily animated areas
+    vertex_indices, weights = get_animation_weights(mesh)
+
+    # TODO: ignore shape keys which move very little?
+    context.view_layer.objects.active = mesh
+    bpy.ops.object.vertex_group_add()
+    vertex_group = mesh.vertex_groups[-1]
+    vertex_group.name = "CATS Animation"
+
+    # There is no bulk setter for vertex weights, so add all vertices which share the same weight at once
+    unique_weights, inverse = np.unique(weights, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    splits = np.cumsum(np.bincount(inverse, minlength=len(unique_weights)))[:-1]
+    for weight, indices in zip(unique_weights.tolist(), np.split(vertex_indices[order], splits)):
+        vertex_group.add(indices.tolist(), weight, "REPLACE")
+    Common.invalidate_weight_index(mesh)
+
+
+def get_animation_weights(mesh):
+    # Returns (vertex indices, weights) of the animation weighting.
+    # Every vertex gets the max of its normalized bone pair weights and its normalized shape key movements
+    vertex_count = len(mesh.data.vertices)
+    new_weights = np.full(vertex_count, -np.inf)
+
+    # Weight by multiplied bone weights for every pair of bones
+    index = Common.get_weight_index(mesh)
+    counts = np.diff(index.indptr)
+    if len(index.weights) and counts.max() > 1:
+        # Pair every weight entry with all following entries of the same vertex
+        entry_counts = np.repeat(counts, counts)
+        entry_starts = np.repeat(index.indptr[:-1], counts)
+        entries = np.arange(len(index.weights))
+        following = entry_starts + entry_counts - entries - 1
+
+        left = np.repeat(entries, following)
+        right = np.arange(len(left)) - np.repeat(np.cumsum(following) - following, following) + np.repeat(entries + 1, following)
+
+        groups_left = index.group_indices[left].astype(np.int64)
+        groups_right = index.group_indices[right].astype(np.int64)
+        pair_keys = np.minimum(groups_left, groups_right) * max(index.group_count, 1) + np.maximum(groups_left, groups_right)
+        pair_weights = index.weights[left].astype(np.float64) * index.weights[right].astype(np.float64)
+        pair_verts = index.vertex_indices[left]
+
+        # Normalize per vertex group pair
+        pairs, pair_inverse = np.unique(pair_keys, return_inverse=True)
+        pair_min = np.ones(len(pairs))
+        pair_max = np.zeros(len(pairs))
+        np.minimum.at(pair_min, pair_inverse, pair_weights)
+        np.maximum.at(pair_max, pair_inverse, pair_weights)
+        np.maximum.at(new_weights, pair_verts, Common.normalize_range(pair_weights, pair_min[pair_inverse], pair_max[pair_inverse]))
+
+    # Weight by relative shape key movement, normalized per shape key
+    np.maximum(new_weights, Common.get_shape_key_motion(mesh).max_normalized, out=new_weights)
+
+    vertex_indices = np.flatnonzero(new_weights != -np.inf)
+    return vertex_indices, new_weights[vertex_indices]
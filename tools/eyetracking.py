@@ -269,6 +269,7 @@ class CreateEyesButton(bpy.types.Operator):
                 self.mesh.vertex_groups.active_index = vertex_group_index
                 bpy.ops.object.vertex_group_copy()
                 self.mesh.vertex_groups[vertex_group + '_copy'].name = rename_to
+                Common.invalidate_weight_index(self.mesh)
                 break
 
             vertex_group_index += 1
@@ -300,18 +301,7 @@ class CreateEyesButton(bpy.types.Operator):
         return from_shape
 
     def vertex_group_exists(self, bone_name):
-        data = self.mesh.data
-        verts = data.vertices
-
-        for vert in verts:
-            i = vert.index
-            try:
-                self.mesh.vertex_groups[bone_name].weight(i)
-                return True
-            except:
-                pass
-
-        return False
+        return Common.vertex_group_exists(self.mesh.name, bone_name)
 
 
 def fix_eye_position(context, old_eye, new_eye, head, right_side):
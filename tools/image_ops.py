@@ -0,0 +1,132 @@
+# MIT License
+
+# Copyright (c) 2020 Feilen
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Vectorized pixel operations for the bake pipeline. Images are read into (pixel count, 4) float32 RGBA arrays
+# and written back in one call, the kernels only work on arrays so they can run without Blender images.
+
+import struct
+import zlib
+import numpy as np
+
+
+def read_pixels(image):
+    pixels = np.empty(len(image.pixels), dtype=np.float32)
+    if hasattr(image.pixels, 'foreach_get'):  # Blender 2.83+
+        image.pixels.foreach_get(pixels)
+    else:
+        pixels[:] = image.pixels[:]
+    return pixels.reshape(-1, 4)
+
+
+def write_pixels(image, pixels):
+    pixels = np.ascontiguousarray(pixels, dtype=np.float32).reshape(-1)
+    if hasattr(image.pixels, 'foreach_set'):  # Blender 2.83+
+        image.pixels.foreach_set(pixels)
+        image.update()
+    else:
+        image.pixels[:] = pixels.tolist()
+
+
+def fill(pixel_count, color):
+    return np.tile(np.asarray(color, dtype=np.float32), (pixel_count, 1))
+
+
+def invert_rgb(pixels):
+    # invert r, g, b, but not a
+    pixels[:, :3] = 1.0 - pixels[:, :3]
+    return pixels
+
+
+def pack_alpha(pixels, alpha_pixels):
+    # The red channel of alpha_pixels becomes the alpha
+    pixels[:, 3] = alpha_pixels[:, 0]
+    return pixels
+
+
+def multiply_ao(diffuse_pixels, ao_pixels, opacity):
+    pixels = np.empty_like(diffuse_pixels)
+    # Map range: set the black point up to 1-opacity
+    pixels[:, :3] = diffuse_pixels[:, :3] * ((1.0 - opacity) + opacity * ao_pixels[:, :3])
+    # Alpha is unused on quest, set to 1 to make sure unity doesn't keep it
+    pixels[:, 3] = 1.0
+    return pixels
+
+
+def fill_image(image, color):
+    write_pixels(image, fill(image.size[0] * image.size[1], color))
+
+
+def invert_image_rgb(image):
+    write_pixels(image, invert_rgb(read_pixels(image)))
+
+
+def pack_image_alpha(image, alpha_image):
+    write_pixels(image, pack_alpha(read_pixels(image), read_pixels(alpha_image)))
+
+
+def multiply_image_ao(image, diffuse_image, ao_image, opacity):
+    write_pixels(image, multiply_ao(read_pixels(diffuse_image), read_pixels(ao_image), opacity))
+
+
+def write_png(path, pixels, width, height):
+    # 8 bit RGBA, rows flipped since Blender stores the bottom row first
+    data = np.clip(np.rint(np.asarray(pixels, dtype=np.float32) * 255.0), 0, 255).astype(np.uint8).reshape(height, width * 4)
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), data[::-1]]).tobytes()  # Filter type 0 on every row
+
+    def chunk(tag, body):
+        return struct.pack('>I', len(body)) + tag + body + struct.pack('>I', zlib.crc32(tag + body) & 0xffffffff)
+
+    with open(path, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n')
+        file.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        file.write(chunk(b'IDAT', zlib.compress(raw, 6)))
+        file.write(chunk(b'IEND', b''))
+
+
+def read_png(path):
+    # Only reads what write_png writes, raises ValueError for anything else, truncated and corrupt files too
+    with open(path, 'rb') as file:
+        png = file.read()
+    if png[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('Not a PNG file: ' + path)
+    idx = 8
+    header = None
+    data = []
+    try:
+        while idx < len(png):
+            length, tag = struct.unpack('>I4s', png[idx:idx + 8])
+            body = png[idx + 8:idx + 8 + length]
+            if tag == b'IHDR':
+                header = struct.unpack('>IIBBBBB', body)
+            elif tag == b'IDAT':
+                data.append(body)
+            idx += length + 12
+        if header is None or header[2:] != (8, 6, 0, 0, 0):
+            raise ValueError('Unsupported PNG format: ' + path)
+        width, height = header[:2]
+        rows = np.frombuffer(zlib.decompress(b''.join(data)), dtype=np.uint8).reshape(height, width * 4 + 1)
+    except (struct.error, zlib.error) as e:
+        raise ValueError('Corrupt PNG file: ' + path + ' (' + str(e) + ')')
+    if rows[:, 0].any():
+        raise ValueError('Unsupported PNG filter: ' + path)
+    return (rows[::-1, 1:].reshape(-1, 4) / np.float32(255.0)).astype(np.float32), width, height
@@ -38,7 +38,7 @@ from . import common as Common
 from . import settings as Settings
 from . import fbx_patch as Fbx_patch
 from .common import version_2_79_or_older
-from .register import register_wrap
+from .register import register_wrap, register_wrap_bundle, load_bundle
 from .translations import t
 
 mmd_tools_installed = False
@@ -160,6 +160,7 @@ class ImportAnyModel(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
                     bpy.ops.xps_tools.import_model('EXEC_DEFAULT',
                                                    filepath=file_path)
             except AttributeError:
+                load_bundle('installers')
                 bpy.ops.cats_importer.install_xps('INVOKE_DEFAULT')
 
         # Source Engine
@@ -169,6 +170,7 @@ class ImportAnyModel(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
                                          files=[{'name': file_name}],
                                          directory=directory)
             except AttributeError:
+                load_bundle('installers')
                 bpy.ops.cats_importer.install_source('INVOKE_DEFAULT')
 
         # FBX
@@ -204,6 +206,7 @@ class ImportAnyModel(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
                 bpy.ops.import_scene.vrm('INVOKE_DEFAULT')
                 return
             except AttributeError:
+                load_bundle('installers')
                 bpy.ops.cats_importer.install_vrm('INVOKE_DEFAULT')
                 return
 
@@ -429,6 +432,7 @@ class ImportMMD(bpy.types.Operator):
             context.scene.layers[0] = True
 
         if not mmd_tools_installed:
+            load_bundle('installers')
             bpy.ops.cats_importer.enable_mmd('INVOKE_DEFAULT')
             return {'FINISHED'}
 
@@ -438,6 +442,7 @@ class ImportMMD(bpy.types.Operator):
                                            types={'MESH', 'ARMATURE', 'MORPHS'},
                                            log_level='WARNING')
         except AttributeError:
+            load_bundle('installers')
             bpy.ops.cats_importer.enable_mmd('INVOKE_DEFAULT')
         except (TypeError, ValueError):
             bpy.ops.mmd_tools.import_model('INVOKE_DEFAULT')
@@ -465,6 +470,7 @@ class ImportXPS(bpy.types.Operator):
             else:
                 bpy.ops.xps_tools.import_model('INVOKE_DEFAULT')
         except AttributeError:
+            load_bundle('installers')
             bpy.ops.cats_importer.install_xps('INVOKE_DEFAULT')
 
         return {'FINISHED'}
@@ -487,6 +493,7 @@ class ImportSource(bpy.types.Operator):
         try:
             bpy.ops.import_scene.smd('INVOKE_DEFAULT')
         except AttributeError:
+            load_bundle('installers')
             bpy.ops.cats_importer.install_source('INVOKE_DEFAULT')
 
         return {'FINISHED'}
@@ -539,12 +546,13 @@ class ImportVRM(bpy.types.Operator):
         try:
             bpy.ops.import_scene.vrm('INVOKE_DEFAULT')
         except AttributeError:
+            load_bundle('installers')
             bpy.ops.cats_importer.install_vrm('INVOKE_DEFAULT')
 
         return {'FINISHED'}
 
 
-@register_wrap
+@register_wrap_bundle('installers')
 class InstallXPS(bpy.types.Operator):
     bl_idname = "cats_importer.install_xps"
     bl_label = t('InstallXPS.label')
@@ -581,7 +589,7 @@ class InstallXPS(bpy.types.Operator):
         row.operator(XpsToolsButton.bl_idname, icon=globs.ICON_URL)
 
 
-@register_wrap
+@register_wrap_bundle('installers')
 class InstallSource(bpy.types.Operator):
     bl_idname = "cats_importer.install_source"
     bl_label = t('InstallSource.label')
@@ -618,7 +626,7 @@ class InstallSource(bpy.types.Operator):
         row.operator(SourceToolsButton.bl_idname, icon=globs.ICON_URL)
 
 
-@register_wrap
+@register_wrap_bundle('installers')
 class InstallVRM(bpy.types.Operator):
     bl_idname = "cats_importer.install_vrm"
     bl_label = t('InstallVRM.label')
@@ -654,7 +662,7 @@ class InstallVRM(bpy.types.Operator):
         row.operator(VrmToolsButton.bl_idname, icon=globs.ICON_URL)
 
 
-@register_wrap
+@register_wrap_bundle('installers')
 class EnableMMD(bpy.types.Operator):
     bl_idname = "cats_importer.enable_mmd"
     bl_label = t('EnableMMD.label')
@@ -731,7 +739,7 @@ class EnableMMD(bpy.types.Operator):
 #     row.operator('importer.download_vrm', icon=globs.ICON_URL)
 
 
-@register_wrap
+@register_wrap_bundle('installers')
 class XpsToolsButton(bpy.types.Operator):
     bl_idname = 'cats_importer.download_xps_tools'
     bl_label = t('XpsToolsButton.label')
@@ -744,7 +752,7 @@ class XpsToolsButton(bpy.types.Operator):
         return {'FINISHED'}
 
 
-@register_wrap
+@register_wrap_bundle('installers')
 class SourceToolsButton(bpy.types.Operator):
     bl_idname = 'cats_importer.download_source_tools'
     bl_label = t('SourceToolsButton.label')
@@ -757,7 +765,7 @@ class SourceToolsButton(bpy.types.Operator):
         return {'FINISHED'}
 
 
-@register_wrap
+@register_wrap_bundle('installers')
 class VrmToolsButton(bpy.types.Operator):
     bl_idname = 'cats_importer.download_vrm'
     bl_label = t('VrmToolsButton.label')
@@ -28,7 +28,11 @@ import typing
 
 __bl_classes = []
 __bl_ordered_classes = []
+__bl_bundles = {}
+__bl_loaded_bundles = []
+__bl_pending_bundles = {}  # Bundle: timer which loads it
 __make_annotations = (not bpy.app.version < (2, 79, 9))
+__defer_bundles = hasattr(bpy.app, 'timers')  # Bundles can only be loaded later from 2.80 on
 
 
 def register_wrap(cls):
@@ -38,6 +42,79 @@ def register_wrap(cls):
     return cls
 
 
+def register_wrap_bundle(bundle):
+    # Rarely used classes are put into a bundle instead, which only gets registered on first use with load_bundle()
+    def wrap(cls):
+        if hasattr(cls, 'bl_rna'):
+            __bl_bundles.setdefault(bundle, []).append(cls)
+        cls = make_annotations(cls)
+        return cls
+    return wrap
+
+
+def register_bundles():
+    # Called at startup, loads all bundles right away if they can't be loaded later
+    if not __defer_bundles:
+        for bundle in list(__bl_bundles.keys()):
+            load_bundle(bundle)
+
+
+def is_bundle_loaded(bundle):
+    return bundle in __bl_loaded_bundles
+
+
+def load_bundle(bundle):
+    # Registers all classes of the bundle. Returns True if they weren't registered yet
+    if bundle in __bl_loaded_bundles:
+        return False
+
+    for cls in __bl_bundles.get(bundle, []):
+        try:
+            bpy.utils.register_class(cls)
+        except ValueError:
+            pass
+    __bl_loaded_bundles.append(bundle)
+    __bl_pending_bundles.pop(bundle, None)
+    return True
+
+
+def load_bundle_deferred(bundle, callback=None):
+    # Classes can't be registered while drawing, so panels use this to load a bundle right after the draw
+    if bundle in __bl_loaded_bundles or bundle in __bl_pending_bundles:
+        return
+
+    def load():
+        if load_bundle(bundle) and callback:
+            callback()
+        return None
+
+    __bl_pending_bundles[bundle] = load
+    bpy.app.timers.register(load, first_interval=0)
+
+
+def count_deferred_classes():
+    return sum(len(classes) for bundle, classes in __bl_bundles.items() if bundle not in __bl_loaded_bundles)
+
+
+def unload_bundles():
+    # Timers of bundles that didn't load yet would register their classes again after the add-on got disabled
+    for load in __bl_pending_bundles.values():
+        if bpy.app.timers.is_registered(load):
+            bpy.app.timers.unregister(load)
+
+    count = 0
+    for bundle in reversed(__bl_loaded_bundles):
+        for cls in reversed(__bl_bundles.get(bundle, [])):
+            try:
+                bpy.utils.unregister_class(cls)
+                count += 1
+            except (ValueError, RuntimeError):
+                pass
+    __bl_loaded_bundles.clear()
+    __bl_pending_bundles.clear()
+    return count
+
+
 def make_annotations(cls):
     if __make_annotations:
         if bpy.app.version < (2, 93, 0):
@@ -121,6 +121,9 @@ class ShapeKeyApplier(bpy.types.Operator):
         bpy.ops.mesh.remove_doubles(threshold=0)
         Common.switch('OBJECT')
 
+        # Every key moved relative to the new basis
+        Common.invalidate_shape_key_motion(mesh)
+
         # If a reversed shapekey was applied as basis, fix the name
         if ' - Reverted - Reverted' in old_basis_shapekey.name:
             old_basis_shapekey.name = old_basis_shapekey.name.replace(' - Reverted - Reverted', '')
@@ -44,7 +44,7 @@ from bpy.utils import previews
 from . import common as Common
 from . import settings as Settings
 from .. import globs
-from ..tools.register import register_wrap
+from ..tools.register import register_wrap, register_wrap_bundle, is_bundle_loaded, load_bundle_deferred
 from .translations import t
 
 # global variables
@@ -59,7 +59,7 @@ main_dir = pathlib.Path(os.path.dirname(__file__)).parent.resolve()
 resources_dir = os.path.join(str(main_dir), "resources")
 
 
-@register_wrap
+@register_wrap_bundle('supporter')
 class PatreonButton(bpy.types.Operator):
     bl_idname = 'cats_supporter.patreon'
     bl_label = t('PatreonButton.label')
@@ -72,7 +72,7 @@ class PatreonButton(bpy.types.Operator):
         return {'FINISHED'}
 
 
-@register_wrap
+@register_wrap_bundle('supporter')
 class ReloadButton(bpy.types.Operator):
     bl_idname = 'cats_supporter.reload'
     bl_label = t('ReloadButton.label')
@@ -88,7 +88,7 @@ class ReloadButton(bpy.types.Operator):
         return {'FINISHED'}
 
 
-@register_wrap
+@register_wrap_bundle('supporter')
 class DynamicPatronButton(bpy.types.Operator):
     bl_idname = 'cats_supporter.dynamic_patron_button'
     bl_label = t('DynamicPatronButton.label')
@@ -141,6 +141,15 @@ def register_dynamic_buttons():
         bpy.utils.register_class(button)
 
 
+def load_supporter_bundle():
+    # The supporter buttons only get registered once the supporter panel is shown
+    def register_buttons():
+        register_dynamic_buttons()
+        Common.ui_refresh()
+
+    load_bundle_deferred('supporter', callback=register_buttons)
+
+
 def unregister_dynamic_buttons():
     for button in button_list:
         try:
@@ -275,7 +284,8 @@ def reload_supporters():
         preview_collections['supporter_icons'] = pcoll
 
     unregister_dynamic_buttons()
-    register_dynamic_buttons()
+    if is_bundle_loaded('supporter'):
+        register_dynamic_buttons()
 
     # Finish reloading
     finish_reloading()
@@ -28,31 +28,39 @@ import os
 import bpy
 import copy
 import json
+import heapq
 import pathlib
 import platform
-import traceback
 import collections
-import requests.exceptions
 
 from datetime import datetime, timezone
 from collections import OrderedDict
 
 from . import common as Common
+from . import translate_cache as TranslateCache
 from .register import register_wrap
 from .. import globs
 # from ..googletrans import Translator  # TODO Remove this
-from ..extern_tools.google_trans_new.google_trans_new import google_translator
 from .translations import t
 
 from mmd_tools_local import translations as mmd_translations
 
 dictionary = {}
 dictionary_google = {}
+dictionary_loaded = False
+dictionary_found = False
+dictionary_automaton = None
+translation_cache = {}
+skip_google = False
 
 main_dir = pathlib.Path(os.path.dirname(__file__)).parent.resolve()
 resources_dir = os.path.join(str(main_dir), "resources")
 dictionary_file = os.path.join(resources_dir, "dictionary.json")
 dictionary_google_file = os.path.join(resources_dir, "dictionary_google.json")
+dictionary_google_log_file = os.path.join(resources_dir, "dictionary_google.log")
+dictionary_compiled_file = os.path.join(resources_dir, "dictionary.bin")
+
+google_store = TranslateCache.GoogleDictionaryStore(dictionary_google_file, dictionary_google_log_file)
 
 
 @register_wrap
@@ -69,15 +77,7 @@ class TranslateShapekeyButton(bpy.types.Operator):
 
         saved_data = Common.SavedData()
 
-        to_translate = []
-
-        for mesh in Common.get_meshes_objects(mode=2):
-            if Common.has_shapekeys(mesh):
-                for shapekey in mesh.data.shape_keys.key_blocks:
-                    if 'vrc.' not in shapekey.name and shapekey.name not in to_translate:
-                        to_translate.append(shapekey.name)
-
-        update_dictionary(to_translate, translating_shapes=True, self=self)
+        update_dictionary(get_shapekey_names(), translating_shapes=True, self=self)
 
         Common.update_shapekey_orders()
 
@@ -112,12 +112,7 @@ class TranslateBonesButton(bpy.types.Operator):
         return True
 
     def execute(self, context):
-        to_translate = []
-        for armature in Common.get_armature_objects():
-            for bone in armature.data.bones:
-                to_translate.append(bone.name)
-
-        update_dictionary(to_translate, self=self)
+        update_dictionary(get_bone_names(), self=self)
 
         count = 0
         for armature in Common.get_armature_objects():
@@ -141,17 +136,8 @@ class TranslateObjectsButton(bpy.types.Operator):
         if bpy.app.version < (2, 79, 0):
             self.report({'ERROR'}, t('TranslateX.error.wrongVersion'))
             return {'FINISHED'}
-        to_translate = []
-        for obj in Common.get_objects():
-            if obj.name not in to_translate:
-                to_translate.append(obj.name)
-            if obj.type == 'ARMATURE':
-                if obj.data and obj.data.name not in to_translate:
-                    to_translate.append(obj.data.name)
-                if obj.animation_data and obj.animation_data.action:
-                    to_translate.append(obj.animation_data.action.name)
 
-        update_dictionary(to_translate, self=self)
+        update_dictionary(get_object_names(), self=self)
 
         i = 0
         for obj in Common.get_objects():
@@ -188,13 +174,7 @@ class TranslateMaterialsButton(bpy.types.Operator):
 
         saved_data = Common.SavedData()
 
-        to_translate = []
-        for mesh in Common.get_meshes_objects(mode=2):
-            for matslot in mesh.material_slots:
-                if matslot.name not in to_translate:
-                    to_translate.append(matslot.name)
-
-        update_dictionary(to_translate, self=self)
+        update_dictionary(get_material_names(), self=self)
 
         i = 0
         for mesh in Common.get_meshes_objects(mode=2):
@@ -266,11 +246,72 @@ class TranslateAllButton(bpy.types.Operator):
     bl_description = t('TranslateAllButton.desc')
     bl_options = {'REGISTER', 'UNDO', 'INTERNAL'}
 
+    fetch_thread = None
+    google_inputs = None
+    timer = None
+
     def execute(self, context):
         if bpy.app.version < (2, 79, 0):
             self.report({'ERROR'}, t('TranslateX.error.wrongVersion'))
             return {'FINISHED'}
 
+        # Without a window (e.g. in background mode) there is no UI to keep responsive
+        if not context.window:
+            return self.translate_all()
+
+        # Fetch all missing Google translations at once in the background, so Blender doesn't freeze while waiting for Google
+        self.google_inputs = []
+        if Common.get_armature():
+            self.google_inputs.append(get_google_input(get_bone_names()))
+        self.google_inputs.append(get_google_input(get_shapekey_names(), translating_shapes=True))
+        self.google_inputs.append(get_google_input(get_object_names()))
+        self.google_inputs.append(get_google_input(get_material_names()))
+
+        texts = [text for google_input, use_google_only in self.google_inputs for text in google_input]
+        if not texts:
+            return self.translate_all()
+
+        print('GOOGLE DICT UPDATE!')
+        self.fetch_thread = TranslateCache.FetchThread(texts)
+        self.fetch_thread.start()
+
+        wm = context.window_manager
+        wm.progress_begin(0, self.fetch_thread.progress[1])
+        self.timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        wm = context.window_manager
+        wm.progress_update(self.fetch_thread.progress[0])
+        if not self.fetch_thread.done:
+            return {'PASS_THROUGH'}
+
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+
+        translations = self.fetch_thread.translations
+        for google_input, use_google_only in self.google_inputs:
+            add_google_translations(OrderedDict((text, translations[text]) for text in google_input if text in translations), use_google_only)
+
+        if not self.fetch_thread.error:
+            return self.translate_all()
+
+        # Translate the rest with the dictionary only, the error is reported once instead of by every translation
+        global skip_google
+        skip_google = True
+        try:
+            self.translate_all()
+        finally:
+            skip_google = False
+        report_fetch_error(self.fetch_thread.error, self)
+        # The names got translated, so finish to push the undo step
+        return {'FINISHED'}
+
+    def translate_all(self):
         error_shown = False
 
         try:
@@ -307,8 +348,98 @@ class TranslateAllButton(bpy.types.Operator):
         return {'FINISHED'}
 
 
+def get_bone_names():
+    to_translate = []
+    for armature in Common.get_armature_objects():
+        for bone in armature.data.bones:
+            to_translate.append(bone.name)
+    return to_translate
+
+
+def get_shapekey_names():
+    to_translate = []
+    for mesh in Common.get_meshes_objects(mode=2):
+        if Common.has_shapekeys(mesh):
+            for shapekey in mesh.data.shape_keys.key_blocks:
+                if 'vrc.' not in shapekey.name and shapekey.name not in to_translate:
+                    to_translate.append(shapekey.name)
+    return to_translate
+
+
+def get_object_names():
+    to_translate = []
+    for obj in Common.get_objects():
+        if obj.name not in to_translate:
+            to_translate.append(obj.name)
+        if obj.type == 'ARMATURE':
+            if obj.data and obj.data.name not in to_translate:
+                to_translate.append(obj.data.name)
+            if obj.animation_data and obj.animation_data.action:
+                to_translate.append(obj.animation_data.action.name)
+    return to_translate
+
+
+def get_material_names():
+    to_translate = []
+    for mesh in Common.get_meshes_objects(mode=2):
+        for matslot in mesh.material_slots:
+            if matslot.name not in to_translate:
+                to_translate.append(matslot.name)
+    return to_translate
+
+
 # Loads the dictionaries at the start of blender
-def load_translations():
+# With lazy they only get loaded on the first translation, so they don't slow down the startup
+def load_translations(lazy=False):
+    global dictionary_loaded, dictionary_google
+    dictionary_loaded = False
+    dictionary_google = {}
+
+    if lazy:
+        return os.path.isfile(dictionary_file)
+    return load_dictionary()
+
+
+def load_dictionary():
+    global dictionary, dictionary_loaded, dictionary_found
+    if dictionary_loaded:
+        return dictionary_found
+    dictionary_loaded = True
+
+    # Unmap the previous compiled dictionary, it can't be replaced while it is open on Windows
+    if isinstance(dictionary, TranslateCache.CompiledDictionary):
+        dictionary.close()
+        dictionary = {}
+
+    # Use the compiled dictionary if none of the json files changed since it was written
+    signature = TranslateCache.get_source_signature([dictionary_file, dictionary_google_file, dictionary_google_log_file])
+    compiled = TranslateCache.read_compiled_dictionary(dictionary_compiled_file, signature)
+    if compiled is not None:
+        dictionary = compiled
+        dictionary_found = True
+        update_automaton()
+        return dictionary_found
+
+    dictionary_found = load_json_dictionary()
+    if dictionary_found:
+        try:
+            signature = TranslateCache.get_source_signature([dictionary_file, dictionary_google_file, dictionary_google_log_file])
+            TranslateCache.write_compiled_dictionary(dictionary_compiled_file, dictionary, signature)
+        except OSError:
+            print('COULD NOT SAVE COMPILED DICTIONARY!')
+    return dictionary_found
+
+
+def load_google_dictionary():
+    global dictionary_google
+    if dictionary_google:
+        return
+    dictionary_google = google_store.load()
+    if dictionary_google is None:
+        reset_google_dict()
+
+
+def load_json_dictionary():
     global dictionary
     dictionary = OrderedDict()
     temp_dict = OrderedDict()
@@ -328,40 +459,24 @@ def load_translations():
         pass
 
     # Load local google dictionary and add it to the temp dict
-    try:
-        with open(dictionary_google_file, encoding="utf8") as file:
-            global dictionary_google
-            dictionary_google = json.load(file, object_pairs_hook=collections.OrderedDict)
-
-            if 'created' not in dictionary_google \
-                    or 'translations' not in dictionary_google \
-                    or 'translations_full' not in dictionary_google:
-                reset_google_dict()
-            else:
-                for name, trans in dictionary_google.get('translations').items():
-                    if not name:
-                        continue
-
-                    if name in temp_dict.keys():
-                        print(name, 'ALREADY IN INTERNAL DICT!')
-                        continue
-
-                    temp_dict[name] = trans
-
-            # print('GOOGLE DICTIONARY LOADED!')
-    except FileNotFoundError:
-        print('GOOGLE DICTIONARY NOT FOUND!')
-        reset_google_dict()
-        pass
-    except json.decoder.JSONDecodeError:
-        print("ERROR FOUND IN GOOOGLE DICTIONARY")
-        reset_google_dict()
-        pass
+    load_google_dictionary()
+    for name, trans in dictionary_google.get('translations').items():
+        if not name:
+            continue
+
+        if name in temp_dict.keys():
+            print(name, 'ALREADY IN INTERNAL DICT!')
+            continue
+
+        temp_dict[name] = trans
+    # print('GOOGLE DICTIONARY LOADED!')
 
     # Sort temp dictionary by lenght and put it into the global dict
     for key in sorted(temp_dict, key=lambda k: len(k), reverse=True):
         dictionary[key] = temp_dict[key]
 
+    update_automaton()
+
     # for key, value in dictionary.items():
     #     print('"' + key + '" - "' + value + '"')
 
@@ -369,7 +484,28 @@ def load_translations():
 
 
 def update_dictionary(to_translate_list, translating_shapes=False, self=None):
-    global dictionary, dictionary_google
+    google_input, use_google_only = get_google_input(to_translate_list, translating_shapes=translating_shapes)
+
+    if not google_input or skip_google:
+        # print('NO GOOGLE TRANSLATIONS')
+        return
+
+    # Translate the rest with google translate
+    print('GOOGLE DICT UPDATE!')
+    wm = bpy.context.window_manager
+    wm.progress_begin(0, len(google_input))
+    translations, error = TranslateCache.fetch(google_input, progress=lambda done, total: wm.progress_update(done))
+    wm.progress_end()
+
+    # Translations which finished before an error are still saved
+    add_google_translations(translations, use_google_only)
+
+    if error:
+        report_fetch_error(error, self)
+
+
+def get_google_input(to_translate_list, translating_shapes=False):
+    # Returns the names which can't be translated by the dictionaries and whether they are full shape key names
     regex = u'[\u3000-\u303f\u3040-\u309f\u30a0-\u30ff\uff00-\uff9f\u4e00-\u9faf\u3400-\u4dbf]+'  # Regex to look for japanese chars
 
     use_google_only = False
@@ -380,6 +516,10 @@ def update_dictionary(to_translate_list, translating_shapes=False, self=None):
     if type(to_translate_list) is str:
         to_translate_list = [to_translate_list]
 
+    load_dictionary()
+    if use_google_only:
+        load_google_dictionary()
+
     google_input = []
 
     # Translate everything
@@ -395,27 +535,12 @@ def update_dictionary(to_translate_list, translating_shapes=False, self=None):
             if not re.findall(regex, to_translate):
                 continue
 
-            translated = False
-            for key, value in dictionary_google.get('translations_full').items():
-                if to_translate == key and value:
-                    translated = True
-
-            if not translated:
+            if not dictionary_google.get('translations_full').get(to_translate) and to_translate not in google_input:
                 google_input.append(to_translate)
 
         # Translate with internal dictionary
         else:
-            for key, value in dictionary.items():
-                if key in to_translate:
-                    if value:
-                        to_translate = to_translate.replace(key, value)
-                    else:
-                        continue
-
-                    # Check if string is fully translated
-                    translated_count += len(key)
-                    if translated_count >= length:
-                        break
+            to_translate, translated_count = dictionary_replace(to_translate, length=length)
 
             # If not fully translated, translate the rest with Google
             if translated_count < length:
@@ -425,103 +550,102 @@ def update_dictionary(to_translate_list, translating_shapes=False, self=None):
                         if name not in google_input and name not in dictionary.keys():
                             google_input.append(name)
 
-    if not google_input:
-        # print('NO GOOGLE TRANSLATIONS')
+    return google_input, use_google_only
+
+
+def add_google_translations(translations, use_google_only):
+    global dictionary
+    if not translations:
         return
 
-    # Translate the rest with google translate
-    print('GOOGLE DICT UPDATE!')
-    translator = google_translator(url_suffix='com')
-    token_tries = 0
-    while True:
-        try:
-            translations = [translator.translate(text, lang_src='ja', lang_tgt='en').strip() for text in google_input]
-            break
-        except (requests.exceptions.ConnectionError, ConnectionRefusedError):
-            print('CONNECTION TO GOOGLE FAILED!')
-            if self:
-                self.report({'ERROR'}, t('update_dictionary.error.cantConnect'))
-            return
-        except json.JSONDecodeError:
-            if self:
-                self.report({'ERROR'}, t('update_dictionary.error.temporaryBan') + t('update_dictionary.error.catsTranslated'))
-            print('YOU GOT BANNED BY GOOGLE!')
-            return
-        except RuntimeError as e:
-            error = Common.html_to_text(str(e))
-            if self:
-                if 'Please try your request again later' in error:
-                    self.report({'ERROR'}, t('update_dictionary.error.temporaryBan') + t('update_dictionary.error.catsTranslated'))
-                    print('YOU GOT BANNED BY GOOGLE!')
-                    return
-
-                if 'Error 403' in error:
-                    self.report({'ERROR'}, t('update_dictionary.error.cantAccess') + t('update_dictionary.error.catsTranslated'))
-                    print('NO PERMISSION TO USE GOOGLE TRANSLATE!')
-                    return
-
-                self.report({'ERROR'}, t('update_dictionary.error.errorMsg') + t('update_dictionary.error.catsTranslated') + '\n' + '\nGoogle: ' + error)
-            print('', 'You got an error message from Google:', error, '')
-            return
-        except AttributeError:
-            # If the translator wasn't able to create a stable connection to Google, just retry it again
-            # This is an issue with Google since Nov 2020: https://github.com/ssut/py-googletrans/issues/234
-            token_tries += 1
-            if token_tries < 3:
-                print('RETRY', token_tries)
-                translator = google_translator(url_suffix='com')
-                continue
+    load_dictionary()
+    load_google_dictionary()
+    section = 'translations_full' if use_google_only else 'translations'
 
-            # If if didn't work after 20 tries, just quit
-            # The response from Google was printed into "cats/resources/google-response.txt"
-            if self:
-                self.report({'ERROR'}, t('update_dictionary.error.apiChanged'))
-            print('ERROR: GOOGLE API CHANGED!')
-            print(traceback.format_exc())
-            return
+    # The compiled dictionary is read only, copy it before adding to it
+    if isinstance(dictionary, TranslateCache.CompiledDictionary):
+        compiled = dictionary
+        dictionary = OrderedDict(compiled.items())
+        compiled.close()
+    new_translations = OrderedDict()
 
     # Update the dictionaries
-    for i, translation in enumerate(translations):
-        name = google_input[i]
-
-        if use_google_only:
-            dictionary_google['translations_full'][name] = translation
-        else:
+    for name, translation in translations.items():
+        if not use_google_only:
             # Capitalize words
             translation_words = translation.split(' ')
             translation_words = [word.capitalize() for word in translation_words]
             translation = ' '.join(translation_words)
 
             dictionary[name] = translation
-            dictionary_google['translations'][name] = translation
 
-        print(google_input[i], '->', translation)
+        dictionary_google[section][name] = translation
+        new_translations[name] = translation
+        print(name, '->', translation)
 
     # Sort dictionary
     temp_dict = copy.deepcopy(dictionary)
     dictionary = OrderedDict()
     for key in sorted(temp_dict, key=lambda k: len(k), reverse=True):
         dictionary[key] = temp_dict[key]
+    update_automaton()
 
-    # Save the google dict locally
-    save_google_dict()
+    # Save the new google translations locally
+    google_store.append(section, new_translations)
 
     print('DICTIONARY UPDATE SUCCEEDED!')
-    return
 
 
-def translate(to_translate, add_space=False, translating_shapes=False):
-    global dictionary
+def report_fetch_error(error, self=None):
+    if error.reason == 'connection':
+        print('CONNECTION TO GOOGLE FAILED!')
+        message = t('update_dictionary.error.cantConnect')
+    elif error.reason == 'ban':
+        print('YOU GOT BANNED BY GOOGLE!')
+        message = t('update_dictionary.error.temporaryBan') + t('update_dictionary.error.catsTranslated')
+    elif error.reason == 'access':
+        print('NO PERMISSION TO USE GOOGLE TRANSLATE!')
+        message = t('update_dictionary.error.cantAccess') + t('update_dictionary.error.catsTranslated')
+    elif error.reason == 'api':
+        # If it didn't work after a few tries, just quit
+        print('ERROR: GOOGLE API CHANGED!')
+        message = t('update_dictionary.error.apiChanged')
+    else:
+        google_error = Common.html_to_text(error.message)
+        if 'Please try your request again later' in google_error:
+            print('YOU GOT BANNED BY GOOGLE!')
+            message = t('update_dictionary.error.temporaryBan') + t('update_dictionary.error.catsTranslated')
+        elif 'Error 403' in google_error:
+            print('NO PERMISSION TO USE GOOGLE TRANSLATE!')
+            message = t('update_dictionary.error.cantAccess') + t('update_dictionary.error.catsTranslated')
+        else:
+            print('', 'You got an error message from Google:', google_error, '')
+            message = t('update_dictionary.error.errorMsg') + t('update_dictionary.error.catsTranslated') + '\n' + '\nGoogle: ' + google_error
 
-    pre_translation = to_translate
-    length = len(to_translate)
-    translated_count = 0
+    if self:
+        self.report({'ERROR'}, message)
+
+
+def translate(to_translate, add_space=False, translating_shapes=False):
+    if not dictionary_loaded:
+        load_dictionary()
 
     # Figure out whether to use google only or not
     use_google_only = False
     if translating_shapes and bpy.context.scene.use_google_only:
         use_google_only = True
 
+    cache_key = (to_translate, add_space, translating_shapes, use_google_only)
+    result = translation_cache.get(cache_key)
+    if result is None:
+        result = _translate(to_translate, add_space, use_google_only)
+        translation_cache[cache_key] = result
+    return result
+
+
+def _translate(to_translate, add_space, use_google_only):
+    pre_translation = to_translate
+
     # Add space for shape keys
     addition = ''
     if add_space:
@@ -532,24 +656,14 @@ def translate(to_translate, add_space=False, translating_shapes=False):
 
     # Translate shape keys with Google Translator only, if the user chose this
     if use_google_only:
-        for key, value in dictionary_google.get('translations_full').items():
-            if to_translate == key and value:
-                to_translate = value
+        load_google_dictionary()
+        value = dictionary_google.get('translations_full').get(to_translate)
+        if value:
+            to_translate = value
 
     # Translate with internal dictionary
     else:
-        for key, value in dictionary.items():
-            if key in to_translate:
-                # If string is empty, don't replace it. This will be done at the end
-                if not value:
-                    continue
-
-                to_translate = to_translate.replace(key, addition + value)
-
-                # Check if string is fully translated
-                translated_count += len(key)
-                if translated_count >= length:
-                    break
+        to_translate = dictionary_replace(to_translate, addition=addition, length=len(pre_translation))[0]
 
     to_translate = to_translate.replace('.L', '_L').replace('.R', '_R').replace('  ', ' ').replace('し', '').replace('っ', '').strip()
 
@@ -559,6 +673,160 @@ def translate(to_translate, add_space=False, translating_shapes=False):
     return to_translate, pre_translation != to_translate
 
 
+class DictionaryAutomaton:
+    # Aho-Corasick automaton over all dictionary keys.
+    # One pass over a name finds every key contained in it, returned as its rank (position in the length sorted dictionary)
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.key_chars = set()
+        self.empty_rank = None
+
+        goto = [{}]
+        fail = [0]
+        out = [()]
+
+        for rank, key in enumerate(keys):
+            if not key:
+                if self.empty_rank is None:
+                    self.empty_rank = rank
+                continue
+            self.key_chars.update(key)
+
+            node = 0
+            for char in key:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    fail.append(0)
+                    out.append(())
+                node = next_node
+            out[node] += (rank,)
+
+        # Breadth first to set the fail links, every node also reports the keys of its fail node
+        queue = collections.deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in goto[node].items():
+                queue.append(next_node)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                if node:
+                    fail[next_node] = goto[state].get(char, 0)
+                out[next_node] += out[fail[next_node]]
+
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+
+    def __len__(self):
+        return len(self.keys)
+
+    def key(self, rank):
+        return self.keys[rank]
+
+    def find(self, text):
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+
+        found = set()
+        if self.empty_rank is not None:
+            found.add(self.empty_rank)
+
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+def update_automaton():
+    global dictionary_automaton
+    if isinstance(dictionary, TranslateCache.CompiledDictionary):
+        # The compiled dictionary finds the keys with its sorted index, so there is no need to decode all keys for the automaton
+        dictionary_automaton = dictionary
+    else:
+        dictionary_automaton = DictionaryAutomaton(list(dictionary.keys()))
+    translation_cache.clear()
+
+
+def dictionary_replace(to_translate, addition='', length=None):
+    # Replaces the dictionary keys inside the name, longest keys first.
+    # Only the keys found by the automaton get checked, in the same order as the full dictionary would
+    if not dictionary_loaded:
+        load_dictionary()
+    if dictionary_automaton is None or len(dictionary_automaton) != len(dictionary):
+        update_automaton()
+
+    if length is None:
+        length = len(to_translate)
+    translated_count = 0
+
+    key_chars = dictionary_automaton.key_chars
+
+    ranks = list(dictionary_automaton.find(to_translate))
+    heapq.heapify(ranks)
+    queued = set(ranks)
+
+    while ranks:
+        rank = heapq.heappop(ranks)
+        key = dictionary_automaton.key(rank)
+        value = dictionary[key]
+
+        # If string is empty, don't replace it. This will be done at the end
+        if not value or key not in to_translate:
+            continue
+
+        replacement = addition + value
+        to_translate = to_translate.replace(key, replacement)
+
+        # Check if string is fully translated
+        translated_count += len(key)
+        if translated_count >= length:
+            break
+
+        # The replacement can create new matches of shorter keys, so look for them again
+        if not key_chars.isdisjoint(replacement):
+            for new_rank in dictionary_automaton.find(to_translate):
+                if new_rank > rank and new_rank not in queued:
+                    queued.add(new_rank)
+                    heapq.heappush(ranks, new_rank)
+
+    return to_translate, translated_count
+
+
+def dictionary_replace_linear(to_translate, addition='', length=None):
+    # Reference implementation which checks every single dictionary key, used to verify the automaton
+    if not dictionary_loaded:
+        load_dictionary()
+
+    if length is None:
+        length = len(to_translate)
+    translated_count = 0
+
+    for key, value in dictionary.items():
+        if key in to_translate:
+            # If string is empty, don't replace it. This will be done at the end
+            if not value:
+                continue
+
+            to_translate = to_translate.replace(key, addition + value)
+
+            # Check if string is fully translated
+            translated_count += len(key)
+            if translated_count >= length:
+                break
+
+    return to_translate, translated_count
+
+
 def fix_jp_chars(name):
     for values in mmd_translations.jp_half_to_full_tuples:
         if values[0] in name:
@@ -581,8 +849,8 @@ def reset_google_dict():
 
 
 def save_google_dict():
-    with open(dictionary_google_file, 'w', encoding="utf8") as outfile:
-        json.dump(dictionary_google, outfile, ensure_ascii=False, indent=4)
+    # Writes the whole google dict, new translations get appended by add_google_translations instead
+    google_store.save(dictionary_google)
 
 # def cvs_to_json():
 #     temp_dict = OrderedDict()
@@ -0,0 +1,407 @@
+# MIT License
+
+# Copyright (c) 2017 GiveMeAllYourCats
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the 'Software'), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED 'AS IS', WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Code author: GiveMeAllYourCats
+# Repo: https://github.com/michaeldegroot/cats-blender-plugin
+# Edits by: GiveMeAllYourCats, Hotox
+
+# Storage of the dictionaries and fetching of the Google translations.
+# Nothing in here touches bpy, so the fetcher can safely run in a background thread.
+
+import os
+import sys
+import json
+import mmap
+import time
+import array
+import struct
+import hashlib
+import threading
+import collections.abc
+import requests.exceptions
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ..extern_tools.google_trans_new.google_trans_new import google_translator, google_new_transError
+
+sections = ['translations', 'translations_full']
+
+# Compiled dictionary: header, table of the character offsets of all keys and values, utf-8 text.
+# Increase the schema version whenever the layout changes, old files then get recompiled
+compiled_schema_version = 2
+compiled_magic = b'CATSDICT'
+compiled_header = struct.Struct('<8sIII20s')  # magic, schema version, entry count, key chars length, signature of the source files
+
+
+class GoogleDictionaryStore:
+    # The Google dictionary is stored as a json snapshot plus an append-only log of json lines.
+    # New translations only get appended to the log, the snapshot is only rewritten when the log gets too long
+
+    compact_after = 1000
+
+    def __init__(self, snapshot_file, log_file):
+        self.snapshot_file = snapshot_file
+        self.log_file = log_file
+        self.log_length = 0
+
+    def load(self):
+        # Returns the dictionary or None if the snapshot is missing or broken
+        try:
+            with open(self.snapshot_file, encoding="utf8") as file:
+                data = json.load(file, object_pairs_hook=collections.OrderedDict)
+        except FileNotFoundError:
+            print('GOOGLE DICTIONARY NOT FOUND!')
+            return None
+        except json.decoder.JSONDecodeError:
+            print("ERROR FOUND IN GOOOGLE DICTIONARY")
+            return None
+
+        if 'created' not in data or any(section not in data for section in sections):
+            return None
+
+        self.log_length = 0
+        try:
+            with open(self.log_file, encoding="utf8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        data[entry['t']][entry['k']] = entry['v']
+                    except (ValueError, KeyError, TypeError):
+                        # A line can be incomplete if Blender got closed while writing it
+                        continue
+                    self.log_length += 1
+        except FileNotFoundError:
+            pass
+
+        if self.log_length >= self.compact_after:
+            self.save(data)
+
+        return data
+
+    def append(self, section, translations):
+        if not translations:
+            return
+        with open(self.log_file, 'a', encoding="utf8") as file:
+            for name, translation in translations.items():
+                file.write(json.dumps({'t': section, 'k': name, 'v': translation}, ensure_ascii=False) + '\n')
+        self.log_length += len(translations)
+
+    def save(self, data):
+        # Writes the full snapshot and clears the log
+        temp_file = self.snapshot_file + '.tmp'
+        with open(temp_file, 'w', encoding="utf8") as outfile:
+            json.dump(data, outfile, ensure_ascii=False, indent=4)
+        os.replace(temp_file, self.snapshot_file)
+
+        try:
+            os.remove(self.log_file)
+        except FileNotFoundError:
+            pass
+        self.log_length = 0
+
+
+def get_source_signature(files):
+    # Changes whenever one of the source files is changed, created or deleted
+    signature = hashlib.sha1()
+    for file in files:
+        try:
+            stat = os.stat(file)
+            signature.update(('%s %d %d;' % (os.path.basename(file), stat.st_size, stat.st_mtime_ns)).encode('utf8'))
+        except FileNotFoundError:
+            signature.update(('%s -;' % os.path.basename(file)).encode('utf8'))
+    return signature.digest()
+
+
+def write_compiled_dictionary(path, dictionary, signature):
+    # Stores the entries in their order as utf8 with a table of byte offsets, plus the ranks sorted by key for lookups
+    items = [(key.encode('utf8'), value.encode('utf8')) for key, value in dictionary.items()]
+    offsets = array.array('I', [0])
+    length = 0
+    for key, value in items:
+        length += len(key)
+        offsets.append(length)
+        length += len(value)
+        offsets.append(length)
+    order = array.array('I', sorted(range(len(items)), key=lambda rank: items[rank][0]))
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+        order.byteswap()
+    key_chars = ''.join(sorted({char for key in dictionary for char in key})).encode('utf8')
+
+    temp_file = path + '.tmp'
+    with open(temp_file, 'wb') as file:
+        file.write(compiled_header.pack(compiled_magic, compiled_schema_version, len(items), len(key_chars), signature))
+        file.write(offsets.tobytes())
+        file.write(order.tobytes())
+        file.write(key_chars)
+        for key, value in items:
+            file.write(key)
+            file.write(value)
+    os.replace(temp_file, path)
+
+
+def read_compiled_dictionary(path, signature):
+    # Returns the dictionary in its stored order or None if the file is missing, outdated or broken
+    try:
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        return CompiledDictionary(data, signature)
+    except (ValueError, struct.error):
+        data.close()
+        return None
+
+
+class CompiledDictionary(collections.abc.Mapping):
+    # Read only dictionary on top of the mapped file, only the offset tables are read when it is opened.
+    # Keys and values are decoded when they are used, lookups binary search the keys in sorted order.
+    # UTF-8 bytes sort like the strings, so the search compares the raw bytes
+
+    def __init__(self, data, signature):
+        magic, version, count, chars_length, file_signature = compiled_header.unpack_from(data)
+        if magic != compiled_magic or version != compiled_schema_version or file_signature != signature:
+            raise ValueError('Outdated compiled dictionary')
+
+        offsets_start = compiled_header.size
+        order_start = offsets_start + (2 * count + 1) * 4
+        chars_start = order_start + count * 4
+        blob_start = chars_start + chars_length
+
+        self.offsets = array.array('I')
+        self.offsets.frombytes(data[offsets_start:order_start])
+        self.order = array.array('I')
+        self.order.frombytes(data[order_start:chars_start])
+        if sys.byteorder == 'big':
+            self.offsets.byteswap()
+            self.order.byteswap()
+        if len(self.order) != count or self.offsets[-1] != len(data) - blob_start:
+            raise ValueError('Broken compiled dictionary')
+
+        self.key_chars = set(data[chars_start:blob_start].decode('utf8'))
+        self.data = data
+        self.blob_start = blob_start
+
+    def close(self):
+        self.data.close()
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        for rank in range(len(self.order)):
+            yield self.key(rank)
+
+    def __getitem__(self, key):
+        rank = self.rank(key.encode('utf8') if isinstance(key, str) else None)
+        if rank is None:
+            raise KeyError(key)
+        return self.value(rank)
+
+    def key_bytes(self, rank):
+        return self.data[self.blob_start + self.offsets[2 * rank]:self.blob_start + self.offsets[2 * rank + 1]]
+
+    def key(self, rank):
+        return self.key_bytes(rank).decode('utf8')
+
+    def value(self, rank):
+        return self.data[self.blob_start + self.offsets[2 * rank + 1]:self.blob_start + self.offsets[2 * rank + 2]].decode('utf8')
+
+    def search(self, key, low, high):
+        # First position in the sorted order between low and high whose key is not smaller than key
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_bytes(self.order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def rank(self, key):
+        if key is None:
+            return None
+        position = self.search(key, 0, len(self.order))
+        if position < len(self.order) and self.key_bytes(self.order[position]) == key:
+            return self.order[position]
+        return None
+
+    def find(self, text):
+        # Same as DictionaryAutomaton.find: the ranks of all keys contained in the text.
+        # Every start position narrows the sorted range down to the keys starting with a growing prefix
+        found = set()
+        if len(self.order) and not self.key_bytes(self.order[0]):
+            found.add(self.order[0])
+
+        text = text.encode('utf8')
+        boundaries = [i for i in range(len(text)) if text[i] & 0xC0 != 0x80] + [len(text)]
+        for start in range(len(boundaries) - 1):
+            low, high = 0, len(self.order)
+            for end in boundaries[start + 1:]:
+                prefix = text[boundaries[start]:end]
+                low = self.search(prefix, low, high)
+                high = self.search(prefix + b'\xff', low, high)  # 0xFF never appears in UTF-8
+                if low == high:
+                    break
+                if self.key_bytes(self.order[low]) == prefix:
+                    found.add(self.order[low])
+        return found
+
+
+class GoogleBackend:
+    # Every thread gets its own translator, since it stores the session token
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def reset(self):
+        self.local.translator = google_translator(url_suffix='com')
+
+    def translate(self, text):
+        if getattr(self.local, 'translator', None) is None:
+            self.reset()
+        return self.local.translator.translate(text, lang_src='ja', lang_tgt='en')
+
+
+backend = GoogleBackend()
+
+
+def set_backend(new_backend=None):
+    # Backends need a translate(text) and a reset() method. None restores the Google backend
+    global backend
+    backend = new_backend if new_backend else GoogleBackend()
+
+
+class FetchError(Exception):
+    # reason is one of 'connection', 'ban', 'access', 'api' or 'google'
+
+    def __init__(self, reason, message=''):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+
+
+def get_fetch_error(error):
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionRefusedError)):
+        return FetchError('connection')
+    if isinstance(error, json.JSONDecodeError):
+        return FetchError('ban')
+    if isinstance(error, google_new_transError):
+        if error.rsp is None:
+            return FetchError('connection')
+        if error.rsp.status_code == 403:
+            return FetchError('access')
+        if error.rsp.status_code == 429:
+            return FetchError('ban')
+        return FetchError('google', str(error))
+    if isinstance(error, RuntimeError):
+        return FetchError('google', str(error))
+    return None
+
+
+def fetch(texts, progress=None, max_workers=1, retries=3, retry_delay=0.5):
+    # Translates all unique texts and returns (translations, error). Parallel requests make a Google ban more likely,
+    # so the texts are fetched one after another unless max_workers says otherwise.
+    # Translations that finished before an error are still returned, so they can be saved.
+    # progress(done, total) gets called from the calling thread
+    texts = list(OrderedDict.fromkeys(text for text in texts if text))
+    translations = OrderedDict()
+    if not texts:
+        return translations, None
+
+    stop = threading.Event()
+    translator = backend
+
+    def work(text):
+        tries = 0
+        while True:
+            if stop.is_set():
+                return None
+            try:
+                return translator.translate(text).strip()
+            except AttributeError:
+                # If the translator wasn't able to create a stable connection to Google, just retry it again
+                # This is an issue with Google since Nov 2020: https://github.com/ssut/py-googletrans/issues/234
+                error = FetchError('api')
+            except FetchError:
+                raise
+            except Exception as e:
+                error = get_fetch_error(e)
+                if error is None:
+                    raise
+                if error.reason != 'connection':
+                    raise error
+
+            # Dropped connections and timeouts are often only short, retry them with a growing delay
+            tries += 1
+            if tries >= retries:
+                raise error
+            print('RETRY', tries)
+            translator.reset()
+            time.sleep(retry_delay * 2 ** (tries - 1))
+
+    error = None
+    done = 0
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(texts))) as executor:
+        futures = {executor.submit(work, text): text for text in texts}
+        for future in as_completed(futures):
+            done += 1
+            try:
+                translation = future.result()
+            except FetchError as e:
+                if error is None:
+                    error = e
+                stop.set()
+                continue
+            if translation is not None:
+                translations[futures[future]] = translation
+            if progress:
+                progress(done, len(texts))
+
+    # Keep the order of the input
+    translations = OrderedDict((text, translations[text]) for text in texts if text in translations)
+    return translations, error
+
+
+class FetchThread(threading.Thread):
+    # Runs fetch in the background. The operator polls done and progress from a timer
+
+    def __init__(self, texts, max_workers=1):
+        super().__init__(daemon=True)
+        self.texts = texts
+        self.max_workers = max_workers
+        self.progress = (0, len(set(texts)))
+        self.translations = OrderedDict()
+        self.error = None
+        self.done = False
+
+    def set_progress(self, done, total):
+        self.progress = (done, total)
+
+    def run(self):
+        try:
+            self.translations, self.error = fetch(self.texts, progress=self.set_progress, max_workers=self.max_workers)
+        except Exception as e:
+            self.error = FetchError('google', str(e))
+        self.done = True
@@ -163,6 +163,13 @@ class BakePanel(ToolPanel, bpy.types.Panel):
         row = col.row(align=True)
         row.prop(context.scene, 'bake_device', expand=True)
         row = col.row(align=True)
+        row.prop(context.scene, 'bake_use_cache', expand=True)
+        if context.scene.bake_use_cache:
+            row = col.row(align=True)
+            row.separator()
+            row.prop(context.scene, 'bake_cache_size', expand=True)
+            row.operator(Bake.BakeClearCacheButton.bl_idname, icon='TRASH')
+        row = col.row(align=True)
         row.operator(Bake.BakeButton.bl_idname, icon='RENDER_STILL')
         if not addon_utils.check("render_auto_tile_size")[1]:
             row = col.row(align=True)
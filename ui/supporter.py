@@ -2,7 +2,7 @@ import bpy
 
 from .main import ToolPanel
 from ..tools import supporter as Supporter
-from ..tools.register import register_wrap
+from ..tools.register import register_wrap, is_bundle_loaded
 from ..tools.supporter import check_for_update_background
 from ..tools.translations import t
 
@@ -22,6 +22,12 @@ class SupporterPanel(ToolPanel, bpy.types.Panel):
 
         row = col.row(align=True)
         row.label(text=t('SupporterPanel.desc'))
+
+        # The buttons get registered after this draw, the panel gets redrawn then
+        if not is_bundle_loaded('supporter'):
+            Supporter.load_supporter_bundle()
+            return
+
         row = col.row(align=True)
         row.scale_y = 1.2
         row.operator(Supporter.PatreonButton.bl_idname, icon_value=Supporter.preview_collections["custom_icons"]["heart1"].icon_id)